@@ -0,0 +1,305 @@
+# aggregates.py
+"""
+Year × Division aggregate cube for the trend and industry pages.
+
+The cube stores per-(year, Division) sums, non-null counts and row counts
+for every metric, plus their cumulative sums over years. Any year window
+is then answered from the cube instead of a groupby over the full panel:
+Division means come from two cumulative-sum lookups, and yearly series
+from an O(years × divisions) slice.
+
+Panels too large to load build the cube out of core with
+:class:`CubeAccumulator`, one chunk at a time; the result is
+bit-identical to :meth:`AggregateCube.from_frame` on the whole panel.
+"""
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from utils import DIVISION_COL, YEAR_COL
+
+
+@dataclass(frozen=True)
+class AggregateCube:
+    """
+    Sums and counts by year × Division.
+
+    The last Division slot collects rows with a missing ``Division``: they
+    count towards yearly means (as ``groupby("year")`` does) but never
+    appear as a Division of their own.
+    """
+
+    years: np.ndarray       # (n_years,) sorted
+    divisions: list[str]    # (n_div,) sorted
+    metrics: list[str]      # (n_metrics,)
+    sums: np.ndarray        # (n_years, n_div + 1, n_metrics) float64
+    counts: np.ndarray      # (n_years, n_div + 1, n_metrics) int64, non-null values
+    rows: np.ndarray        # (n_years, n_div + 1) int64, all rows
+    cum_sums: np.ndarray    # (n_years + 1, n_div + 1, n_metrics), leading zeros
+    cum_counts: np.ndarray  # (n_years + 1, n_div + 1, n_metrics)
+    cum_rows: np.ndarray    # (n_years + 1, n_div + 1)
+
+    @classmethod
+    def from_parts(
+        cls,
+        years: np.ndarray,
+        divisions: list[str],
+        metrics: list[str],
+        sums: np.ndarray,
+        counts: np.ndarray,
+        rows: np.ndarray,
+    ) -> "AggregateCube":
+        """Build a cube from raw sums/counts, deriving the cumulative arrays."""
+
+        def cumulative(a):
+            out = np.zeros((a.shape[0] + 1,) + a.shape[1:], dtype=a.dtype)
+            np.cumsum(a, axis=0, out=out[1:])
+            return out
+
+        return cls(
+            years=np.asarray(years),
+            divisions=list(divisions),
+            metrics=list(metrics),
+            sums=sums,
+            counts=counts,
+            rows=rows,
+            cum_sums=cumulative(sums),
+            cum_counts=cumulative(counts),
+            cum_rows=cumulative(rows),
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, metrics: list[str]) -> "AggregateCube":
+        """
+        Aggregate ``df`` in one vectorised pass per metric.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Must contain ``year``, ``Division`` and every column in ``metrics``.
+        metrics : list of str
+            Numeric columns to aggregate.
+        """
+        year_codes, years = pd.factorize(df[YEAR_COL], sort=True)
+        div_codes, divisions = pd.factorize(df[DIVISION_COL], sort=True)
+        n_years, n_div = len(years), len(divisions)
+
+        keep = year_codes >= 0
+        div_codes = np.where(div_codes < 0, n_div, div_codes)
+        flat = (year_codes * (n_div + 1) + div_codes)[keep]
+        size = n_years * (n_div + 1)
+
+        sums = np.zeros((size, len(metrics)))
+        counts = np.zeros((size, len(metrics)), dtype=np.int64)
+        for j, m in enumerate(metrics):
+            values = df[m].to_numpy(dtype="float64", na_value=np.nan)[keep]
+            valid = ~np.isnan(values)
+            sums[:, j] = np.bincount(flat[valid], weights=values[valid], minlength=size)
+            counts[:, j] = np.bincount(flat[valid], minlength=size)
+        rows = np.bincount(flat, minlength=size).astype(np.int64)
+
+        shape = (n_years, n_div + 1)
+        return cls.from_parts(
+            years=np.asarray(years),
+            divisions=[str(d) for d in divisions],
+            metrics=metrics,
+            sums=sums.reshape(shape + (len(metrics),)),
+            counts=counts.reshape(shape + (len(metrics),)),
+            rows=rows.reshape(shape),
+        )
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame], metrics: list[str]) -> "AggregateCube":
+        """
+        Aggregate a stream of row chunks (e.g. :func:`utils.iter_esg_chunks`).
+
+        Only one chunk is held at a time. Chunks must arrive in file order
+        for the sums to match :meth:`from_frame` bit for bit.
+        """
+        acc = CubeAccumulator(metrics)
+        for chunk in chunks:
+            acc.update(chunk)
+        return acc.result()
+
+    def _window(self, start: int | None, end: int | None) -> tuple[int, int]:
+        lo = 0 if start is None else int(np.searchsorted(self.years, start, side="left"))
+        hi = len(self.years) if end is None else int(np.searchsorted(self.years, end, side="right"))
+        return lo, max(lo, hi)
+
+    def _metric_index(self, metrics: str | list[str]) -> list[int]:
+        names = [metrics] if isinstance(metrics, str) else list(metrics)
+        missing = [m for m in names if m not in self.metrics]
+        if missing:
+            raise KeyError(f"Metrics not in cube: {missing}")
+        return [self.metrics.index(m) for m in names]
+
+    @staticmethod
+    def _means(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    def _shape_output(self, values, index, metrics, columns=None):
+        if isinstance(metrics, str):
+            return pd.Series(values[..., 0], index=index, name=metrics)
+        return pd.DataFrame(values, index=index, columns=list(metrics) if columns is None else columns)
+
+    def year_means(
+        self, metrics: str | list[str], start: int | None = None, end: int | None = None
+    ) -> pd.Series | pd.DataFrame:
+        """Equivalent of ``df_win.groupby("year")[metrics].mean()``."""
+        idx = self._metric_index(metrics)
+        lo, hi = self._window(start, end)
+        sums = self.sums[lo:hi, :, idx].sum(axis=1)
+        counts = self.counts[lo:hi, :, idx].sum(axis=1)
+        index = pd.Index(self.years[lo:hi], name=YEAR_COL)
+        return self._shape_output(self._means(sums, counts), index, metrics)
+
+    def division_means(
+        self, metrics: str | list[str], start: int | None = None, end: int | None = None
+    ) -> pd.Series | pd.DataFrame:
+        """Equivalent of ``df_win.groupby("Division")[metrics].mean()``."""
+        idx = self._metric_index(metrics)
+        lo, hi = self._window(start, end)
+        n_div = len(self.divisions)
+        sums = (self.cum_sums[hi] - self.cum_sums[lo])[:n_div][:, idx]
+        counts = (self.cum_counts[hi] - self.cum_counts[lo])[:n_div][:, idx]
+        present = (self.cum_rows[hi] - self.cum_rows[lo])[:n_div] > 0
+        index = pd.Index(np.asarray(self.divisions, dtype=object)[present], name=DIVISION_COL)
+        return self._shape_output(self._means(sums, counts)[present], index, metrics)
+
+    def year_division_means(
+        self, metric: str, start: int | None = None, end: int | None = None
+    ) -> pd.DataFrame:
+        """
+        Equivalent of
+        ``df_win.groupby(["year", "Division"])[metric].mean().unstack()``.
+        """
+        (j,) = self._metric_index([metric])
+        lo, hi = self._window(start, end)
+        n_div = len(self.divisions)
+        rows = self.rows[lo:hi, :n_div]
+        means = self._means(self.sums[lo:hi, :n_div, j], self.counts[lo:hi, :n_div, j])
+        year_mask = rows.sum(axis=1) > 0
+        div_mask = rows.sum(axis=0) > 0
+        return pd.DataFrame(
+            means[np.ix_(year_mask, div_mask)],
+            index=pd.Index(self.years[lo:hi][year_mask], name=YEAR_COL),
+            columns=pd.Index(np.asarray(self.divisions, dtype=object)[div_mask], name=DIVISION_COL),
+        )
+
+
+class CubeAccumulator:
+    """
+    Mergeable partial of an :class:`AggregateCube`, fed chunk by chunk.
+
+    Holds one running sum, non-null count and row count per (year,
+    Division) cell seen so far; memory grows with the number of cells, not
+    rows. :meth:`update` continues each cell's sum row by row from its
+    running value, which is exactly the order ``np.bincount`` adds them in
+    :meth:`AggregateCube.from_frame`, so any chunking of the same rows
+    gives the same floats. :meth:`merge` combines partials built
+    independently (e.g. over separate files); its counts are exact but its
+    sums are added as totals, so they may differ in the last bit from a
+    single pass.
+    """
+
+    def __init__(self, metrics: list[str]):
+        self.metrics = list(metrics)
+        self._years: dict = {}        # year -> slot, in order of appearance
+        self._divisions: dict = {}    # Division -> slot; missing is slot -1
+        self._cells: dict[tuple[int, int], int] = {}
+        self._cell_keys: list[tuple[int, int]] = []
+        self._sums = np.zeros((0, len(self.metrics)))
+        self._counts = np.zeros((0, len(self.metrics)), dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _slots(mapping: dict, values) -> np.ndarray:
+        return np.array([mapping.setdefault(v, len(mapping)) for v in values], dtype=np.int64)
+
+    def _cell_ids(self, year_slots: np.ndarray, div_slots: np.ndarray) -> np.ndarray:
+        """Map (year slot, Division slot) pairs to cells, adding new ones."""
+        stride = len(self._divisions) + 1
+        pairs, inverse = np.unique(year_slots * stride + div_slots + 1, return_inverse=True)
+        ids = np.empty(len(pairs), dtype=np.int64)
+        for i, pair in enumerate(pairs.tolist()):
+            key = (pair // stride, pair % stride - 1)
+            if key not in self._cells:
+                self._cells[key] = len(self._cell_keys)
+                self._cell_keys.append(key)
+            ids[i] = self._cells[key]
+        grow = len(self._cell_keys) - len(self._rows)
+        if grow:
+            self._sums = np.vstack([self._sums, np.zeros((grow, len(self.metrics)))])
+            self._counts = np.vstack([self._counts, np.zeros((grow, len(self.metrics)), dtype=np.int64)])
+            self._rows = np.concatenate([self._rows, np.zeros(grow, dtype=np.int64)])
+        return ids[inverse]
+
+    def update(self, chunk: pd.DataFrame) -> "CubeAccumulator":
+        """Fold the next chunk of rows (in file order) into the partial."""
+        year_codes, years = pd.factorize(chunk[YEAR_COL])
+        div_codes, divisions = pd.factorize(chunk[DIVISION_COL])
+        year_slots = self._slots(self._years, years.tolist())
+        div_slots = np.append(self._slots(self._divisions, divisions.tolist()), -1)
+
+        keep = year_codes >= 0
+        cell = self._cell_ids(year_slots[year_codes[keep]], div_slots[div_codes[keep]])
+        n_cells = len(self._rows)
+        # Prefixing each cell's running sum makes bincount continue it.
+        prefix = np.arange(n_cells)
+        for j, m in enumerate(self.metrics):
+            values = chunk[m].to_numpy(dtype="float64", na_value=np.nan)[keep]
+            valid = ~np.isnan(values)
+            self._sums[:, j] = np.bincount(
+                np.concatenate([prefix, cell[valid]]),
+                weights=np.concatenate([self._sums[:, j], values[valid]]),
+                minlength=n_cells,
+            )
+            self._counts[:, j] += np.bincount(cell[valid], minlength=n_cells)
+        self._rows += np.bincount(cell, minlength=n_cells)
+        return self
+
+    def merge(self, other: "CubeAccumulator") -> "CubeAccumulator":
+        """Add another partial over the same metrics into this one."""
+        if other.metrics != self.metrics:
+            raise ValueError("Cannot merge partials over different metrics.")
+        years = list(other._years)
+        divisions = list(other._divisions)
+        year_slots = self._slots(self._years, years)
+        div_slots = np.append(self._slots(self._divisions, divisions), -1)
+        keys = np.array(other._cell_keys, dtype=np.int64).reshape(-1, 2)
+        cell = self._cell_ids(year_slots[keys[:, 0]], div_slots[keys[:, 1]])
+        self._sums[cell] += other._sums
+        self._counts[cell] += other._counts
+        self._rows[cell] += other._rows
+        return self
+
+    def result(self) -> AggregateCube:
+        """The cube over every row folded in so far."""
+        years = sorted(self._years)
+        divisions = sorted(self._divisions)
+        n_years, n_div = len(years), len(divisions)
+        year_pos = np.empty(n_years, dtype=np.int64)
+        year_pos[[self._years[y] for y in years]] = np.arange(n_years)
+        # Slot -1 (missing Division) lands in the trailing position n_div.
+        div_pos = np.full(n_div + 1, n_div, dtype=np.int64)
+        div_pos[[self._divisions[d] for d in divisions]] = np.arange(n_div)
+
+        keys = np.array(self._cell_keys, dtype=np.int64).reshape(-1, 2)
+        y, d = year_pos[keys[:, 0]], div_pos[keys[:, 1]]
+        sums = np.zeros((n_years, n_div + 1, len(self.metrics)))
+        counts = np.zeros((n_years, n_div + 1, len(self.metrics)), dtype=np.int64)
+        rows = np.zeros((n_years, n_div + 1), dtype=np.int64)
+        sums[y, d] = self._sums
+        counts[y, d] = self._counts
+        rows[y, d] = self._rows
+        return AggregateCube.from_parts(
+            years=np.asarray(years),
+            divisions=[str(v) for v in divisions],
+            metrics=self.metrics,
+            sums=sums,
+            counts=counts,
+            rows=rows,
+        )
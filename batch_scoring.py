@@ -0,0 +1,306 @@
+# batch_scoring.py
+"""
+Score both margin models on every firm-year of the panel.
+
+The panel is streamed in fixed blocks of ``chunksize`` rows. Blocks are
+cut by row position, so the boundaries are the same whether rows come
+from the CSV or the Arrow sidecar. Each block is scored by a pool of
+worker processes; every worker loads the served models once, through
+:mod:`model_registry`. A worker writes its block's predictions and
+residuals (realized minus predicted margin) as one Parquet part, named
+after the block's first row and moved into place atomically.
+
+A manifest next to the parts records the dataset hash, the model hashes
+and the block size. A rerun with the same inputs skips every part
+already on disk, so an interrupted run resumes where it stopped. A
+changed dataset, model or block size starts over::
+
+    python batch_scoring.py --data esg_cleaned_final.csv.zip --jobs 4
+
+The Prediction Residuals page reads the parts with
+:func:`load_predictions` and never scores anything itself.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils import DIVISION_COL, YEAR_COL, dataset_version, file_digest, iter_esg_chunks
+
+SCORES_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+KEY_COLS = ["ticker_ann", YEAR_COL, DIVISION_COL]
+# Fixed, so a block whose keys are all missing still matches the other parts.
+KEY_TYPES = {"ticker_ann": pa.string(), YEAR_COL: pa.int64(), DIVISION_COL: pa.string()}
+ROW_COL = "row"  # position of the firm-year in the panel file
+
+
+def predictions_path(zip_path: str | Path) -> Path:
+    """Default output directory for a dataset zip."""
+    zip_path = Path(zip_path)
+    return zip_path.with_name(f"{zip_path.name.split('.')[0]}.predictions")
+
+
+def _part_path(out_dir: Path, start: int) -> Path:
+    return out_dir / f"part-{start:012d}.parquet"
+
+
+def pred_col(target: str) -> str:
+    return f"{target}_pred"
+
+
+def resid_col(target: str) -> str:
+    return f"{target}_resid"
+
+
+def read_manifest(out_dir: str | Path) -> dict | None:
+    """The manifest of a scoring run, or ``None`` if there is none yet."""
+    try:
+        return json.loads((Path(out_dir) / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(out_dir: Path, manifest: dict) -> None:
+    path = out_dir / MANIFEST_NAME
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def row_blocks(chunks: Iterable[pd.DataFrame], size: int) -> Iterator[tuple[int, pd.DataFrame]]:
+    """
+    Re-cut a stream of frames into ``(first_row, frame)`` blocks of ``size`` rows.
+
+    Only the last block may be shorter. Block ``i`` always holds rows
+    ``i * size`` to ``(i + 1) * size - 1``, whatever the input chunking.
+    """
+    pending: list[pd.DataFrame] = []
+    held = 0
+    start = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        held += len(chunk)
+        while held >= size:
+            buf = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+            yield start, buf.iloc[:size].reset_index(drop=True)
+            start += size
+            rest = buf.iloc[size:]
+            pending, held = ([rest], len(rest)) if len(rest) else ([], 0)
+    if held:
+        yield start, pd.concat(pending, ignore_index=True)
+
+
+# Set in each worker process by _init_worker.
+_worker: dict = {}
+
+
+def _init_worker(specs: dict, model_sha: dict) -> None:
+    _worker.update(specs=specs, model_sha=model_sha)
+
+
+def _models() -> dict:
+    from model_registry import get_registry
+
+    registry = get_registry()
+    models = {}
+    for name in _worker["specs"]:
+        models[name] = registry.get_compiled(name)
+        if registry.info(name).sha256 != _worker["model_sha"][name]:
+            raise RuntimeError(f"Model '{name}' changed during the run; start it again.")
+    return models
+
+
+def score_block(start: int, frame: pd.DataFrame, out_dir: str) -> tuple[int, int]:
+    """
+    Score one block and write its Parquet part; returns ``(start, rows)``.
+
+    Rows with missing features are scored after the models' own median
+    imputation. Residuals are left missing where the realized margin is.
+    """
+    models = _models()
+    cols = {ROW_COL: np.arange(start, start + len(frame), dtype=np.int64)}
+    for c in KEY_COLS:
+        # from_pandas: a missing Division or ticker becomes null, not a float NaN.
+        cols[c] = pa.array(frame[c], type=KEY_TYPES[c], from_pandas=True)
+    for name, (target, features) in _worker["specs"].items():
+        actual = frame[target].to_numpy(dtype=np.float64)
+        pred = models[name].predict(frame[features].astype(np.float64))
+        cols[target] = actual
+        cols[pred_col(target)] = pred
+        cols[resid_col(target)] = actual - pred
+    table = pa.table(cols)
+    table = table.set_column(
+        table.schema.get_field_index(DIVISION_COL), DIVISION_COL, table[DIVISION_COL].dictionary_encode()
+    )
+
+    path = _part_path(Path(out_dir), start)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return start, len(frame)
+
+
+def score_panel(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    out_dir: str | Path | None = None,
+    chunksize: int = 100_000,
+    jobs: int | None = None,
+    restart: bool = False,
+    log: Callable[[str], None] = print,
+) -> dict:
+    """
+    Score every row of the panel, resuming an interrupted run.
+
+    Parameters
+    ----------
+    out_dir : str or Path, optional
+        Where the parts and manifest go; defaults to :func:`predictions_path`.
+    chunksize : int
+        Rows per block (and per Parquet part).
+    jobs : int, optional
+        Worker processes; defaults to the core count. ``1`` scores in
+        this process.
+    restart : bool
+        Discard existing parts even if they match.
+
+    Returns
+    -------
+    dict
+        The manifest, with ``complete`` set once every block is written.
+    """
+    from model_registry import MODEL_FILES, resolve_artifact
+    from train_models import MODEL_SPECS
+
+    zip_path = Path(zip_path)
+    out_dir = Path(out_dir) if out_dir is not None else predictions_path(zip_path)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    specs = {name: (s["target"], list(s["features"])) for name, s in MODEL_SPECS.items()}
+    key = {
+        "version": SCORES_VERSION,
+        "dataset_sha256": dataset_version(zip_path),
+        "models": {name: file_digest(resolve_artifact(MODEL_FILES[name])) for name in specs},
+        "chunksize": chunksize,
+    }
+
+    for tmp in out_dir.glob("*.tmp"):
+        tmp.unlink(missing_ok=True)
+    manifest = read_manifest(out_dir)
+    if restart or manifest is None or {k: manifest.get(k) for k in key} != key:
+        for part in out_dir.glob("part-*.parquet"):
+            part.unlink()
+        manifest = {**key, "targets": {n: t for n, (t, _) in specs.items()}, "complete": False}
+        _write_manifest(out_dir, manifest)
+    if manifest.get("complete"):
+        log(f"{out_dir}: already complete ({manifest['rows']:,} rows)")
+        return manifest
+
+    done = {int(p.name[5:17]) for p in out_dir.glob("part-*.parquet")}
+    if done:
+        log(f"resuming: {len(done)} block(s) already written")
+    columns = list(dict.fromkeys(
+        KEY_COLS + [c for target, features in specs.values() for c in (target, *features)]
+    ))
+    blocks = (
+        (start, frame)
+        for start, frame in row_blocks(iter_esg_chunks(zip_path, columns=columns, chunksize=chunksize), chunksize)
+        if start not in done
+    )
+
+    start_time = time.perf_counter()
+    rows = 0
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        _init_worker(specs, key["models"])
+        for start, frame in blocks:
+            rows += score_block(start, frame, str(out_dir))[1]
+            log(f"  rows {start:,}–{start + len(frame) - 1:,} written")
+    else:
+        # "spawn", as in training_jobs.py; at most two blocks queued per worker.
+        with ProcessPoolExecutor(
+            jobs, mp_context=mp.get_context("spawn"), initializer=_init_worker,
+            initargs=(specs, key["models"]),
+        ) as pool:
+            pending = set()
+            for start, frame in blocks:
+                pending.add(pool.submit(score_block, start, frame, str(out_dir)))
+                if len(pending) >= 2 * jobs:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    rows += _report(finished, log)
+            rows += _report(wait(pending)[0], log)
+
+    total = sum(pq.read_metadata(p).num_rows for p in out_dir.glob("part-*.parquet"))
+    manifest.update(
+        complete=True,
+        rows=total,
+        finished_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    )
+    _write_manifest(out_dir, manifest)
+    log(f"scored {rows:,} rows in {time.perf_counter() - start_time:.1f}s; {total:,} in {out_dir}")
+    return manifest
+
+
+def _report(finished, log: Callable[[str], None]) -> int:
+    rows = 0
+    for future in finished:
+        start, n = future.result()
+        rows += n
+        log(f"  rows {start:,}–{start + n - 1:,} written")
+    return rows
+
+
+def load_predictions(
+    out_dir: str | Path,
+    columns: list[str] | None = None,
+    years: tuple[int, int] | None = None,
+    divisions: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Read scored rows back, in panel order.
+
+    ``years`` (inclusive) and ``divisions`` are pushed down into the
+    Parquet scan, so only matching row groups are decoded.
+    """
+    parts = sorted(Path(out_dir).glob("part-*.parquet"))
+    if not parts:
+        raise FileNotFoundError(f"No scored parts in '{out_dir}'; run batch_scoring.py first.")
+    filt = None
+    if years is not None:
+        filt = (ds.field(YEAR_COL) >= years[0]) & (ds.field(YEAR_COL) <= years[1])
+    if divisions is not None:
+        in_div = ds.field(DIVISION_COL).isin(list(divisions))
+        filt = in_div if filt is None else filt & in_div
+    # Sorted part names follow row order, and a scan keeps fragment order.
+    return ds.dataset([str(p) for p in parts], format="parquet").to_table(columns=columns, filter=filt).to_pandas()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Score both margin models on every row of the panel.")
+    parser.add_argument("--data", default="esg_cleaned_final.csv.zip", help="zipped ESG panel")
+    parser.add_argument("--out", default=None, help="output directory (default: next to the zip)")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="rows per block")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--restart", action="store_true", help="discard parts from an earlier run")
+    args = parser.parse_args(argv)
+    score_panel(args.data, args.out, args.chunksize, args.jobs, args.restart)
+
+
+if __name__ == "__main__":
+    main()
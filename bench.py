@@ -0,0 +1,391 @@
+# bench.py
+"""
+Offline benchmark suite for the app's hot paths.
+
+Generates synthetic ESG panels with the real column schema at several
+multiples of the production size (3,473 firms over 2002–2023, as in the
+README), then times:
+
+* ``load``: :func:`utils.load_esg_zip` from the CSV, building the Arrow
+  sidecar, and from the sidecar (whole panel and a column slice), plus
+  the out-of-core cube and EDA statistics streamed from the sidecar;
+* ``pages``: the aggregation behind each page (compaction, the aggregate
+  cube and its queries for Trends/Industry, the EDA statistics);
+* ``fit``: Playground fits (linear, boosting, 5-fold CV);
+* ``predict``: single-row, 1,000-row scenario batch and whole-panel
+  scoring with both margin models, through sklearn and the compiled
+  :mod:`tree_engine` form, and a Monte Carlo run of the Predict page;
+* ``startup``: the first view of each page in a fresh interpreter, with
+  no on-disk caches, both straight after boot and after
+  :func:`prewarm.warm` has run (see :func:`first_view`).
+
+Nothing touches the network. Results go to a JSON file (with the git
+commit and library versions) that can be diffed across commits::
+
+    python bench.py --scales 1 10 100 --output bench-results.json
+    python bench.py --compare base.json head.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+BASE_FIRMS = 3_473
+YEARS = (2002, 2023)
+DIVISIONS = [
+    "Agriculture, Forestry, Fishing", "Mining", "Construction", "Manufacturing",
+    "Transportation & Public Utilities", "Wholesale Trade", "Retail Trade",
+    "Finance, Insurance, Real Estate", "Services", "Public Administration",
+]
+CSV_NAME = "esg_cleaned_final.csv"
+DEFAULT_DATA_DIR = Path(".cache") / "bench"
+GROUPS = ("load", "pages", "fit", "predict", "startup")
+ROOT = Path(__file__).resolve().parent
+STARTUP_PAGES = ("intro", "eda", "industry", "trends", "model_choice_playground", "details", "app")
+
+# Runs in a fresh interpreter. Streamlit is imported before the clock
+# starts: a server has it loaded before the first visitor arrives. The
+# test harness's own per-run cost (an empty script, timed just before the
+# page) is subtracted from the view.
+_FIRST_VIEW = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+AppTest.from_string("pass").run()
+start = time.perf_counter()
+if sys.argv[2] == "1":
+    import prewarm
+    prewarm.warm()
+prewarm_s = time.perf_counter() - start
+t = time.perf_counter()
+AppTest.from_string("pass").run()
+harness = time.perf_counter() - t
+t = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=600).run()
+print(json.dumps({
+    "prewarm_s": prewarm_s,
+    "view_s": time.perf_counter() - t - harness,
+    "errors": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def synthetic_panel(n_firms: int = BASE_FIRMS, seed: int = 0) -> pd.DataFrame:
+    """
+    Firm-year panel with the production schema and plausible values.
+
+    Each firm enters in a random year and stays to the end of the span.
+    Margins depend on the ratios and ESG scores plus noise, so the models
+    have signal to fit, and a few columns carry 5% missing values.
+    """
+    rng = np.random.default_rng(seed)
+    first, last = YEARS
+    start = rng.integers(first, last - 1, n_firms)
+    span = last + 1 - start
+    firm = np.repeat(np.arange(n_firms), span)
+    offset = np.arange(len(firm)) - np.repeat(np.cumsum(span) - span, span)
+    n = len(firm)
+
+    df = pd.DataFrame({
+        "ticker_ann": np.char.add("T", np.char.zfill(firm.astype(str), 6)),
+        "year": start[firm] + offset,
+        "Division": np.asarray(DIVISIONS)[rng.integers(0, len(DIVISIONS), n_firms)][firm],
+    })
+    for col in ("ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score"):
+        df[col] = rng.beta(2, 2, n).round(4)
+    df["ESG_Combined_Score"] = df[["ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score"]].mean(axis=1).round(4)
+    df["Asset_Turnover"] = rng.gamma(2, 0.4, n)
+    df["Debt_Ratio"] = rng.uniform(0.1, 1.0, n)
+    df["Log_Assets"] = rng.normal(8, 2, n)
+    df["ROA"] = rng.normal(0.03, 0.1, n)
+    df["ROE"] = rng.normal(0.08, 0.3, n)
+    df["Net_Profit_Margin"] = rng.normal(0.05, 0.2, n)
+    df["CashFlow_Margin"] = rng.normal(0.12, 0.2, n)
+    df["CapEx_Intensity"] = rng.gamma(1, 0.07, n)
+    df["Total_Return"] = rng.normal(0.1, 0.4, n)
+    df["EBITDA_Margin"] = (
+        0.5 * df["CashFlow_Margin"] + 0.8 * df["Net_Profit_Margin"]
+        + 0.05 * df["ESG_Governance_Score"] + rng.normal(0, 0.05, n)
+    )
+    df["Operating_Margin"] = df["EBITDA_Margin"] - 0.5 * df["CapEx_Intensity"] + rng.normal(0, 0.03, n)
+    for col in ("ROA", "Total_Return", "CapEx_Intensity", "ESG_Social_Score"):
+        df.loc[rng.random(n) < 0.05, col] = np.nan
+    return df
+
+
+def panel_zip(scale: int, data_dir: Path = DEFAULT_DATA_DIR, seed: int = 0) -> Path:
+    """Zipped CSV of a ``scale``× panel, generated once and reused."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"panel_x{scale}_s{seed}.csv.zip"
+    if not path.exists():
+        df = synthetic_panel(BASE_FIRMS * scale, seed)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+            with zf.open(CSV_NAME, "w", force_zip64=True) as fh:
+                df.to_csv(fh, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+def timeit(fn: Callable, repeats: int, setup: Callable | None = None) -> dict:
+    """Run ``fn`` ``repeats`` times (after ``setup`` each time) and summarise."""
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"best_s": min(times), "median_s": statistics.median(times), "repeats": repeats}
+
+
+# Case builders return {name: (fn, setup or None, repeats)}.
+
+
+def _bench_load(zip_path: Path, repeats: int) -> dict[str, tuple]:
+    from aggregates import AggregateCube
+    from stats_artifact import CORR_COLS, DIST_COLS, build_stats_from_chunks
+    from utils import DIVISION_COL, YEAR_COL, iter_esg_chunks, load_esg_dtypes, load_esg_zip, sidecar_path
+
+    metrics = [c for c, t in load_esg_dtypes(zip_path, CSV_NAME).items() if pd.api.types.is_float_dtype(t)]
+    cube_cols = [YEAR_COL, DIVISION_COL] + metrics
+    stats_cols = list(dict.fromkeys(["ticker_ann", YEAR_COL, *DIST_COLS, *CORR_COLS]))
+    sidecar = sidecar_path(zip_path, CSV_NAME)
+    drop = lambda: sidecar.unlink(missing_ok=True)  # noqa: E731
+    return {
+        "load.csv": (lambda: load_esg_zip(zip_path, CSV_NAME, use_cache=False), None, repeats),
+        "load.build_sidecar": (lambda: load_esg_zip(zip_path, CSV_NAME), drop, 1),
+        "load.sidecar": (lambda: load_esg_zip(zip_path, CSV_NAME), None, repeats),
+        "load.sidecar_slice": (
+            lambda: load_esg_zip(zip_path, CSV_NAME, columns=["ESG_Combined_Score"], years=(2015, 2020)),
+            None, repeats,
+        ),
+        "load.cube_stream": (
+            lambda: AggregateCube.from_chunks(iter_esg_chunks(zip_path, cube_cols, csv_name=CSV_NAME), metrics),
+            None, repeats,
+        ),
+        "load.stats_stream": (
+            lambda: build_stats_from_chunks(lambda: iter_esg_chunks(zip_path, stats_cols, csv_name=CSV_NAME)),
+            None, repeats,
+        ),
+    }
+
+
+def _bench_pages(df: pd.DataFrame, repeats: int) -> dict[str, tuple]:
+    from aggregates import AggregateCube
+    from stats_artifact import build_stats
+    from utils import compact_frame, freeze_frame
+
+    metrics = [c for c in df.columns if pd.api.types.is_float_dtype(df[c])]
+    cube = AggregateCube.from_frame(df, metrics)
+    return {
+        "pages.compact_frame": (lambda: freeze_frame(compact_frame(df)), None, repeats),
+        "pages.cube_build": (lambda: AggregateCube.from_frame(df, metrics), None, repeats),
+        "pages.trends_queries": (
+            lambda: (cube.year_means(metrics[:5], 2005, 2020), cube.year_division_means("ESG_Combined_Score", 2005, 2020)),
+            None, repeats,
+        ),
+        "pages.industry_queries": (
+            lambda: (cube.division_means("ESG_Combined_Score"), cube.year_division_means("ESG_Combined_Score")),
+            None, repeats,
+        ),
+        "pages.eda_stats": (lambda: build_stats(df), None, repeats),
+    }
+
+
+def _bench_fit(df: pd.DataFrame, repeats: int) -> dict[str, tuple]:
+    from playground import BOOSTING, LINEAR, cross_validate_model, fit_playground_model
+
+    features = ["ESG_Combined_Score", "Debt_Ratio", "Log_Assets", "CashFlow_Margin"]
+    data = df[features + ["EBITDA_Margin"]].dropna()
+    X, y = data[features].astype(np.float64), data["EBITDA_Margin"].astype(np.float64)
+    params = {"max_iter": 300, "learning_rate": 0.1, "max_depth": 5}
+    return {
+        "fit.linear": (lambda: fit_playground_model(X, y, LINEAR, {}), None, repeats),
+        "fit.boosting": (lambda: fit_playground_model(X, y, BOOSTING, params), None, 1),
+        "fit.boosting_cv5": (lambda: cross_validate_model(X, y, BOOSTING, params, folds=5), None, 1),
+    }
+
+
+def _bench_predict(df: pd.DataFrame, repeats: int) -> dict[str, tuple]:
+    from model_registry import get_registry
+    from scenarios import ESG_SCORE_COLS, RATIO_FEATURES, simulate_scenarios
+
+    registry = get_registry()
+    out = {}
+    for name in registry.files:
+        model = registry.get(name)
+        compiled = registry.get_compiled(name)
+        cols = list(model.feature_names_in_)
+        panel = df[cols].astype(np.float64)
+        row = panel.iloc[:1]
+        # Scenario-sized batch: one firm's features with varied ESG scores.
+        batch = pd.concat([row] * 1_000, ignore_index=True)
+        batch[ESG_SCORE_COLS] = np.tile(np.linspace(0, 1, 1_000)[:, None], (1, len(ESG_SCORE_COLS)))
+        for form, m in (("sklearn", model), ("compiled", compiled)):
+            for size, X in (("row", row), ("batch1k", batch), ("panel", panel)):
+                n = max(repeats, 20) if size == "row" else repeats
+                out[f"predict.{name}.{form}.{size}"] = (lambda m=m, X=X: m.predict(X), None, n)
+
+    # Monte Carlo page defaults: 10,000 draws at 11 shock levels, ratio noise on.
+    base = df[RATIO_FEATURES].iloc[0].astype(float).to_dict()
+    models = (registry.get_compiled("ebitda"), registry.get_compiled("operating"))
+    out["predict.simulate.10k_x11"] = (
+        lambda: list(simulate_scenarios(*models, base, (20, 30, 25), np.arange(0, 101, 10), 10_000, 10, 0.5, 0.05)),
+        None, repeats,
+    )
+    return out
+
+
+def first_view(page: str, zip_path: Path, workdir: Path, prewarm: bool = False) -> dict:
+    """
+    Time the first view of ``pages/<page>.py`` in a fresh interpreter.
+
+    ``workdir`` is emptied of every derived file first (sidecar, statistics
+    file, ``.cache``), so the view pays what the first visitor after a
+    deploy pays. With ``prewarm`` the view runs only after
+    :func:`prewarm.warm` has finished; its duration is reported separately.
+    """
+    import shutil
+
+    from stats_artifact import stats_path
+    from utils import sidecar_path
+
+    workdir.mkdir(parents=True, exist_ok=True)
+    shutil.rmtree(workdir / ".cache", ignore_errors=True)
+    data = workdir / "esg_cleaned_final.csv.zip"
+    for derived in (sidecar_path(data, CSV_NAME), stats_path(data), data):
+        derived.unlink(missing_ok=True)
+    shutil.copyfile(zip_path, data)
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    env.pop("ESG_TIMING_LOG", None)
+    out = subprocess.run(
+        [sys.executable, "-c", _FIRST_VIEW, str(ROOT / "pages" / f"{page}.py"), "1" if prewarm else "0"],
+        capture_output=True, text=True, cwd=workdir, env=env, check=True,
+    )
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    if res["errors"]:
+        raise RuntimeError(f"pages/{page}.py failed: {res['errors']}")
+    return res
+
+
+def _bench_startup(zip_path: Path, repeats: int, data_dir: Path) -> dict[str, dict]:
+    workdir = data_dir / "startup"
+    runs: dict[str, list[float]] = {}
+    for page in STARTUP_PAGES:
+        for _ in range(repeats):
+            cold = first_view(page, zip_path, workdir)
+            warm = first_view(page, zip_path, workdir, prewarm=True)
+            runs.setdefault(f"startup.{page}.cold", []).append(cold["view_s"])
+            runs.setdefault(f"startup.{page}.prewarmed", []).append(warm["view_s"])
+            runs.setdefault("startup.prewarm", []).append(warm["prewarm_s"])
+    return {
+        name: {"best_s": min(t), "median_s": statistics.median(t), "repeats": len(t)}
+        for name, t in runs.items()
+    }
+
+
+def run(
+    scales: list[int],
+    groups: tuple[str, ...] = GROUPS,
+    repeats: int = 3,
+    data_dir: Path = DEFAULT_DATA_DIR,
+    seed: int = 0,
+    log: Callable[[str], None] = print,
+) -> dict:
+    """Run the selected groups at every scale; returns the result document."""
+    from utils import load_esg_zip
+
+    results = []
+    for scale in scales:
+        start = time.perf_counter()
+        zip_path = panel_zip(scale, data_dir, seed)
+        log(f"x{scale}: panel ready in {time.perf_counter() - start:.1f}s ({zip_path})")
+        df = load_esg_zip(zip_path, CSV_NAME)
+        cases = {}
+        if "load" in groups:
+            cases.update(_bench_load(zip_path, repeats))
+        if "pages" in groups:
+            cases.update(_bench_pages(df, repeats))
+        if "fit" in groups:
+            cases.update(_bench_fit(df, repeats))
+        if "predict" in groups:
+            cases.update(_bench_predict(df, repeats))
+        timed = ((name, timeit(fn, n, setup)) for name, (fn, setup, n) in cases.items())
+        if "startup" in groups:
+            timed = itertools.chain(timed, _bench_startup(zip_path, repeats, data_dir).items())
+        for name, stats in timed:
+            results.append({"scale": scale, "rows": len(df), "name": name, **stats})
+            log(f"  {name:40s} {stats['best_s'] * 1e3:12.2f} ms")
+    return {"meta": environment(), "results": results}
+
+
+def environment() -> dict:
+    """Commit, versions and machine details stored with every run."""
+    import pyarrow
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pyarrow.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(base: dict, head: dict) -> pd.DataFrame:
+    """Best times of two runs side by side; ``ratio`` > 1 means head is slower."""
+    key = ["scale", "name"]
+    a = pd.DataFrame(base["results"]).set_index(key)["best_s"]
+    b = pd.DataFrame(head["results"]).set_index(key)["best_s"]
+    out = pd.DataFrame({"base_ms": a * 1e3, "head_ms": b * 1e3}).dropna()
+    out["ratio"] = out["head_ms"] / out["base_ms"]
+    return out
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the app's hot paths on synthetic panels.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100], help="panel size multiples")
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR), help="where generated panels are kept")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="diff two result files and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        base, head = (json.loads(Path(p).read_text()) for p in args.compare)
+        print(compare(base, head).to_string(float_format="%.3f"))
+        return
+
+    doc = run(args.scales, tuple(args.groups), args.repeats, Path(args.data_dir), args.seed)
+    Path(args.output).write_text(json.dumps(doc, indent=2))
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
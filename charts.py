@@ -0,0 +1,94 @@
+# charts.py
+"""
+Browser-rendered versions of the dense Division × Year charts.
+
+The static charts are rasterised with Matplotlib on the server for every
+interaction. These Plotly figures instead ship the small aggregated
+matrix once and let the browser do the rest: trend lines use WebGL
+(``Scattergl``), legend clicks hide divisions, and the heatmap has a
+division dropdown and a year range slider that restyle the chart
+client-side without a Streamlit rerun.
+
+Figures are built once per dataset version and shared by every session;
+treat them as read-only. Plotly is imported only when one is built, so
+the static mode never loads it.
+"""
+from typing import TYPE_CHECKING
+
+import streamlit as st
+
+from dataset import DATA_ZIP, get_aggregate_cube
+from instrumentation import span
+from utils import dataset_version
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+INTERACTIVE = "Interactive (browser)"
+STATIC = "Static image"
+
+
+def rendering_mode() -> str:
+    """Sidebar switch shared by the chart pages (interactive by default)."""
+    return st.sidebar.radio("Chart rendering", [INTERACTIVE, STATIC], key="chart_rendering")
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _trend_lines(version: str, metric: str) -> "go.Figure":
+    import plotly.graph_objects as go
+
+    trend = get_aggregate_cube().year_division_means(metric)
+    fig = go.Figure([
+        go.Scattergl(x=trend.index, y=trend[div], mode="lines", name=div)
+        for div in trend.columns
+    ])
+    fig.update_layout(
+        title=f"{metric.replace('_', ' ')} Trends by Industry",
+        xaxis_title="Year",
+        yaxis_title="ESG Score",
+        legend={"itemclick": "toggle", "itemdoubleclick": "toggleothers"},
+        height=550,
+    )
+    fig.update_xaxes(rangeslider_visible=True)
+    return fig
+
+
+def trend_lines(metric: str = "ESG_Combined_Score") -> "go.Figure":
+    """One WebGL line per Division over all years; filter from the legend."""
+    with span("render.trend_lines"):
+        return _trend_lines(dataset_version(DATA_ZIP), metric)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _division_heatmap(version: str, metric: str) -> "go.Figure":
+    import plotly.graph_objects as go
+
+    heat = get_aggregate_cube().year_division_means(metric)
+    years = heat.index.tolist()
+    divisions = heat.columns.tolist()
+    z = heat.T.to_numpy()
+    fig = go.Figure(go.Heatmap(
+        z=z, x=years, y=divisions, colorscale="YlGnBu", colorbar={"title": "Avg ESG"},
+        xgap=1, ygap=1, hovertemplate="%{y}<br>%{x}: %{z:.2f}<extra></extra>",
+    ))
+    # Division filter runs in the browser: each button swaps in one row.
+    buttons = [{"label": "All", "method": "restyle", "args": [{"z": [z], "y": [divisions]}]}]
+    buttons += [
+        {"label": div, "method": "restyle", "args": [{"z": [z[i:i + 1]], "y": [[div]]}]}
+        for i, div in enumerate(divisions)
+    ]
+    fig.update_layout(
+        updatemenus=[{"buttons": buttons, "x": 0, "xanchor": "left", "y": 1.15, "yanchor": "top"}],
+        xaxis_title="Year",
+        yaxis_title="Division",
+        height=max(400, 28 * len(divisions) + 160),
+        margin={"t": 80},
+    )
+    fig.update_xaxes(rangeslider_visible=True, dtick=1, tickangle=-90)
+    return fig
+
+
+def division_heatmap(metric: str = "ESG_Combined_Score") -> "go.Figure":
+    """Division × Year heatmap with in-chart division and year filters."""
+    with span("render.division_heatmap"):
+        return _division_heatmap(dataset_version(DATA_ZIP), metric)
@@ -0,0 +1,123 @@
+# dataset.py
+"""
+Shared, process-wide access to the ESG panel for every page.
+
+``st.cache_data`` pickles and copies its return value for each caller; the
+panel here is cached with ``st.cache_resource`` instead, so all sessions on
+a server process read the same compacted, read-only frames. Treat them as
+immutable: filter or ``.copy()`` before modifying.
+
+Pages should ask only for the columns (and rows) they use; each distinct
+slice is loaded once via the pushed-down reads in :func:`utils.load_esg_zip`.
+The aggregate cube and the EDA statistics never load the panel at all:
+they stream it in chunks, so they work for panels larger than memory.
+"""
+import pandas as pd
+import streamlit as st
+
+from aggregates import AggregateCube
+from instrumentation import span
+from stats_artifact import load_or_build_stats
+from utils import (
+    DIVISION_COL,
+    YEAR_COL,
+    compact_frame,
+    dataset_version,
+    freeze_frame,
+    iter_esg_chunks,
+    load_esg_dtypes,
+    load_esg_zip,
+)
+
+DATA_ZIP = "esg_cleaned_final.csv.zip"
+
+
+def _key(values) -> tuple | None:
+    return None if values is None else tuple(values)
+
+
+@st.cache_resource(show_spinner="Loading ESG panel…", max_entries=16)
+def _shared_frame(
+    version: str,
+    zip_path: str,
+    columns: tuple | None,
+    years: tuple | None,
+    divisions: tuple | None,
+    full_precision: bool,
+) -> pd.DataFrame:
+    # ``version`` is only part of the cache key: a new zip misses the cache.
+    df = load_esg_zip(
+        zip_path,
+        columns=None if columns is None else list(columns),
+        years=years,
+        divisions=None if divisions is None else list(divisions),
+    )
+    return freeze_frame(compact_frame(df, downcast_floats=not full_precision))
+
+
+def get_esg_data(
+    columns: list[str] | None = None,
+    years: tuple[int, int] | None = None,
+    divisions: list[str] | None = None,
+    zip_path: str = DATA_ZIP,
+    full_precision: bool = False,
+) -> pd.DataFrame:
+    """
+    Return a shared slice of the ESG panel (the whole panel by default).
+
+    Strings such as ``Division`` and ``ticker_ann`` are categoricals and
+    floats are float32 where that is accurate to 1e-6 (see
+    :func:`utils.compact_frame`). Ask for ``full_precision`` to keep
+    floats as read, e.g. to fit models. Slices are reloaded only when the
+    zip's content changes.
+    """
+    with span("data.load"):
+        return _shared_frame(
+            dataset_version(zip_path), zip_path, _key(columns), _key(years), _key(divisions),
+            full_precision,
+        )
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _shared_dtypes(version: str, zip_path: str) -> pd.Series:
+    return load_esg_dtypes(zip_path)
+
+
+def get_esg_dtypes(zip_path: str = DATA_ZIP) -> pd.Series:
+    """Column dtypes of the panel, read from the sidecar schema."""
+    with span("data.dtypes"):
+        return _shared_dtypes(dataset_version(zip_path), zip_path)
+
+
+def cube_metrics(dtypes: pd.Series) -> list[str]:
+    """Every float column of the panel: ESG scores, returns and ratios."""
+    return [c for c, t in dtypes.items() if pd.api.types.is_float_dtype(t)]
+
+
+@st.cache_resource(show_spinner="Aggregating ESG panel…", max_entries=1)
+def _shared_cube(version: str, zip_path: str) -> AggregateCube:
+    metrics = cube_metrics(get_esg_dtypes(zip_path))
+    chunks = iter_esg_chunks(zip_path, columns=[YEAR_COL, DIVISION_COL] + metrics)
+    return AggregateCube.from_chunks(chunks, metrics)
+
+
+def get_aggregate_cube(zip_path: str = DATA_ZIP) -> AggregateCube:
+    """
+    Year × Division cube of the panel, built once per dataset version.
+
+    Built out of core (see :class:`aggregates.CubeAccumulator`), with the
+    same values as aggregating the loaded panel.
+    """
+    with span("aggregate.cube"):
+        return _shared_cube(dataset_version(zip_path), zip_path)
+
+
+@st.cache_resource(show_spinner="Computing dataset statistics…", max_entries=1)
+def _shared_stats(version: str, zip_path: str) -> dict:
+    return load_or_build_stats(zip_path)
+
+
+def get_esg_stats(zip_path: str = DATA_ZIP) -> dict:
+    """EDA statistics (see :mod:`stats_artifact`), built once per dataset version."""
+    with span("aggregate.stats"):
+        return _shared_stats(dataset_version(zip_path), zip_path)
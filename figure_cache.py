@@ -0,0 +1,145 @@
+# figure_cache.py
+"""
+Rendered-figure cache for the Matplotlib/Seaborn pages.
+
+A figure is identified by the dataset version plus whatever page state
+drew it (chart name, sliders, selections). On a miss the page's drawing
+function runs once, the figure is saved to PNG or SVG bytes and closed
+straight away, and the bytes go into a process-wide LRU bounded by total
+size. Every later view with the same inputs, from any session, just
+sends the bytes.
+
+Matplotlib and Seaborn are imported on the first miss (:func:`pyplot`,
+:func:`seaborn`), so serving cached figures never pays for them.
+"""
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from functools import cache
+from importlib.metadata import version
+from typing import Callable
+
+import streamlit as st
+
+from dataset import DATA_ZIP
+from instrumentation import span
+from utils import dataset_version
+
+# Same look as st.pyplot's defaults.
+SAVEFIG_OPTIONS = {"bbox_inches": "tight", "dpi": 200}
+
+
+class FigureCache:
+    """
+    Thread-safe LRU of rendered figure bytes.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Least recently used images are dropped once the total exceeds this.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last=False)
+                self._size -= len(dropped)
+
+    def render(self, key: str, draw: Callable, fmt: str = "png") -> bytes:
+        """Return the cached bytes for ``key``, drawing and saving on a miss."""
+        data = self.get(key)
+        if data is None:
+            fig = draw()
+            buf = io.BytesIO()
+            try:
+                fig.savefig(buf, format=fmt, **SAVEFIG_OPTIONS)
+            finally:
+                pyplot().close(fig)  # pyplot keeps every open figure alive otherwise
+            data = buf.getvalue()
+            self.put(key, data)
+        return data
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def pyplot():
+    """``matplotlib.pyplot``, imported on first use."""
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def seaborn(style: str = "whitegrid"):
+    """``seaborn`` with ``style`` applied globally, imported on first use."""
+    import seaborn as sns
+
+    sns.set_style(style)
+    return sns
+
+
+@cache
+def _matplotlib_version() -> str:
+    # From the package metadata, so building a key does not import matplotlib.
+    return version("matplotlib")
+
+
+def figure_key(*parts) -> str:
+    """Stable key from JSON-able parts (tuples, lists, numbers, strings)."""
+    blob = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+_cache: FigureCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_figure_cache() -> FigureCache:
+    """The figure cache shared by every page and session in this process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FigureCache()
+        return _cache
+
+
+def cached_figure(name: str, state: dict, draw: Callable, fmt: str = "png") -> None:
+    """
+    Show a figure drawn by ``draw()``, reusing earlier renders.
+
+    ``name`` identifies the chart and ``state`` must hold every widget
+    value ``draw`` depends on; the dataset version is added automatically.
+    """
+    with span(f"render.{name}"):
+        key = figure_key(name, state, fmt, dataset_version(DATA_ZIP), _matplotlib_version())
+        data = get_figure_cache().render(key, draw, fmt)
+        st.image(data.decode() if fmt == "svg" else data, width="stretch")
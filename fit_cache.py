@@ -0,0 +1,179 @@
+# fit_cache.py
+"""
+Content-addressed cache of fitted Playground models and their metrics.
+
+A fit is identified by everything that can change its outcome: dataset
+hash, target, feature list, model type, hyperparameters and the sklearn
+version. Results live in an in-memory LRU shared by all sessions and in a
+size-bounded directory of joblib files, so revisiting a configuration is
+instant even after a restart. Concurrent requests for the same key wait
+for one fit instead of each running their own.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import joblib
+import pandas as pd
+import sklearn
+
+DEFAULT_CACHE_DIR = Path(".cache") / "fits"
+# Bump when fitting changes without any key input changing.
+KEY_VERSION = 2
+
+
+@dataclass
+class FitResult:
+    """A fitted model plus what the Playground displays about it."""
+
+    model: object
+    metrics: dict[str, float]
+    weights: pd.DataFrame
+    n_rows: int
+    fit_seconds: float
+    extras: dict = field(default_factory=dict)
+
+
+def fit_key(
+    dataset_hash: str,
+    target: str,
+    features: list[str],
+    model_type: str,
+    params: dict,
+) -> str:
+    """Stable SHA-256 key for one training configuration."""
+    payload = {
+        "version": KEY_VERSION,
+        "dataset": dataset_hash,
+        "target": target,
+        "features": list(features),
+        "model": model_type,
+        "params": params,
+        "sklearn": sklearn.__version__,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+class FitCache:
+    """
+    Two-tier cache of :class:`FitResult` objects.
+
+    Parameters
+    ----------
+    max_entries : int
+        Bound on the in-memory LRU tier.
+    cache_dir : str or Path, optional
+        Directory of the on-disk tier; ``None`` disables it.
+    max_disk_bytes : int
+        Least recently used files are deleted once the directory exceeds this.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 32,
+        cache_dir: str | Path | None = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = 256 * 2**20,
+    ):
+        self.max_entries = max_entries
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.max_disk_bytes = max_disk_bytes
+        self._mem: OrderedDict[str, FitResult] = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.joblib"
+
+    def _remember(self, key: str, result: FitResult) -> None:
+        with self._lock:
+            self._mem[key] = result
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str) -> FitResult | None:
+        """Return a cached result (memory first, then disk) or ``None``."""
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            result = joblib.load(path)
+            os.utime(path)  # mark as recently used for disk eviction
+        except (OSError, EOFError, ValueError, AttributeError, ImportError):
+            return None
+        self._remember(key, result)
+        return result
+
+    def put(self, key: str, result: FitResult) -> None:
+        """Store ``result`` in both tiers; disk failures are ignored."""
+        self._remember(key, result)
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            joblib.dump(result, tmp)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except OSError:
+            pass
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.cache_dir.glob("*.joblib"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for old in files:
+            if total <= self.max_disk_bytes:
+                break
+            total -= old.stat().st_size
+            old.unlink(missing_ok=True)
+
+    def get_or_fit(self, key: str, fit: Callable[[], FitResult]) -> tuple[FitResult, bool]:
+        """
+        Return ``(result, was_cached)``, running ``fit`` only on a miss.
+
+        Sessions asking for the same key at once share a single fit.
+        """
+        hit = self.get(key)
+        if hit is not None:
+            return hit, True
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                hit = self.get(key)
+                if hit is not None:
+                    return hit, True
+                start = time.perf_counter()
+                result = fit()
+                result.fit_seconds = result.fit_seconds or time.perf_counter() - start
+                self.put(key, result)
+        finally:
+            # Also when ``fit`` raises, so failing keys don't pile up.
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return result, False
+
+
+_cache: FitCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_fit_cache() -> FitCache:
+    """The fit cache shared by every session in this process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FitCache()
+        return _cache
@@ -0,0 +1,384 @@
+# instrumentation.py
+"""
+Named timing spans around each page run, plus an opt-in profiler.
+
+``streamlit_app.py`` wraps ``pg.run()`` in :func:`page_run`; code on the
+hot paths marks its phases with :func:`span`::
+
+    with span("data.load"):
+        df = get_esg_data(...)
+
+Spans are recorded only while a run is being instrumented, which happens
+when ``ESG_TIMING_LOG`` names a file (every run of every session is then
+appended to it as JSON lines) or when a session opened the app with
+``?timing=1`` (a sidebar panel then shows that session's last run).
+Otherwise :func:`span` returns a shared no-op context manager after one
+context-variable lookup, so leaving the calls in costs nothing measurable.
+
+From the sidebar panel one rerun can be profiled, either with cProfile
+(every call, ``.prof`` output for ``snakeviz``/``pstats``) or with a
+wall-clock stack sampler (low overhead, includes time spent waiting on
+I/O, collapsed-stack output for flame-graph viewers). Profiles are kept
+under ``.cache/profiles``.
+"""
+import contextvars
+import cProfile
+import hashlib
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+LOG_ENV = "ESG_TIMING_LOG"
+PANEL_PARAM = "timing"
+PROFILE_DIR = Path(".cache") / "profiles"
+CPROFILE = "cProfile"
+SAMPLING = "Sampling"
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+_PANEL_KEY = "_timing_panel"
+_PROFILE_KEY = "_timing_profile_next"
+
+
+@dataclass
+class PageRun:
+    """Spans collected during one run of one page."""
+
+    run_id: str
+    session: str
+    page: str
+    state_hash: str
+    started: float                      # perf_counter at the start of the run
+    timestamp: float                    # wall clock at the start of the run
+    spans: list[dict] = field(default_factory=list)
+    depth: int = 0
+    open: bool = True
+
+
+_current: contextvars.ContextVar[PageRun | None] = contextvars.ContextVar("page_run", default=None)
+_NULL = nullcontext()
+_log_lock = threading.Lock()
+
+
+def span(name: str):
+    """
+    Context manager timing ``name`` within the current page run.
+
+    A no-op outside an instrumented run (disabled, or in a background
+    thread), so library code can call it unconditionally.
+    """
+    run = _current.get()
+    if run is None or not run.open:
+        return _NULL
+    return _timed(run, name)
+
+
+@contextmanager
+def _timed(run: PageRun, name: str):
+    start = time.perf_counter()
+    run.depth += 1
+    try:
+        yield
+    finally:
+        run.depth -= 1
+        run.spans.append({
+            "name": name,
+            "start_ms": (start - run.started) * 1e3,
+            "ms": (time.perf_counter() - start) * 1e3,
+            "depth": run.depth + 1,
+        })
+
+
+def widget_state_hash(state: dict) -> str:
+    """Short hash of the plain widget values in ``state`` (private ``_`` keys skipped)."""
+    plain = {
+        str(k): v for k, v in state.items()
+        if not str(k).startswith("_") and isinstance(v, (bool, int, float, str, list, tuple, type(None)))
+    }
+    blob = json.dumps(plain, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def _session_id() -> str:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "no-session"
+
+
+def panel_enabled() -> bool:
+    """Whether this session asked for the timing panel (``?timing=1``, remembered across pages)."""
+    import streamlit as st
+
+    if st.query_params.get(PANEL_PARAM) == "1":
+        st.session_state[_PANEL_KEY] = True
+    return bool(st.session_state.get(_PANEL_KEY))
+
+
+def write_spans(path: str | Path, run: PageRun, total_ms: float) -> None:
+    """Append one JSON line per span, plus one for the whole page, to ``path``."""
+    common = {
+        "run_id": run.run_id,
+        "ts": run.timestamp,
+        "session": run.session,
+        "page": run.page,
+        "state_hash": run.state_hash,
+    }
+    records = [{**common, "name": "page", "start_ms": 0.0, "ms": total_ms, "depth": 0}]
+    records += [{**common, **s} for s in sorted(run.spans, key=lambda s: s["start_ms"])]
+    lines = "".join(json.dumps(r) + "\n" for r in records)
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with _log_lock, open(path, "a", encoding="utf-8") as fh:
+            fh.write(lines)
+    except OSError:
+        pass  # timing must never break a page
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every ``interval`` seconds.
+
+    Wall-clock based: a thread blocked on I/O is sampled too. Stacks are
+    counted outermost frame first, as ``(function, file, line)`` tuples.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, Path(code.co_filename).name, frame.f_lineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """Flame-graph input (``speedscope``, ``flamegraph.pl``)."""
+        return "".join(
+            ";".join(f"{name} ({file}:{line})" for name, file, line in stack) + f" {n}\n"
+            for stack, n in self.stacks.most_common()
+        )
+
+    def summary(self, limit: int = 25) -> str:
+        """Functions by share of samples with them on the stack, and hottest lines."""
+        total = sum(self.stacks.values())
+        if not total:
+            return "No samples: the run was shorter than the sampling interval."
+        inclusive, own = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            for name, file in {(name, file) for name, file, _ in stack}:
+                inclusive[f"{name} ({file})"] += n
+            name, file, line = stack[-1]
+            own[f"{name} ({file}:{line})"] += n
+        lines = [f"{total} samples every {self.interval * 1e3:.0f} ms", "", "  total%  function"]
+        lines += [f"  {100 * n / total:6.1f}  {f}" for f, n in inclusive.most_common(limit)]
+        lines += ["", "   self%  line"]
+        lines += [f"  {100 * n / total:6.1f}  {f}" for f, n in own.most_common(limit)]
+        return "\n".join(lines)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", text).strip("-").lower() or "page"
+
+
+def _save_profile(kind: str, profiler, run: PageRun) -> dict:
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run.timestamp))
+    stem = PROFILE_DIR / f"{stamp}-{_slug(run.page)}-{run.run_id}"
+    if kind == CPROFILE:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        path, text = stem.with_suffix(".prof"), out.getvalue()
+        write = lambda p: profiler.dump_stats(p)  # noqa: E731
+    else:
+        path, text = stem.with_suffix(".collapsed"), profiler.summary()
+        write = lambda p: p.write_text(profiler.collapsed())  # noqa: E731
+    try:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        write(path)
+    except OSError:
+        path = None
+    return {"kind": kind, "path": None if path is None else str(path), "text": text}
+
+
+class _SessionStore:
+    """Last run and last profile per session, kept outside ``st.session_state``.
+
+    A page that calls ``st.stop()`` cannot write session state or draw
+    anything afterwards, so the record of its run is kept here instead.
+    """
+
+    def __init__(self, max_sessions: int = 256):
+        self.max_sessions = max_sessions
+        self._items: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: str) -> dict:
+        with self._lock:
+            return dict(self._items.get(session, {}))
+
+    def update(self, session: str, **values) -> None:
+        with self._lock:
+            self._items.setdefault(session, {}).update(values)
+            self._items.move_to_end(session)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+
+
+_store = _SessionStore()
+
+
+@contextmanager
+def page_run(page: str):
+    """
+    Instrument one run of ``page``; wraps ``pg.run()`` in ``streamlit_app.py``.
+
+    Does nothing unless ``ESG_TIMING_LOG`` is set or the session enabled the
+    panel. Runs that end in ``st.stop()`` or ``st.rerun()`` still have their
+    spans recorded. With the panel on, it is drawn before the page runs
+    (showing the previous run) and refreshed with this run's breakdown if
+    the page finishes normally.
+    """
+    import streamlit as st
+
+    log_path = os.environ.get(LOG_ENV)
+    panel = panel_enabled()
+    if not (log_path or panel):
+        yield None
+        return
+
+    session = _session_id()
+    slot = _timing_panel(session) if panel else None
+    profile_kind = st.session_state.pop(_PROFILE_KEY, None) if panel else None
+    run = PageRun(
+        run_id=uuid.uuid4().hex[:12],
+        session=session,
+        page=page,
+        state_hash=widget_state_hash(st.session_state.to_dict()),
+        started=time.perf_counter(),
+        timestamp=time.time(),
+    )
+    token = _current.set(run)
+    profiler = None
+    if profile_kind == CPROFILE:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif profile_kind == SAMPLING:
+        profiler = StackSampler(threading.get_ident()).start()
+    try:
+        yield run
+    finally:
+        if profile_kind == CPROFILE:
+            profiler.disable()
+        elif profile_kind == SAMPLING:
+            profiler.stop()
+        total_ms = (time.perf_counter() - run.started) * 1e3
+        run.open = False
+        _current.reset(token)
+        if log_path:
+            write_spans(log_path, run, total_ms)
+        last = {"page": run.page, "total_ms": total_ms, "spans": run.spans}
+        if panel:
+            _store.update(session, last=last)
+            if profiler is not None:
+                _store.update(session, profile=_save_profile(profile_kind, profiler, run))
+    # Only reached when the page finished normally.
+    if slot is not None:
+        _show_run(slot, last, _store.get(session).get("profile") if profiler is not None else None)
+
+
+def breakdown(spans: list[dict], total_ms: float):
+    """Top-level spans summed by name, plus the page time outside any span."""
+    import pandas as pd
+
+    top = pd.DataFrame([s for s in spans if s["depth"] == 1], columns=["name", "start_ms", "ms", "depth"])
+    table = (
+        top.groupby("name", sort=False)
+        .agg(calls=("ms", "size"), ms=("ms", "sum"), first_ms=("start_ms", "min"))
+        .sort_values("first_ms")
+        .drop(columns="first_ms")
+        .reset_index()
+    )
+    other = max(total_ms - table["ms"].sum(), 0.0)
+    table = pd.concat(
+        [table, pd.DataFrame([{"name": "other (widgets, layout)", "calls": 1, "ms": other}])],
+        ignore_index=True,
+    )
+    table["share"] = table["ms"] / total_ms if total_ms > 0 else 0.0
+    return table
+
+
+def _show_run(slot, last: dict | None, profile: dict | None = None) -> None:
+    import streamlit as st
+
+    with slot.container():
+        if last is None:
+            st.caption("Timings appear after the first run.")
+            return
+        st.caption(f"Last run: **{last['page']}** · {last['total_ms']:,.0f} ms")
+        st.dataframe(
+            breakdown(last["spans"], last["total_ms"]),
+            hide_index=True,
+            column_config={
+                "name": "Span",
+                "ms": st.column_config.NumberColumn("ms", format="%.1f"),
+                "share": st.column_config.ProgressColumn("Share", min_value=0.0, max_value=1.0, format="percent"),
+            },
+        )
+        nested = [s for s in last["spans"] if s["depth"] > 1]
+        if nested:
+            with st.popover("Nested spans"):
+                st.dataframe(nested, hide_index=True)
+        if profile:
+            st.caption(f"{profile['kind']} profile of this run")
+            st.code(profile["text"], language=None)
+
+
+def _timing_panel(session: str):
+    """Draw the sidebar panel with the previous run; returns the slot to refresh."""
+    import streamlit as st
+
+    stored = _store.get(session)
+    with st.sidebar.expander("⏱️ Page timing", expanded=True):
+        slot = st.empty()
+        _show_run(slot, stored.get("last"))
+        kind = st.radio("Profiler", [CPROFILE, SAMPLING], horizontal=True, key="_timing_profiler")
+        st.button(
+            "Profile next rerun",
+            on_click=lambda: st.session_state.__setitem__(_PROFILE_KEY, kind),
+            help="Reruns the page once under the profiler.",
+        )
+        profile = stored.get("profile")
+        if profile and profile["path"] and Path(profile["path"]).exists():
+            path = Path(profile["path"])
+            st.download_button(
+                f"Download last profile ({path.suffix})", path.read_bytes(), path.name,
+                key="_timing_profile_download",
+            )
+    return slot
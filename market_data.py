@@ -0,0 +1,340 @@
+# market_data.py
+"""
+Cached access to the Yahoo Finance data behind the Predict by Ticker page.
+
+Fetches are keyed by (ticker, endpoint) and go through two tiers: an
+in-memory LRU with a TTL for hot entries, and pickles on local disk that
+survive restarts. Both tiers are bounded. The data source is pluggable:
+:class:`YahooProvider` talks to the network, :class:`FileProvider` serves
+saved frames from a directory so the page runs fully offline.
+
+Set ``ESG_MARKET_DATA_DIR`` to a directory laid out as
+``<dir>/<TICKER>/<endpoint>.csv`` to use the file-backed provider.
+"""
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Iterator, Protocol
+
+import pandas as pd
+
+ENDPOINTS = ("sustainability", "balance_sheet", "financials", "cashflow")
+
+DEFAULT_TTL = 12 * 3600
+DEFAULT_CACHE_DIR = Path(".cache") / "market_data"
+DEFAULT_TIMEOUT = 15.0
+
+# Shared by every session; fetches are network-bound, so threads suffice.
+_fetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="market-data")
+
+
+class MarketDataError(RuntimeError):
+    """A provider could not return data for a ticker/endpoint."""
+
+
+@dataclass
+class FetchResult:
+    """Outcome of :meth:`CachedMarketData.fetch_all` for one ticker."""
+
+    ticker: str
+    frames: dict[str, pd.DataFrame] = field(default_factory=dict)
+    errors: dict[str, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class Provider(Protocol):
+    def fetch(self, ticker: str, endpoint: str) -> pd.DataFrame: ...
+
+
+class YahooProvider:
+    """Live data through ``yfinance`` (imported on first use)."""
+
+    def fetch(self, ticker: str, endpoint: str) -> pd.DataFrame:
+        import yfinance as yf
+
+        frame = getattr(yf.Ticker(ticker), endpoint)
+        return pd.DataFrame() if frame is None else frame
+
+
+class FileProvider:
+    """
+    Offline stand-in that reads ``<root>/<TICKER>/<endpoint>.csv``.
+
+    The CSVs are the Yahoo frames saved with ``DataFrame.to_csv()`` (line
+    items as the index). A missing file behaves like an empty response.
+    """
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def fetch(self, ticker: str, endpoint: str) -> pd.DataFrame:
+        path = self.root / ticker / f"{endpoint}.csv"
+        if not path.exists():
+            return pd.DataFrame()
+        return pd.read_csv(path, index_col=0)
+
+
+class CachedMarketData:
+    """
+    TTL + LRU cache in front of a :class:`Provider`, persisted to disk.
+
+    Parameters
+    ----------
+    provider : Provider
+        Where cache misses are fetched from.
+    ttl : float
+        Seconds an entry stays fresh, in memory and on disk.
+    max_entries : int
+        Bound on the in-memory tier; least recently used entries go first.
+    cache_dir : str or Path, optional
+        Directory for the on-disk tier. ``None`` keeps the cache in memory.
+    max_disk_entries : int
+        Bound on the on-disk tier; oldest files are pruned first.
+    """
+
+    def __init__(
+        self,
+        provider: Provider,
+        ttl: float = DEFAULT_TTL,
+        max_entries: int = 256,
+        cache_dir: str | Path | None = DEFAULT_CACHE_DIR,
+        max_disk_entries: int = 2000,
+    ):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        self.max_disk_entries = max_disk_entries
+        self._mem: OrderedDict[tuple[str, str], tuple[float, pd.DataFrame]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _disk_path(self, ticker: str, endpoint: str) -> Path:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker)
+        return self.cache_dir / f"{safe}__{endpoint}.pkl"
+
+    def _remember(self, key: tuple[str, str], fetched_at: float, frame: pd.DataFrame) -> None:
+        with self._lock:
+            self._mem[key] = (fetched_at, frame)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def _from_memory(self, key: tuple[str, str], now: float) -> pd.DataFrame | None:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is None:
+                return None
+            if now - hit[0] > self.ttl:
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            return hit[1]
+
+    def _from_disk(self, key: tuple[str, str], now: float) -> pd.DataFrame | None:
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(*key)
+        try:
+            fetched_at = path.stat().st_mtime
+            if now - fetched_at > self.ttl:
+                return None
+            frame = pd.read_pickle(path)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        self._remember(key, fetched_at, frame)
+        return frame
+
+    def _to_disk(self, key: tuple[str, str], frame: pd.DataFrame) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(*key)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            frame.to_pickle(tmp)
+            os.replace(tmp, path)
+            self._prune_disk()
+        except OSError:
+            pass
+
+    def _prune_disk(self) -> None:
+        files = sorted(self.cache_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        for stale in files[: max(0, len(files) - self.max_disk_entries)]:
+            stale.unlink(missing_ok=True)
+
+    def get(self, ticker: str, endpoint: str) -> pd.DataFrame:
+        """
+        Return the frame for ``ticker``/``endpoint``, fetching on a miss.
+
+        Raises
+        ------
+        ValueError
+            If ``endpoint`` is not one of :data:`ENDPOINTS`.
+        MarketDataError
+            If the provider fails. Failures are not cached.
+        """
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{endpoint}'. Expected one of {ENDPOINTS}.")
+        key = (ticker.upper(), endpoint)
+        now = time.time()
+        frame = self._from_memory(key, now)
+        if frame is None:
+            frame = self._from_disk(key, now)
+        if frame is not None:
+            return frame
+
+        try:
+            frame = self.provider.fetch(key[0], endpoint)
+        except Exception as e:
+            raise MarketDataError(f"{endpoint} fetch failed for {key[0]}: {e}") from e
+        self._remember(key, now, frame)
+        self._to_disk(key, frame)
+        return frame
+
+    def fetch_all(
+        self,
+        ticker: str,
+        endpoints: tuple[str, ...] = ENDPOINTS,
+        timeout: float = DEFAULT_TIMEOUT,
+        pool: ThreadPoolExecutor | None = None,
+    ) -> FetchResult:
+        """
+        Fetch several endpoints for one ticker concurrently.
+
+        All endpoints share one deadline of ``timeout`` seconds, so the
+        wait is about as long as the slowest call rather than the sum.
+        Each endpoint that fails or misses the deadline gets a message in
+        ``errors`` instead of a frame. A late fetch keeps running and still
+        fills the cache for the next rerun.
+
+        Endpoints run on ``pool``, by default the process-wide pool shared
+        by all sessions. The deadline counts any wait for a free thread
+        there too.
+        """
+        start = time.perf_counter()
+        pool = pool or _fetch_pool
+        futures = {pool.submit(self.get, ticker, ep): ep for ep in endpoints}
+        done, pending = wait(futures, timeout=timeout)
+
+        result = FetchResult(ticker=ticker.upper())
+        for fut, ep in futures.items():
+            if fut in pending:
+                result.errors[ep] = f"timed out after {timeout:g}s"
+            elif fut.exception() is not None:
+                result.errors[ep] = str(fut.exception())
+            else:
+                result.frames[ep] = fut.result()
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def fetch_many(
+        self,
+        tickers: list[str],
+        max_workers: int = 8,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Iterator[FetchResult]:
+        """
+        Fetch many tickers with at most ``max_workers`` in flight.
+
+        Yields one :class:`FetchResult` per ticker in completion order, so
+        callers can show partial results while the rest are still loading.
+        ``timeout`` applies to each ticker separately. The endpoints get
+        their own threads, one per endpoint of each ticker in flight, so
+        that deadline is not spent queueing behind other sessions.
+
+        If the caller stops iterating (e.g. a Streamlit rerun), tickers not
+        yet started are cancelled and the generator returns at once.
+        """
+        tickers_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="portfolio")
+        endpoints_pool = ThreadPoolExecutor(
+            max_workers=max_workers * len(ENDPOINTS), thread_name_prefix="portfolio-endpoint"
+        )
+        try:
+            futures = [
+                tickers_pool.submit(self.fetch_all, t, timeout=timeout, pool=endpoints_pool)
+                for t in tickers
+            ]
+            for fut in as_completed(futures):
+                yield fut.result()
+        finally:
+            tickers_pool.shutdown(wait=False, cancel_futures=True)
+            endpoints_pool.shutdown(wait=False, cancel_futures=True)
+
+    def clear(self) -> None:
+        """Drop the in-memory tier (the disk tier expires on its own)."""
+        with self._lock:
+            self._mem.clear()
+
+
+def default_market_data() -> CachedMarketData:
+    """Offline provider when ``ESG_MARKET_DATA_DIR`` is set, Yahoo otherwise."""
+    offline_dir = os.environ.get("ESG_MARKET_DATA_DIR")
+    if offline_dir:
+        return CachedMarketData(FileProvider(offline_dir), cache_dir=None)
+    return CachedMarketData(YahooProvider())
+
+
+def parse_tickers(text: str) -> list[str]:
+    """Upper-cased, de-duplicated tickers from comma/space/newline separated text."""
+    return list(dict.fromkeys(t.upper() for t in re.split(r"[\s,;]+", text or "") if t))
+
+
+def tickers_from_csv(file: str | Path | IO) -> list[str]:
+    """
+    Tickers from an uploaded watchlist CSV.
+
+    Uses a ``ticker``/``symbol`` column when there is one (any case),
+    otherwise the first column.
+    """
+    df = pd.read_csv(file, dtype=str)
+    by_name = {c.strip().lower(): c for c in df.columns}
+    col = next((by_name[k] for k in ("ticker", "symbol", "ticker_ann") if k in by_name), df.columns[0])
+    return parse_tickers(" ".join(df[col].dropna()))
+
+
+def firm_inputs(frames: dict[str, pd.DataFrame]) -> dict:
+    """
+    Pull the raw ESG risks and statement values the models need.
+
+    Raises
+    ------
+    MarketDataError
+        If there is no ESG data or a required statement line is missing
+        or has no reported periods.
+    """
+    sustainability = frames["sustainability"]
+    if sustainability is None or sustainability.empty:
+        raise MarketDataError("No ESG data for this ticker.")
+    bs, fin, cf = frames["balance_sheet"], frames["financials"], frames["cashflow"]
+    return {
+        # Raw ESG risk scores (0-100, lower better)
+        "env_risk": _latest(sustainability, "environmentScore"),
+        "soc_risk": _latest(sustainability, "socialScore"),
+        "gov_risk": _latest(sustainability, "governanceScore"),
+        "total_assets": _latest(bs, "Total Assets"),
+        "total_liab": _latest(bs, "Total Liabilities Net Minority Interest"),
+        "revenue": _latest(fin, "Total Revenue"),
+        "net_income": _latest(fin, "Net Income"),
+        "cash_ops": _latest(cf, "Operating Cash Flow"),
+        "capex": _latest(cf, "Capital Expenditure"),
+    }
+
+
+def _latest(frame: pd.DataFrame, line: str):
+    # First column is the latest period; a statement may have none at all.
+    try:
+        return frame.loc[line].iloc[0]
+    except KeyError as e:
+        raise MarketDataError(f"Missing statement line '{line}' for this ticker.") from e
+    except IndexError as e:
+        raise MarketDataError(f"No reported periods for '{line}' for this ticker.") from e
@@ -0,0 +1,193 @@
+# model_registry.py
+"""
+Process-wide registry for the trained margin models.
+
+Each artifact is loaded once per process with ``joblib.load(mmap_mode="r")``
+so the tree arrays are memory-mapped from the pickle: several server
+workers share the same physical pages instead of holding private copies.
+Every lookup stats the file (cheap); only when size or mtime moved is the
+file re-hashed, and only a changed hash triggers a reload.
+
+:meth:`ModelRegistry.get_compiled` additionally serves the flat-array
+version of a model (see :mod:`tree_engine`), compiled once per artifact
+hash, for the small batches the pages score.
+"""
+import json
+import threading
+import time
+import warnings
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from tree_engine import compile_pipeline
+from utils import file_digest
+
+ROOT = Path(__file__).resolve().parent
+
+MODEL_FILES = {
+    "ebitda": "ebitda_margin_model.pkl",
+    "operating": "operating_margin_model.pkl",
+}
+MANIFEST_FILE = "models_manifest.json"  # written by train_models.py
+
+
+def resolve_artifact(fname: str) -> Path:
+    """Find a model file in the repo root or ``pages/`` (first match wins)."""
+    for p in (ROOT / fname, ROOT / "pages" / fname):
+        if p.exists():
+            return p
+    raise FileNotFoundError(f"Model file '{fname}' not found. Upload it to repo root or pages/.")
+
+
+def load_manifest() -> dict | None:
+    """
+    The training manifest written by :mod:`train_models`, or ``None``.
+
+    Returns ``None`` when no manifest exists (e.g. for the original
+    notebook-trained artifacts) or it cannot be parsed.
+    """
+    try:
+        return json.loads(resolve_artifact(MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+@dataclass(frozen=True)
+class ArtifactInfo:
+    """What is currently loaded for one registry entry."""
+
+    name: str
+    path: Path
+    sha256: str
+    size: int
+    mtime_ns: int
+    loaded_at: float
+    load_seconds: float
+
+
+class ModelRegistry:
+    """
+    Load-once, reload-on-change cache of fitted estimators.
+
+    Parameters
+    ----------
+    files : dict
+        Registry name -> artifact file name (see :func:`resolve_artifact`).
+    mmap : bool
+        Memory-map numpy arrays inside the pickle. Falls back to a normal
+        load for artifacts that cannot be mapped (e.g. compressed ones).
+    """
+
+    def __init__(self, files: dict[str, str] = MODEL_FILES, mmap: bool = True):
+        self.files = dict(files)
+        self.mmap = mmap
+        self._models: dict[str, object] = {}
+        self._info: dict[str, ArtifactInfo] = {}
+        self._compiled: dict[str, tuple[str, object]] = {}
+        self._lock = threading.RLock()
+
+    def _load(self, name: str, path: Path, digest: str | None = None) -> None:
+        stat = path.stat()
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # Compressed pickles cannot be mapped; joblib warns and loads normally.
+            warnings.filterwarnings("ignore", message=".*mmap_mode.*", category=UserWarning)
+            model = joblib.load(path, mmap_mode="r" if self.mmap else None)
+        self._models[name] = model
+        self._info[name] = ArtifactInfo(
+            name=name,
+            path=path,
+            sha256=digest or file_digest(path),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - start,
+        )
+
+    def get(self, name: str):
+        """
+        Return the fitted model for ``name``, (re)loading it if needed.
+
+        Raises
+        ------
+        KeyError
+            If ``name`` is not registered.
+        FileNotFoundError
+            If the artifact cannot be found.
+        """
+        if name not in self.files:
+            raise KeyError(f"Unknown model '{name}'. Registered: {list(self.files)}")
+        path = resolve_artifact(self.files[name])
+        stat = path.stat()
+        with self._lock:
+            info = self._info.get(name)
+            if info is None or info.path != path:
+                self._load(name, path)
+            elif (info.size, info.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                digest = file_digest(path)
+                if digest != info.sha256:
+                    self._load(name, path, digest)
+                else:
+                    self._info[name] = replace(info, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            return self._models[name]
+
+    def get_compiled(self, name: str):
+        """
+        Like :meth:`get`, but returns the compiled :class:`tree_engine.FlatForest`.
+
+        Compiled once per artifact hash. Models the engine cannot compile
+        are returned as the plain estimator, so callers can always just
+        call ``predict``.
+        """
+        model = self.get(name)
+        with self._lock:
+            digest = self._info[name].sha256
+            hit = self._compiled.get(name)
+            if hit is None or hit[0] != digest:
+                try:
+                    compiled = compile_pipeline(model)
+                except ValueError:
+                    compiled = model
+                hit = self._compiled[name] = (digest, compiled)
+            return hit[1]
+
+    def info(self, name: str) -> ArtifactInfo | None:
+        """Version details of the loaded artifact, or ``None`` if not loaded yet."""
+        return self._info.get(name)
+
+    def warm_up(self) -> dict[str, float]:
+        """
+        Load and compile every registered model and run one prediction
+        through each form.
+
+        The dummy row pays one-off costs (thread pools, validation paths)
+        before the first real request. Returns seconds spent per model.
+        """
+        timings = {}
+        for name in self.files:
+            start = time.perf_counter()
+            model = self.get(name)
+            cols = getattr(model, "feature_names_in_", None)
+            if cols is not None:
+                row = pd.DataFrame(np.zeros((1, len(cols))), columns=cols)
+                model.predict(row)
+                self.get_compiled(name).predict(row)
+            timings[name] = time.perf_counter() - start
+        return timings
+
+
+_registry: ModelRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """The registry shared by every page and session in this process."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -1,9 +1,14 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import joblib, matplotlib.pyplot as plt
 from pathlib import Path
+from instrumentation import span
+from model_registry import get_registry
+from market_data import MarketDataError, default_market_data, firm_inputs, parse_tickers, tickers_from_csv
+from scenarios import (
+    explain_scenarios, independent_grid, ratio_features, score_portfolio, score_scenarios,
+    simulate_scenarios, uniform_grid,
+)
 
 st.title("🧪 ESG Risk What-If Simulator: Real-Time EBITDA & Operating Margin Predictions")
 
@@ -23,101 +28,283 @@ This simulation highlights how sustainability challenges can financially materia
 """
 )
 
-def load_model(fname: str):
-    for p in [Path(__file__).resolve().parent.parent / fname,
-              Path(__file__).resolve().with_name(fname)]:
-        if p.exists():
-            return joblib.load(p)
-    st.error(f"❌ Model file '{fname}' not found. Upload it to repo root or pages/.")
-    st.stop()
+def load_model(name: str):
+    # Loaded once per process and reloaded only when the artifact changes.
+    # The compiled flat-array form predicts identically without sklearn's
+    # per-call overhead (see tree_engine.py).
+    try:
+        with span("model.load"):
+            return get_registry().get_compiled(name)
+    except FileNotFoundError as e:
+        st.error(f"❌ {e}")
+        st.stop()
+
+MAX_GRID_POINTS = 50_000
+MAX_SIMULATION_ROWS = 1_000_000  # draws × shock levels per Monte Carlo run
+SIMULATION_BATCH_ROWS = 25_000  # rows scored between chart updates
+FETCH_TIMEOUT = 15.0  # seconds, shared by the four endpoint fetches
+MAX_PORTFOLIO = 500
+PORTFOLIO_WORKERS = 8  # tickers fetched at once in portfolio mode
+
+
+@st.cache_resource(show_spinner=False)
+def get_market_data():
+    # One fetch cache per server process, shared by all sessions.
+    return default_market_data()
+
 
 # Load both models
-ebitda_model   = load_model('ebitda_margin_model.pkl')
-operating_model= load_model('operating_margin_model.pkl')
+ebitda_model   = load_model('ebitda')
+operating_model= load_model('operating')
+st.caption(" · ".join(f"{n} model `{get_registry().info(n).sha256[:10]}`" for n in ("ebitda", "operating")))
+
+input_mode = st.radio("Input", ["Single ticker", "Portfolio (watchlist)"], horizontal=True)
 
+if input_mode == "Portfolio (watchlist)":
+    pasted = st.text_area("Tickers (comma, space or newline separated):")
+    uploaded = st.file_uploader("…or upload a CSV with a ticker column", type="csv")
+    tickers = parse_tickers(pasted)
+    if uploaded is not None:
+        tickers = list(dict.fromkeys(tickers + tickers_from_csv(uploaded)))
+    if not tickers:
+        st.stop()
+    if len(tickers) > MAX_PORTFOLIO:
+        st.warning(f"Only the first {MAX_PORTFOLIO} of {len(tickers)} tickers are scored.")
+        tickers = tickers[:MAX_PORTFOLIO]
+
+    port_range = st.slider("Increase ESG risk by (%)", 0, 100, (0, 100), step=1, key="port_range")
+    port_step = st.select_slider("Step (%)", options=[1, 2, 5, 10, 20], value=10, key="port_step")
+
+    # Stream fetched inputs into the table as each ticker resolves.
+    progress = st.progress(0.0, text=f"Fetching {len(tickers)} tickers…")
+    live_table = st.empty()
+    firms, failures = [], []
+    with span("fetch"):
+        for i, res in enumerate(get_market_data().fetch_many(tickers, PORTFOLIO_WORKERS, FETCH_TIMEOUT), 1):
+            if not res.ok:
+                failures.append({"Ticker": res.ticker, "Error": "; ".join(f"{ep}: {m}" for ep, m in res.errors.items())})
+            else:
+                try:
+                    firms.append({"Ticker": res.ticker, **firm_inputs(res.frames)})
+                except MarketDataError as e:
+                    failures.append({"Ticker": res.ticker, "Error": str(e)})
+            progress.progress(i / len(tickers), text=f"Fetched {i}/{len(tickers)} · {len(failures)} failed")
+            if firms:
+                live_table.dataframe(pd.DataFrame(firms).set_index("Ticker"))
+
+    if failures:
+        with st.expander(f"⚠️ {len(failures)} ticker(s) failed"):
+            st.dataframe(pd.DataFrame(failures).set_index("Ticker"))
+    if not firms:
+        st.error("None of the tickers could be fetched."); st.stop()
+
+    # All tickers × all risk steps: one predict call per model.
+    with span("predict"):
+        port_df = score_portfolio(ebitda_model, operating_model, pd.DataFrame(firms),
+                                  uniform_grid(port_range[0], port_range[1], port_step))
+    port_df = port_df.drop(columns=["Soc +%", "Gov +%"]).rename(columns={"Env +%": "Risk +%"}).round(4)
+    live_table.empty()
+
+    tab_e, tab_o, tab_long = st.tabs(["EBITDA Margin", "Operating Margin", "All results"])
+    with tab_e:
+        st.dataframe(port_df.pivot(index="Ticker", columns="Risk +%", values="EBITDA Margin"))
+    with tab_o:
+        st.dataframe(port_df.pivot(index="Ticker", columns="Risk +%", values="Operating Margin"))
+    with tab_long:
+        st.dataframe(port_df)
+        st.download_button("Download CSV", port_df.to_csv(index=False), "portfolio_whatif.csv", "text/csv")
+    st.stop()
 
 ticker = st.text_input("Enter a stock ticker (example: AAPL, TSLA):").strip().upper()
 if not ticker:
     st.stop()
 
-# Fetch ESG + Financial data via yfinance
-try:
-    stock = yf.Ticker(ticker)
-    sustainability = stock.sustainability
-    if sustainability is None or sustainability.empty:
-        st.error("No ESG data for this ticker."); st.stop()
-
-    # Raw ESG risk scores (0‑100, lower better)
-    env_risk = sustainability.loc['environmentScore'].iloc[0]
-    soc_risk = sustainability.loc['socialScore'].iloc[0]
-    gov_risk = sustainability.loc['governanceScore'].iloc[0]
-
-    # Financial statements
-    bs   = stock.balance_sheet
-    fin  = stock.financials
-    cf   = stock.cashflow
-
-    total_assets  = bs.loc['Total Assets'].iloc[0]
-    total_liab    = bs.loc['Total Liabilities Net Minority Interest'].iloc[0]
-    revenue       = fin.loc['Total Revenue'].iloc[0]
-    net_income    = fin.loc['Net Income'].iloc[0]
-    cash_ops      = cf.loc['Operating Cash Flow'].iloc[0]
-    capex         = cf.loc['Capital Expenditure'].iloc[0]
+# Fetch ESG + Financial data: all endpoints at once, cached per ticker/endpoint
+with span("fetch"):
+    fetched = get_market_data().fetch_all(ticker, timeout=FETCH_TIMEOUT)
+if not fetched.ok:
+    st.error("Data fetch error:\n" + "\n".join(f"- **{ep}**: {msg}" for ep, msg in fetched.errors.items()))
+    st.stop()
 
+try:
+    inputs = firm_inputs(fetched.frames)
+except MarketDataError as e:
+    st.error(str(e)); st.stop()
 except Exception as e:
     st.error(f"Data fetch error: {e}"); st.stop()
 
-asset_turnover   = revenue / total_assets
-log_assets       = np.log10(total_assets)
-debt_ratio       = total_liab / total_assets
-roa              = net_income / total_assets
-net_margin       = net_income / revenue
-cashflow_margin  = cash_ops / revenue
-capex_intensity  = abs(capex) / revenue
+env_risk, soc_risk, gov_risk = inputs["env_risk"], inputs["soc_risk"], inputs["gov_risk"]
+total_assets, total_liab = inputs["total_assets"], inputs["total_liab"]
+revenue, net_income = inputs["revenue"], inputs["net_income"]
+cash_ops, capex = inputs["cash_ops"], inputs["capex"]
+
+base = ratio_features(total_assets, total_liab, revenue, net_income, cash_ops, capex)
+risks = (env_risk, soc_risk, gov_risk)
 
 st.success("✅ ESG & financial data fetched for " + ticker)
 
-range_pct = st.slider("Increase ESG risk by (%)", 0, 100, (0, 100), step=10)
-incs = list(range(range_pct[0], range_pct[1]+1, 10))  # e.g., [0,10,20,...]
+MONTE_CARLO = "Monte Carlo (correlated shocks)"
+mode = st.radio("Scenario mode", ["Uniform shock", "Independent E/S/G grid", MONTE_CARLO], horizontal=True)
+step = st.select_slider("Step (%)", options=[1, 2, 5, 10, 20], value=10)
+
+
+def band_figure(bands: pd.DataFrame, draws: int):
+    # Shaded P5–P95 band and a median line per margin.
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    for label, color in (("EBITDA Margin", "31, 119, 180"), ("Operating Margin", "255, 127, 14")):
+        x = bands["Risk +%"]
+        fig.add_scatter(x=x, y=bands[f"{label} P95"], line={"width": 0}, legendgroup=label,
+                        showlegend=False, hoverinfo="skip")
+        fig.add_scatter(x=x, y=bands[f"{label} P5"], line={"width": 0}, fill="tonexty",
+                        fillcolor=f"rgba({color}, 0.2)", legendgroup=label, name=f"{label} P5–P95")
+        fig.add_scatter(x=x, y=bands[f"{label} P50"], line={"color": f"rgb({color})"}, mode="lines+markers",
+                        legendgroup=label, name=f"{label} median")
+    fig.update_layout(
+        title=f"Simulated margins – {ticker} ({draws:,} draws per level)",
+        xaxis_title="Mean increase in ESG risk (%)", yaxis_title="Predicted margin",
+    )
+    return fig
+
+
+if mode == MONTE_CARLO:
+    range_pct = st.slider("Mean ESG risk increase (%)", 0, 100, (0, 100), step=1, key="mc_range")
+    c1, c2, c3 = st.columns(3)
+    shock_sd = c1.slider("Shock volatility (pp)", 0, 50, 10,
+                         help="Standard deviation of each E/S/G shock around the mean, in percentage points.")
+    rho = c2.slider("E/S/G correlation", -0.5, 1.0, 0.5, step=0.05)
+    ratio_sd = c3.slider("Financial-ratio noise (%)", 0, 30, 0,
+                         help="Lognormal noise on the firm's financial ratios; 0 keeps them fixed.")
+    c4, c5 = st.columns(2)
+    n_draws = c4.select_slider("Draws per level", options=[1_000, 5_000, 10_000, 20_000, 50_000], value=10_000)
+    seed = int(c5.number_input("Seed", min_value=0, value=0, step=1))
+    levels = np.arange(range_pct[0], range_pct[1] + 1, step)
+    if len(levels) * n_draws > MAX_SIMULATION_ROWS:
+        st.warning(f"{len(levels) * n_draws:,} scenarios requested; use fewer draws or a larger step "
+                   f"(limit {MAX_SIMULATION_ROWS:,}).")
+        st.stop()
+
+    # Bands over the draws scored so far, redrawn after every batch.
+    tab_bands, tab_table = st.tabs(["Margin Bands", "Percentile Table"])
+    with tab_bands:
+        progress = st.progress(0.0, text=f"Simulating {n_draws:,} draws at {len(levels)} shock levels…")
+        chart = st.empty()
+    with span("predict"):
+        for done, bands in simulate_scenarios(
+            ebitda_model, operating_model, base, risks, levels, n_draws,
+            shock_sd=shock_sd, corr=rho, ratio_sd=ratio_sd / 100, seed=seed,
+            batch_draws=SIMULATION_BATCH_ROWS // len(levels),
+        ):
+            progress.progress(done / n_draws, text=f"{done:,} / {n_draws:,} draws per level")
+            chart.plotly_chart(band_figure(bands, done), width="stretch", key=f"mc_bands_{done}")
+    progress.empty()
+    with tab_bands:
+        st.caption(f"Seed {seed}: the same inputs and seed always give the same bands. "
+                   "Every shock level reuses the same random draws.")
+    with tab_table:
+        bands = bands.round(4)
+        st.dataframe(bands)
+        st.download_button("Download CSV", bands.to_csv(index=False), f"{ticker}_monte_carlo.csv",
+                           "text/csv", on_click="ignore")
+    st.stop()
+
+if mode == "Uniform shock":
+    range_pct = st.slider("Increase ESG risk by (%)", 0, 100, (0, 100), step=1)
+    grid = uniform_grid(range_pct[0], range_pct[1], step)
+else:
+    env_rng = st.slider("Environmental risk increase (%)", 0, 100, (0, 100), step=1)
+    soc_rng = st.slider("Social risk increase (%)", 0, 100, (0, 100), step=1)
+    gov_rng = st.slider("Governance risk increase (%)", 0, 100, (0, 100), step=1)
+    axes = [np.arange(lo, hi + 1, step) for lo, hi in (env_rng, soc_rng, gov_rng)]
+    n_points = int(np.prod([len(a) for a in axes]))
+    if n_points > MAX_GRID_POINTS:
+        st.warning(f"{n_points:,} scenarios requested; narrow the ranges or use a larger step "
+                   f"(limit {MAX_GRID_POINTS:,}).")
+        st.stop()
+    grid = independent_grid(*axes)
+
+# One pass per model for the whole grid; compiled models also return
+# per-feature drivers from the same tree walk (see tree_engine.py).
+with span("predict"):
+    if hasattr(ebitda_model, "explain") and hasattr(operating_model, "explain"):
+        results_df, drivers = explain_scenarios(ebitda_model, operating_model, base, risks, grid)
+    else:
+        results_df, drivers = score_scenarios(ebitda_model, operating_model, base, risks, grid), None
+results_df = results_df.round(4)
+
+# Chart libraries are only needed from here on (see prewarm.py).
+import plotly.express as px
+
 
-results = []
-for pct in incs:
-    factor = 1 + pct/100
-    new_env = min(env_risk*factor, 100)
-    new_soc = min(soc_risk*factor, 100)
-    new_gov = min(gov_risk*factor, 100)
+def show_drivers(x_col: str, rows: pd.Series | None = None):
+    # Stacked per-feature change vs. no shock; bars sum to the margin change.
+    if drivers is None:
+        st.info("Feature drivers are only available for compiled boosting models.")
+        return
+    target = st.radio("Explain", ["EBITDA Margin", "Operating Margin"], horizontal=True, key="drivers_target")
+    d = drivers[target] if rows is None else drivers[target][rows.to_numpy()]
+    x = results_df[x_col] if rows is None else results_df.loc[rows, x_col]
+    long = d.assign(**{x_col: x.to_numpy()}).melt(id_vars=x_col, var_name="Feature", value_name="Contribution")
+    long = long[long["Contribution"].abs() > 1e-12]
+    fig = px.bar(
+        long, x=x_col, y="Contribution", color="Feature", barmode="relative",
+        title=f"Why {target} moves – change vs. no shock, by feature",
+    )
+    with span("render.drivers"):
+        st.plotly_chart(fig, width="stretch")
+    st.caption("Exact leaf-path decomposition of the boosting model: each scenario's bars sum to its margin change versus the unshocked firm.")
 
-    NE, NS, NG = [1 - x/100 for x in (new_env,new_soc,new_gov)]
 
-    ebt_row = pd.DataFrame([{ 'Asset_Turnover': asset_turnover, 'Debt_Ratio': debt_ratio, 'Log_Assets': log_assets,
-                              'ROA': roa, 'Net_Profit_Margin': net_margin, 'CashFlow_Margin': cashflow_margin,
-                              'ESG_Environmental_Score': NE, 'ESG_Social_Score': NS, 'ESG_Governance_Score': NG }])
+if mode == "Uniform shock":
+    results_df = results_df.drop(columns=["Soc +%", "Gov +%"]).rename(columns={"Env +%": "Risk +%"})
 
-    op_row  = pd.DataFrame([{ 'Asset_Turnover': asset_turnover, 'Debt_Ratio': debt_ratio, 'Log_Assets': log_assets,
-                              'CapEx_Intensity': capex_intensity,
-                              'ESG_Environmental_Score': NE, 'ESG_Social_Score': NS, 'ESG_Governance_Score': NG }])
+    # Display tabs
+    tab1, tab2, tab3 = st.tabs(["Results Table", "Margin Curves", "Drivers"])
 
-    ebt_pred = float(ebitda_model.predict(ebt_row)[0])
-    op_pred  = float(operating_model.predict(op_row)[0])
+    with tab1:
+        st.dataframe(results_df)
 
-    results.append({ 'Risk +%': pct, 'EBITDA Margin': round(ebt_pred,4), 'Operating Margin': round(op_pred,4) })
+    with tab2:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        ax.plot(results_df['Risk +%'], results_df['EBITDA Margin'], marker='o', label='EBITDA')
+        ax.plot(results_df['Risk +%'], results_df['Operating Margin'], marker='s', label='Operating')
+        ax.set_xlabel('Increase in ESG Risk (%)'); ax.set_ylabel('Predicted Margin'); ax.grid(True)
+        ax.set_title(f'ESG Risk vs Margins – {ticker}')
+        ax.legend()
+        with span("render.margin_curves"):
+            st.pyplot(fig)
 
-results_df = pd.DataFrame(results)
+    with tab3:
+        show_drivers("Risk +%")
+else:
+    st.caption(f"{len(results_df):,} scenarios scored.")
+    tab1, tab2, tab3 = st.tabs(["Results Table", "Margin Surface", "Drivers"])
 
-# Display tabs
-tab1, tab2 = st.tabs(["Results Table", "Margin Curves"])
+    with tab1:
+        st.dataframe(results_df)
 
-with tab1:
-    st.dataframe(results_df)
+    with tab2:
+        gov_level = st.select_slider("Governance risk increase shown (%)", options=axes[2].tolist())
+        target = st.radio("Margin", ["EBITDA Margin", "Operating Margin"], horizontal=True)
+        surface = (
+            results_df[results_df["Gov +%"] == gov_level]
+            .pivot(index="Soc +%", columns="Env +%", values=target)
+        )
+        surf_fig = px.imshow(
+            surface, origin="lower", aspect="auto", color_continuous_scale="RdYlGn",
+            labels={"x": "Environmental risk +%", "y": "Social risk +%", "color": target},
+            title=f"{target} – {ticker} (Governance +{gov_level}%)",
+        )
+        with span("render.margin_surface"):
+            st.plotly_chart(surf_fig, width="stretch")
 
-with tab2:
-    fig, ax = plt.subplots()
-    ax.plot(results_df['Risk +%'], results_df['EBITDA Margin'], marker='o', label='EBITDA')
-    ax.plot(results_df['Risk +%'], results_df['Operating Margin'], marker='s', label='Operating')
-    ax.set_xlabel('Increase in ESG Risk (%)'); ax.set_ylabel('Predicted Margin'); ax.grid(True)
-    ax.set_title(f'ESG Risk vs Margins – {ticker}')
-    ax.legend()
-    st.pyplot(fig)
+    with tab3:
+        env_level = st.select_slider("Environmental risk increase (%)", options=axes[0].tolist(), key="drivers_env")
+        soc_level = st.select_slider("Social risk increase (%)", options=axes[1].tolist(), key="drivers_soc")
+        # One bar per Gov level at the chosen Env/Soc shocks.
+        show_drivers("Gov +%", (results_df["Env +%"] == env_level) & (results_df["Soc +%"] == soc_level))
 
 st.success("🧹 Scenario simulation complete!")
 
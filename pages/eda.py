@@ -1,23 +1,21 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-import seaborn as sns
-from utils import load_esg_zip
+import numpy as np
+import pandas as pd
+from dataset import get_esg_stats
+from figure_cache import cached_figure, pyplot, seaborn
 
-sns.set_style("whitegrid")
-
-@st.cache_data(show_spinner=False)
-def load_data():
-    return load_esg_zip()
-
-df = load_data()
+# Everything on this page comes from the precomputed statistics file, so
+# a view costs the same however large the panel is.
+stats = get_esg_stats()
+summary = stats["summary"]
 
 
 st.markdown("<h2 style='margin-bottom:0.2em'>🧾 What Data Powers This Model?</h2>", unsafe_allow_html=True)
 
 c1, c2, c3 = st.columns(3)
-c1.metric("Rows", f"{len(df):,}")
-c2.metric("Year span", f"{df['year'].min()}–{df['year'].max()}")
-c3.metric("Unique tickers", df['ticker_ann'].nunique())
+c1.metric("Rows", f"{summary['rows']:,}")
+c2.metric("Year span", f"{summary['year_min']}–{summary['year_max']}")
+c3.metric("Unique tickers", summary['tickers'])
 
 st.divider()
 
@@ -33,24 +31,48 @@ The dataset enables longitudinal analysis of how financial performance and susta
 
 
 st.subheader("📄 Dataset Preview")
-st.dataframe(df.head())
+st.dataframe(pd.DataFrame(**stats["preview"]))
 
 st.caption("Use the navigation bar at the top to explore · download · model.")
 
 st.markdown("### 📊 ESG Score Distributions")
-plot_cols = ['ESG_Combined_Score','ESG_Environmental_Score','ESG_Social_Score','ESG_Governance_Score']
+plot_cols = list(stats["distributions"])
 tabs = st.tabs([f"Dist • {c.split('_')[1]}" if c!='ESG_Combined_Score' else "Dist • Combined" for c in plot_cols])
+
+
+def draw_distribution(col):
+    # Bars and KDE as sns.histplot(kde=True) draws them, from stored counts.
+    dist = stats["distributions"][col]
+    sns, plt = seaborn(), pyplot()
+    fig, ax = plt.subplots(figsize=(6,3))
+    if dist["counts"]:
+        color = sns.color_palette()[0]
+        edges = np.asarray(dist["edges"])
+        ax.bar(edges[:-1], dist["counts"], width=np.diff(edges), align="edge",
+               alpha=0.75, color=color, edgecolor="white", linewidth=0.5)
+        ax.plot(dist["kde_x"], dist["kde_y"], color=color)
+    ax.set_xlabel(col)
+    ax.set_ylabel("Count")
+    ax.set_title(col.replace('_',' '))
+    return fig
+
+
+# Rendered once per dataset version and reused across reruns and sessions.
 for tab, col in zip(tabs, plot_cols):
     with tab:
-        fig, ax = plt.subplots(figsize=(6,3))
-        sns.histplot(df[col].dropna(), kde=True, ax=ax)
-        ax.set_title(col.replace('_',' '))
-        st.pyplot(fig)
+        cached_figure("eda.distribution", {"col": col}, lambda col=col: draw_distribution(col))
 
 st.markdown("### 🔗 Correlation Matrix (ESG & Financial Metrics)")
-heat_cols = plot_cols + ['ROA','ROE','Total_Return','Debt_Ratio']
-fig2, ax2 = plt.subplots(figsize=(8,5))
-mask = None
-sns.heatmap(df[heat_cols].corr(), annot=True, cmap='coolwarm', fmt='.2f', ax=ax2, mask=mask)
-ax2.set_title('Pearson correlations')
-st.pyplot(fig2)
+corr = pd.DataFrame(stats["corr"]["values"], index=stats["corr"]["columns"], columns=stats["corr"]["columns"])
+
+
+def draw_correlations():
+    sns, plt = seaborn(), pyplot()
+    fig2, ax2 = plt.subplots(figsize=(8,5))
+    mask = None
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt='.2f', ax=ax2, mask=mask)
+    ax2.set_title('Pearson correlations')
+    return fig2
+
+
+cached_figure("eda.correlations", {"cols": list(corr.columns)}, draw_correlations)
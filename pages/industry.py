@@ -1,18 +1,21 @@
 import streamlit as st
-import plotly.express as px
-import matplotlib.pyplot as plt
-from utils import load_esg_zip
+from charts import STATIC, rendering_mode, trend_lines
+from dataset import get_aggregate_cube
+from figure_cache import cached_figure, pyplot
+from instrumentation import span
 
 st.markdown("## 🏭 Industry-level ESG Dashboard")
 
-df = load_esg_zip()
+cube = get_aggregate_cube()
 
 div_avg = (
-    df.groupby("Division")["ESG_Combined_Score"]
-      .mean().round(2).sort_values()
+    cube.division_means("ESG_Combined_Score")
+      .round(2).sort_values()
       .reset_index()
 )
 
+import plotly.express as px
+
 bar_fig = px.bar(
     div_avg, x="ESG_Combined_Score", y="Division",
     orientation="h", text="ESG_Combined_Score",
@@ -23,7 +26,8 @@ bar_fig = px.bar(
 bar_fig.update_traces(texttemplate="%{text:.2f}", textposition="outside")
 bar_fig.update_layout(coloraxis_showscale=False, margin=dict(l=120, r=10, t=40, b=20))
 
-st.plotly_chart(bar_fig, use_container_width=True)
+with span("render.division_bars"):
+    st.plotly_chart(bar_fig, width="stretch")
 
 col1, col2 = st.columns(2)
 col1.write("#### 🔝 Top 5")
@@ -35,11 +39,21 @@ col2.table(div_avg.head(5).set_index("Division"))
 st.divider()
 st.subheader("📈 ESG Combined Score Trends by Industry over Time")
 
-trend = df.groupby(['year','Division'])['ESG_Combined_Score'].mean().unstack(fill_value=None)
-fig2, ax2 = plt.subplots(figsize=(12,6))
-trend.plot(ax=ax2)
-ax2.set_title('ESG Combined Score Trends by Industry')
-ax2.set_ylabel('ESG Score')
-ax2.set_xlabel('Year')
-ax2.legend(loc='upper left', bbox_to_anchor=(1.02,1))
-st.pyplot(fig2)
+
+
+def draw_trends():
+    trend = cube.year_division_means('ESG_Combined_Score')
+    fig2, ax2 = pyplot().subplots(figsize=(12,6))
+    trend.plot(ax=ax2)
+    ax2.set_title('ESG Combined Score Trends by Industry')
+    ax2.set_ylabel('ESG Score')
+    ax2.set_xlabel('Year')
+    ax2.legend(loc='upper left', bbox_to_anchor=(1.02,1))
+    return fig2
+
+
+if rendering_mode() == STATIC:
+    cached_figure("industry.trends", {}, draw_trends)
+else:
+    # WebGL lines; click legend entries to hide or isolate divisions.
+    st.plotly_chart(trend_lines(), width="stretch")
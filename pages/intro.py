@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-from utils import load_esg_zip
 
 st.markdown(
     "<h2 style='color:#d62728'>🔍 Corporate Margin Predictor</h2>"
@@ -1,11 +1,16 @@
+import time
+import uuid
 import streamlit as st
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import HistGradientBoostingRegressor
-from sklearn.metrics import r2_score, mean_absolute_error
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import Pipeline
-from utils import load_esg_zip
+from dataset import DATA_ZIP, get_esg_data, get_esg_dtypes
+from fit_cache import fit_key, get_fit_cache
+from instrumentation import span
+from playground import (
+    BOOSTING, DEFAULT_FEATURES, DEFAULT_TARGET, LINEAR, cross_validate_model, fit_playground_model,
+)
+from sweep import leaderboard, sample_configs, successive_halving
+from training_jobs import get_training_jobs
+from utils import dataset_version
 
 st.title("⚙️ Model Playground – Linear vs HistGradientBoosting")
 
@@ -28,32 +33,35 @@ Choose between a **simple Linear Regression** or a **HistGradientBoostingRegress
 
 * **R²** – proportion of variance explained (closer to 1 ➜ better).
 * **MAE** – average absolute error (closer to 0 ➜ better).
-* For hist‑grad boosting you can tweak **n_estimators** (iterations), **learning_rate**, and **max_depth** to combat under/over‑fitting.
+* **K-fold** evaluation scores each model on rows it was not trained on, which is the honest measure of fit.
+* For hist‑grad boosting you can tweak **n_estimators** (iterations), **learning_rate**, and **max_depth** to combat under/over‑fitting, or sweep ranges of them.
 """)
 
-df = load_esg_zip()
-num_cols = df.select_dtypes("number").columns.tolist()
+dtypes = get_esg_dtypes()
+num_cols = [c for c, t in dtypes.items() if pd.api.types.is_numeric_dtype(t)]
 
 colA, colB = st.columns(2)
 with colA:
     y_col = st.selectbox(
         "Target (y)",
         num_cols,
-        index=num_cols.index("EBITDA_Margin") if "EBITDA_Margin" in num_cols else 0,
+        index=num_cols.index(DEFAULT_TARGET) if DEFAULT_TARGET in num_cols else 0,
     )
 with colB:
     model_type = st.radio(
-        "Model", ["Linear Regression", "HistGradientBoosting"], horizontal=True
+        "Model", [LINEAR, BOOSTING], horizontal=True
     )
 
 x_cols = st.multiselect(
-    "Features (X)", [c for c in num_cols if c != y_col], default=["ESG_Combined_Score"]
+    "Features (X)", [c for c in num_cols if c != y_col], default=DEFAULT_FEATURES
 )
 
 if not x_cols:
     st.info("Select at least one feature.")
     st.stop()
 
+# Fits and metrics run on the values as read, not the float32 copies.
+df = get_esg_data(columns=[y_col] + x_cols, full_precision=True)
 X = df[x_cols].dropna()
 y = df.loc[X.index, y_col].dropna()
 common = X.index.intersection(y.index)
@@ -63,38 +71,152 @@ if len(common) < 30:
     st.warning("Not enough rows after dropping NA.")
     st.stop()
 
-if model_type == "Linear Regression":
-    model = Pipeline([("sc", StandardScaler()), ("lr", LinearRegression())])
-else:
-    n_estimators = st.slider("n_estimators", 100, 500, 300, step=50)
-    learning_rate = st.slider("learning_rate", 0.01, 1.00, 0.1, step=0.01)
-    max_depth = st.slider("max_depth", 2, 10, 5)
-    model = HistGradientBoostingRegressor(
-        max_depth=max_depth,
-        learning_rate=learning_rate,
-        max_iter=n_estimators,
-        random_state=0,
-    )
 
-model.fit(X, y)
-pred = model.predict(X)
 
-r2 = r2_score(y, pred)
-mae = mean_absolute_error(y, pred)
+def apply_best(best: dict):
+    # Runs before the next rerun, so the sliders pick up the new values.
+    st.session_state["pg_n_estimators"] = best["max_iter"]
+    st.session_state["pg_learning_rate"] = min(max(round(best["learning_rate"], 2), 0.01), 1.0)
+    st.session_state["pg_max_depth"] = best["max_depth"]
+    st.session_state["pg_sweep"] = False
 
-st.metric("R²", f"{r2:.3f}")
-st.metric("MAE", f"{mae:.3f}")
 
-st.subheader(
-    "Feature Importance" if model_type == "HistGradientBoosting" else "Coefficients"
-)
-if model_type == "Linear Regression":
-    coef_df = pd.DataFrame({"Feature": x_cols, "Weight": model.named_steps["lr"].coef_})
-else:
-    import numpy as np
+def run_sweep():
+    st.markdown(
+        "Many configurations are scored on small subsamples; only the best third "
+        "move on to three times the data, until the survivors train on all rows. "
+        "Every fit is scored on the same 20% hold-out."
+    )
+    est_range = st.slider("n_estimators range", 100, 500, (100, 400), step=50)
+    lr_range = st.slider("learning_rate range", 0.01, 1.00, (0.03, 0.30), step=0.01)
+    depth_range = st.slider("max_depth range", 2, 10, (3, 7))
+    n_configs = st.select_slider("Configurations", [9, 27, 81], value=27)
+
+    sweep_id = (dataset_version(DATA_ZIP), y_col, tuple(x_cols), est_range, lr_range, depth_range, n_configs)
+    done = st.session_state.get("pg_sweep_result")
+    if done is not None and done[0] == sweep_id:
+        board = done[1]
+    elif st.button("Run sweep", type="primary"):
+        configs = sample_configs(n_configs, est_range, lr_range, depth_range)
+        status = st.empty()
+        table = st.empty()
+        results = []
+        start = time.perf_counter()
+        for result in successive_halving(X, y, configs):
+            results.append(result)
+            status.caption(
+                f"Rung {result['rung'] + 1} · {len(results)} fits · {time.perf_counter() - start:.1f}s"
+            )
+            table.dataframe(leaderboard(results).head(15), hide_index=True)
+        status.empty()
+        table.empty()
+        board = leaderboard(results)
+        st.session_state["pg_sweep_result"] = (sweep_id, board)
+    else:
+        st.stop()
+
+    best = board.iloc[0].to_dict()
+    st.success(
+        f"Best: n_estimators={int(best['max_iter'])}, learning_rate={best['learning_rate']:.4f}, "
+        f"max_depth={int(best['max_depth'])} · held-out R² {best['r2']:.3f}"
+    )
+    st.dataframe(
+        board.style.format({"learning_rate": "{:.4f}", "r2": "{:.4f}", "mae": "{:.4f}", "seconds": "{:.2f}"}),
+        hide_index=True,
+    )
+    best_params = {"max_iter": int(best["max_iter"]), "learning_rate": best["learning_rate"], "max_depth": int(best["max_depth"])}
+    st.button("Use best configuration", on_click=apply_best, args=(best_params,))
+    st.stop()
+
 
-    imp = model.feature_importances_ if hasattr(model, "feature_importances_") else np.zeros(len(x_cols))
-    coef_df = pd.DataFrame({"Feature": x_cols, "Weight": imp})
+if model_type == LINEAR:
+    params = {}
+else:
+    if st.toggle("Sweep hyperparameters (successive halving)", key="pg_sweep"):
+        run_sweep()
+    n_estimators = st.slider("n_estimators", 100, 500, 300, step=50, key="pg_n_estimators")
+    learning_rate = st.slider("learning_rate", 0.01, 1.00, 0.1, step=0.01, key="pg_learning_rate")
+    max_depth = st.slider("max_depth", 2, 10, 5, key="pg_max_depth")
+    params = {"max_iter": n_estimators, "learning_rate": round(learning_rate, 4), "max_depth": max_depth}
+
+evaluation = st.radio("Evaluation", ["Training fit", "K-fold (held-out)"], horizontal=True)
+n_folds = st.slider("Folds", 3, 10, 5) if evaluation != "Training fit" else 0
+
+
+@st.fragment(run_every=0.5)
+def training_progress(job_id: str, max_iter: int):
+    # Polls the background job without rerunning the whole page.
+    status = get_training_jobs().status(job_id)
+    if status.state == "done":
+        st.rerun()
+    if status.state == "failed":
+        st.error(f"Training failed: {status.error}")
+        return
+    if status.state == "cancelled":
+        st.info("Superseded by a newer configuration.")
+        return
+    done_iter = status.history[-1]["iteration"] if status.history else 0
+    st.progress(
+        done_iter / max_iter,
+        text=f"Training in the background ({status.state}) · {done_iter}/{max_iter} iterations",
+    )
+    if status.history:
+        hist = pd.DataFrame(status.history).set_index("iteration")
+        c1, c2 = st.columns(2)
+        c1.metric("R² so far", f"{hist['r2'].iloc[-1]:.3f}")
+        c2.metric("MAE so far", f"{hist['mae'].iloc[-1]:.3f}")
+        st.line_chart(hist[["r2"]], height=200)
+
+
+# Identical configurations (from any session) reuse the cached fit.
+slot = st.session_state.setdefault("playground_slot", uuid.uuid4().hex)
+jobs = get_training_jobs()
+
+if n_folds:
+    # Folds fit in parallel and boosting folds early-stop, so this takes about one fit's time.
+    jobs.cancel(slot)
+    cv_params = {**params, "cv_folds": n_folds}
+    key = fit_key(dataset_version(DATA_ZIP), y_col, x_cols, model_type, cv_params)
+    with st.spinner(f"Fitting {n_folds} folds in parallel…"):
+        with span("model.fit"):
+            result, cached = get_fit_cache().get_or_fit(
+                key, lambda: cross_validate_model(X, y, model_type, params, folds=n_folds)
+            )
+    m = result.metrics
+    st.metric("R² (held-out)", f"{m['r2']:.3f} ± {m['r2_std']:.3f}")
+    st.metric("MAE (held-out)", f"{m['mae']:.3f} ± {m['mae_std']:.3f}")
+    st.caption(
+        "Mean ± standard deviation across folds. "
+        + ("⚡ Reused a cached evaluation." if cached else f"Evaluated in {result.fit_seconds:.2f}s.")
+    )
+    with st.expander("Per-fold scores"):
+        st.dataframe(result.extras["folds"].style.format(precision=4))
+else:
+    key = fit_key(dataset_version(DATA_ZIP), y_col, x_cols, model_type, params)
+    result = get_fit_cache().get(key)
+    cached = result is not None
+    if result is None and model_type == LINEAR:
+        # Linear fits are instant; only boosting goes to the process pool.
+        with span("model.fit"):
+            result, cached = get_fit_cache().get_or_fit(
+                key, lambda: fit_playground_model(X, y, model_type, params)
+            )
+    if result is None:
+        # A newer configuration from this session cancels the superseded fit.
+        st.session_state["playground_training"] = key
+        training_progress(jobs.submit(slot, key, X, y, model_type, params), params["max_iter"])
+        st.stop()
+    jobs.cancel(slot)
+    if st.session_state.pop("playground_training", None) == key:
+        cached = False  # this session just waited for it
+
+    st.metric("R²", f"{result.metrics['r2']:.3f}")
+    st.metric("MAE", f"{result.metrics['mae']:.3f}")
+    st.caption("⚡ Reused a cached fit." if cached else f"Trained in {result.fit_seconds:.2f}s.")
 
+st.subheader(
+    "Feature Importance" if model_type == BOOSTING else "Coefficients"
+)
+coef_df = result.weights
 coef_df = coef_df.sort_values("Weight", ascending=False).set_index("Feature")
 st.dataframe(coef_df.style.format("{:.4f}"))
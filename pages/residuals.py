@@ -0,0 +1,120 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+from batch_scoring import load_predictions, pred_col, predictions_path, read_manifest, resid_col
+from dataset import DATA_ZIP
+from instrumentation import span
+from utils import DIVISION_COL, YEAR_COL, dataset_version, freeze_frame
+
+st.title("📉 Prediction Residuals by Industry and Year")
+
+st.markdown(
+    """
+How far are the served models from the **realized** margins in our WRDS panel?
+Every firm-year has been scored offline by `batch_scoring.py`. This page only reads those
+predictions, so browsing is instant however large the panel is.
+
+A **residual** is the realized margin minus the predicted one: positive means the firm did
+better than the model expected.
+"""
+)
+
+OUT_DIR = predictions_path(DATA_ZIP)
+manifest = read_manifest(OUT_DIR)
+if manifest is None or not manifest.get("complete"):
+    st.info("No complete scoring run found yet. Score the panel once (it resumes if interrupted):")
+    st.code(f"python batch_scoring.py --data {DATA_ZIP}", language="bash")
+    st.stop()
+if manifest["dataset_sha256"] != dataset_version(DATA_ZIP):
+    st.warning("The panel has changed since these predictions were made; rerun `batch_scoring.py` to refresh them.")
+st.caption(
+    f"{manifest['rows']:,} firm-years scored {manifest['finished_at']} · "
+    + " · ".join(f"{n} model `{sha[:10]}`" for n, sha in manifest["models"].items())
+)
+
+
+@st.cache_resource(show_spinner="Loading predictions…", max_entries=2)
+def residual_frame(run: str, out_dir: str, target: str) -> pd.DataFrame:
+    # ``run`` is only part of the cache key: a new scoring run misses the cache.
+    cols = ["ticker_ann", YEAR_COL, DIVISION_COL, target, pred_col(target), resid_col(target)]
+    return freeze_frame(load_predictions(out_dir, columns=cols).dropna(subset=[resid_col(target)]))
+
+
+targets = {t.replace("_", " "): t for t in manifest["targets"].values()}
+label = st.radio("Margin", list(targets), horizontal=True)
+target = targets[label]
+with span("data.residuals"):
+    df = residual_frame(manifest["finished_at"], str(OUT_DIR), target)
+if df.empty:
+    st.info("No scored firm-years with a realized margin in this selection.")
+    st.stop()
+
+years = sorted(df[YEAR_COL].unique())
+if len(years) > 1:
+    start, end = st.sidebar.slider("Year range", int(years[0]), int(years[-1]), (int(years[0]), int(years[-1])))
+else:  # a slider needs two distinct ends
+    start = end = int(years[0])
+all_divisions = sorted(df[DIVISION_COL].dropna().unique())
+divisions = st.sidebar.multiselect("Divisions", all_divisions, default=all_divisions)
+
+view = df[df[YEAR_COL].between(start, end) & df[DIVISION_COL].isin(divisions)]
+if view.empty:
+    st.info("No scored firm-years with a realized margin in this selection.")
+    st.stop()
+
+resid = view[resid_col(target)]
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Firm-years", f"{len(view):,}")
+c2.metric("MAE", f"{resid.abs().mean():.3f}")
+c3.metric("RMSE", f"{np.sqrt((resid ** 2).mean()):.3f}")
+c4.metric("Mean residual", f"{resid.mean():+.3f}", help="Positive: realized margins above the predictions on average.")
+
+import plotly.express as px
+
+st.markdown("### 🗺️ Mean Residual by Division × Year")
+heat = view.pivot_table(index=DIVISION_COL, columns=YEAR_COL, values=resid_col(target), aggfunc="mean", observed=True)
+heat_fig = px.imshow(
+    heat, aspect="auto", color_continuous_scale="RdBu", color_continuous_midpoint=0,
+    labels={"x": "Year", "y": "Division", "color": "Mean residual"},
+    height=max(350, 32 * len(heat) + 120),
+)
+with span("render.residual_heatmap"):
+    st.plotly_chart(heat_fig, width="stretch")
+
+st.markdown("### 🏭 Fit by Division")
+
+
+def fit_stats(g: pd.DataFrame) -> pd.Series:
+    r = g[resid_col(target)]
+    actual = g[target]
+    ss_tot = ((actual - actual.mean()) ** 2).sum()
+    return pd.Series({
+        "Firm-years": len(g),
+        "MAE": r.abs().mean(),
+        "RMSE": np.sqrt((r ** 2).mean()),
+        "Mean residual": r.mean(),
+        "R²": 1 - (r ** 2).sum() / ss_tot if ss_tot > 0 else np.nan,
+    })
+
+
+by_div = view.groupby(DIVISION_COL, observed=True).apply(fit_stats).sort_values("MAE", ascending=False)
+st.dataframe(by_div.style.format({"Firm-years": "{:,.0f}", "MAE": "{:.3f}", "RMSE": "{:.3f}",
+                                  "Mean residual": "{:+.3f}", "R²": "{:.3f}"}))
+
+col_hist, col_worst = st.columns(2)
+with col_hist:
+    st.markdown("#### Residual distribution")
+    # Binned here, so only the bar heights go to the browser.
+    lo, hi = np.nanpercentile(resid, [0.5, 99.5])
+    counts, edges = np.histogram(resid.clip(lo, hi), bins=60)
+    hist_fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, labels={"x": "Residual (clipped to P0.5–P99.5)", "y": "Firm-years"})
+    hist_fig.update_traces(width=np.diff(edges))
+    with span("render.residual_histogram"):
+        st.plotly_chart(hist_fig, width="stretch")
+with col_worst:
+    st.markdown("#### Largest misses")
+    worst = view.loc[resid.abs().nlargest(25).index]
+    st.dataframe(
+        worst.rename(columns={target: "Realized", pred_col(target): "Predicted", resid_col(target): "Residual"}),
+        hide_index=True,
+    )
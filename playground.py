@@ -0,0 +1,202 @@
+# playground.py
+"""
+Model construction and fitting for the Model Playground page.
+
+Kept out of the page script so fits can be cached (:mod:`fit_cache`) and
+run outside the Streamlit script thread (:mod:`training_jobs`).
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from fit_cache import FitResult
+
+LINEAR = "Linear Regression"
+BOOSTING = "HistGradientBoosting"
+
+# The page's initial selection; prewarm.py loads this slice ahead of time.
+DEFAULT_TARGET = "EBITDA_Margin"
+DEFAULT_FEATURES = ["ESG_Combined_Score"]
+
+
+def make_model(model_type: str, params: dict, early_stopping: bool | str = "auto"):
+    """
+    Unfitted estimator for a Playground configuration.
+
+    ``params`` holds ``max_iter``, ``learning_rate`` and ``max_depth`` for
+    boosting and is ignored for linear regression. ``early_stopping`` is
+    passed to the boosting model: ``"auto"`` (scikit-learn's default)
+    turns it on above 10,000 rows, ``True`` always. When on, the model
+    holds out 10% of its training rows and stops once the validation loss
+    has not improved for 10 iterations.
+    """
+    if model_type == LINEAR:
+        return Pipeline([("sc", StandardScaler()), ("lr", LinearRegression())])
+    if model_type == BOOSTING:
+        return HistGradientBoostingRegressor(
+            max_depth=params["max_depth"],
+            learning_rate=params["learning_rate"],
+            max_iter=params["max_iter"],
+            early_stopping=early_stopping,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            random_state=0,
+        )
+    raise ValueError(f"Unknown model type '{model_type}'.")
+
+
+def model_weights(model, model_type: str, features: list[str]) -> pd.DataFrame:
+    """Coefficients (linear) or feature importances (boosting) per feature."""
+    if model_type == LINEAR:
+        weights = model.named_steps["lr"].coef_
+    else:
+        weights = getattr(model, "feature_importances_", np.zeros(len(features)))
+    return pd.DataFrame({"Feature": features, "Weight": weights})
+
+
+def fit_playground_model(X: pd.DataFrame, y: pd.Series, model_type: str, params: dict) -> FitResult:
+    """Fit on ``X``/``y`` and score on the same rows, as the page reports."""
+    start = time.perf_counter()
+    model = make_model(model_type, params)
+    model.fit(X, y)
+    pred = model.predict(X)
+    return FitResult(
+        model=model,
+        metrics={"r2": r2_score(y, pred), "mae": mean_absolute_error(y, pred)},
+        weights=model_weights(model, model_type, list(X.columns)),
+        n_rows=len(X),
+        fit_seconds=time.perf_counter() - start,
+    )
+
+
+def write_progress(job_dir: Path, progress: dict) -> None:
+    """Atomically replace ``progress.json`` in a job directory."""
+    tmp = job_dir / f"progress.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(progress))
+    os.replace(tmp, job_dir / "progress.json")
+
+
+def train_with_progress(
+    job_dir: str | Path,
+    X: pd.DataFrame,
+    y: pd.Series,
+    model_type: str,
+    params: dict,
+    chunk: int = 10,
+) -> FitResult | None:
+    """
+    Boosting fit that reports progress and can be cancelled.
+
+    Grows the model ``chunk`` iterations at a time with ``warm_start``
+    (which yields the same trees as a single fit). After each chunk it
+    writes the iteration count and training R²/MAE to
+    ``job_dir/progress.json`` and stops early, returning ``None``, once
+    ``job_dir/cancel`` exists. Linear models are fitted in one go.
+    """
+    job_dir = Path(job_dir)
+    if model_type != BOOSTING:
+        return fit_playground_model(X, y, model_type, params)
+
+    start = time.perf_counter()
+    max_iter = params["max_iter"]
+    model = make_model(model_type, params)
+    model.set_params(warm_start=True)
+    history = []
+    for target_iter in range(chunk, max_iter + chunk, chunk):
+        if (job_dir / "cancel").exists():
+            return None
+        target_iter = min(target_iter, max_iter)
+        model.set_params(max_iter=target_iter)
+        model.fit(X, y)
+        pred = model.predict(X)
+        history.append({
+            "iteration": int(model.n_iter_),
+            "r2": float(r2_score(y, pred)),
+            "mae": float(mean_absolute_error(y, pred)),
+        })
+        write_progress(job_dir, {"max_iter": max_iter, "history": history})
+        if model.n_iter_ < target_iter or target_iter == max_iter:
+            break  # early stopping kicked in, or done
+
+    model.set_params(warm_start=False, max_iter=max_iter)
+    return FitResult(
+        model=model,
+        metrics={"r2": history[-1]["r2"], "mae": history[-1]["mae"]},
+        weights=model_weights(model, model_type, list(X.columns)),
+        n_rows=len(X),
+        fit_seconds=time.perf_counter() - start,
+        extras={"history": history},
+    )
+
+
+def _fit_fold(X, y, train, test, model_type: str, params: dict) -> tuple[dict, np.ndarray]:
+    model = make_model(model_type, params, early_stopping=True)
+    model.fit(X.iloc[train], y.iloc[train])
+    pred = model.predict(X.iloc[test])
+    scores = {
+        "r2": r2_score(y.iloc[test], pred),
+        "mae": mean_absolute_error(y.iloc[test], pred),
+        "rows": len(test),
+        "iterations": getattr(model, "n_iter_", None),
+    }
+    return scores, model_weights(model, model_type, list(X.columns))["Weight"].to_numpy()
+
+
+def cross_validate_model(
+    X: pd.DataFrame,
+    y: pd.Series,
+    model_type: str,
+    params: dict,
+    folds: int = 5,
+    n_jobs: int | None = None,
+    seed: int = 0,
+) -> FitResult:
+    """
+    Held-out R²/MAE from shuffled k-fold cross-validation.
+
+    Folds are fitted in parallel worker processes (``n_jobs`` defaults to
+    one per fold, capped at the core count), so wall-clock time stays
+    close to a single fit. Boosting folds early-stop on a validation split
+    carved from their own training rows; the held-out fold is never seen.
+
+    Returns
+    -------
+    FitResult
+        ``metrics`` has the mean and standard deviation of each score,
+        ``extras["folds"]`` the per-fold table and ``weights`` the mean
+        across folds. No single model is kept (``model`` is ``None``).
+    """
+    start = time.perf_counter()
+    splits = KFold(n_splits=folds, shuffle=True, random_state=seed).split(X)
+    n_jobs = n_jobs or min(folds, os.cpu_count() or 1)
+    out = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(X, y, train, test, model_type, params) for train, test in splits
+    )
+    per_fold = pd.DataFrame([scores for scores, _ in out]).dropna(axis=1, how="all")
+    per_fold.index = pd.RangeIndex(1, folds + 1, name="fold")
+    metrics = {}
+    for name in ("r2", "mae"):
+        metrics[name] = float(per_fold[name].mean())
+        metrics[f"{name}_std"] = float(per_fold[name].std(ddof=1))
+    return FitResult(
+        model=None,
+        metrics=metrics,
+        weights=pd.DataFrame({
+            "Feature": list(X.columns),
+            "Weight": np.mean([w for _, w in out], axis=0),
+        }),
+        n_rows=len(X),
+        fit_seconds=time.perf_counter() - start,
+        extras={"folds": per_fold},
+    )
@@ -0,0 +1,154 @@
+# prewarm.py
+"""
+Background pre-warming of the process-wide caches.
+
+Without it the first visitor after a deploy pays for everything at once:
+the plotting and scikit-learn imports, parsing the zipped CSV, building
+the aggregate cube and the EDA statistics, and both ``joblib.load``
+calls. :func:`start_prewarm` runs those steps on a daemon thread as soon
+as the server first executes ``streamlit_app.py``, so they overlap with
+the landing page instead of the first chart. Pages import their heavy
+libraries only where they use them and get whatever the thread has
+already imported for free.
+
+Every step fills the caches the pages read (:mod:`dataset`,
+:mod:`model_registry`), so a page that asks first waits for the value in
+flight instead of computing it twice. A failing step (e.g. no dataset)
+is skipped; the page that needs it reports the error.
+
+The on-disk parts, the Arrow sidecar and the statistics file, can be
+built before the server starts at all::
+
+    python prewarm.py
+"""
+import argparse
+import importlib
+import logging
+import threading
+import time
+from typing import Callable
+
+THREAD_NAME = "prewarm"
+
+# Roughly in the order the pages need them; yfinance is optional.
+MODULES = (
+    "plotly.express", "matplotlib.pyplot", "seaborn",
+    "playground", "sweep", "training_jobs", "yfinance",
+)
+
+
+def _sidecar() -> None:
+    from dataset import DATA_ZIP
+    from utils import ensure_sidecar
+
+    ensure_sidecar(DATA_ZIP)
+
+
+def _statistics() -> None:
+    from dataset import DATA_ZIP
+    from stats_artifact import load_or_build_stats
+
+    load_or_build_stats(DATA_ZIP)
+
+
+def _models() -> None:
+    from model_registry import get_registry
+
+    get_registry().warm_up()
+
+
+def _aggregates() -> None:
+    from dataset import get_aggregate_cube, get_esg_dtypes, get_esg_stats
+
+    get_esg_dtypes()
+    get_aggregate_cube()
+    get_esg_stats()
+
+
+def _playground_slice() -> None:
+    from dataset import get_esg_data
+    from playground import DEFAULT_FEATURES, DEFAULT_TARGET
+
+    get_esg_data(columns=[DEFAULT_TARGET, *DEFAULT_FEATURES], full_precision=True)
+
+
+def _imports() -> None:
+    for name in MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+# Sidecar first: every later data step then reads it instead of the CSV.
+STEPS: dict[str, Callable[[], None]] = {
+    "sidecar": _sidecar,
+    "statistics": _statistics,
+    "models": _models,
+    "aggregates": _aggregates,
+    "playground_slice": _playground_slice,
+    "imports": _imports,
+}
+DISK_STEPS = ("sidecar", "statistics")
+
+
+def warm(steps: tuple[str, ...] | None = None) -> dict[str, float | None]:
+    """
+    Run the named steps (all by default) in order.
+
+    Returns seconds per step, or ``None`` for a step that failed.
+    """
+    timings = {}
+    for name in steps or tuple(STEPS):
+        start = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception:  # the page that needs this step reports it
+            timings[name] = None
+        else:
+            timings[name] = time.perf_counter() - start
+    return timings
+
+
+class _SkipPrewarmThread(logging.Filter):
+    # Cached loaders show spinners; off the script thread Streamlit logs a
+    # "missing ScriptRunContext" warning for each instead.
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.threadName != THREAD_NAME
+
+
+_thread: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def start_prewarm() -> threading.Thread:
+    """
+    Run :func:`warm` on a background thread, once per process.
+
+    Safe to call on every rerun; later calls return the same thread.
+    """
+    global _thread
+
+    with _lock:
+        if _thread is None:
+            logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+                _SkipPrewarmThread()
+            )
+            _thread = threading.Thread(target=warm, name=THREAD_NAME, daemon=True)
+            _thread.start()
+        return _thread
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the app's caches ahead of the first visitor.")
+    parser.add_argument(
+        "--steps", nargs="+", choices=list(STEPS), default=list(DISK_STEPS),
+        help="steps to run (default: the on-disk ones)",
+    )
+    args = parser.parse_args(argv)
+    for name, seconds in warm(tuple(args.steps)).items():
+        print(f"{name:18s} {'failed' if seconds is None else f'{seconds:8.2f} s'}")
+
+
+if __name__ == "__main__":
+    main()
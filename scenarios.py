@@ -0,0 +1,335 @@
+# scenarios.py
+"""
+ESG-risk what-if scenarios for the Predict by Ticker page.
+
+A scenario grid is a table of percentage shocks to the Environmental,
+Social and Governance risk scores. All rows are turned into one feature
+matrix per model and scored with a single ``predict`` call, so a 1%-step
+uniform sweep or a 3-D grid of thousands of E/S/G combinations costs
+about the same per-call overhead as one row.
+
+:func:`simulate_scenarios` is the stochastic counterpart: random,
+correlated E/S/G shocks around each shock level, scored in batches and
+summarised as percentile bands while it runs.
+"""
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+EBITDA_FEATURES = [
+    "Asset_Turnover", "Debt_Ratio", "Log_Assets", "ROA", "Net_Profit_Margin",
+    "CashFlow_Margin", "ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score",
+]
+OPERATING_FEATURES = [
+    "Asset_Turnover", "Debt_Ratio", "Log_Assets", "CapEx_Intensity",
+    "ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score",
+]
+ESG_SCORE_COLS = ["ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score"]
+SHOCK_COLS = ["Env +%", "Soc +%", "Gov +%"]
+RISK_COLS = ["env_risk", "soc_risk", "gov_risk"]
+STATEMENT_COLS = ["total_assets", "total_liab", "revenue", "net_income", "cash_ops", "capex"]
+RATIO_FEATURES = [
+    "Asset_Turnover", "Debt_Ratio", "Log_Assets", "ROA", "Net_Profit_Margin",
+    "CashFlow_Margin", "CapEx_Intensity",
+]
+
+MC_BLOCK = 1_000  # draws per random-number block (see simulate_scenarios)
+BAND_PERCENTILES = (5, 50, 95)
+
+
+def ratio_features(
+    total_assets: float,
+    total_liab: float,
+    revenue: float,
+    net_income: float,
+    cash_ops: float,
+    capex: float,
+) -> dict:
+    """
+    Financial ratios used by the margin models, from raw statement values.
+
+    Accepts scalars for one firm or aligned arrays for many.
+    """
+    return {
+        "Asset_Turnover": revenue / total_assets,
+        "Debt_Ratio": total_liab / total_assets,
+        "Log_Assets": np.log10(total_assets),
+        "ROA": net_income / total_assets,
+        "Net_Profit_Margin": net_income / revenue,
+        "CashFlow_Margin": cash_ops / revenue,
+        "CapEx_Intensity": np.abs(capex) / revenue,
+    }
+
+
+def uniform_grid(start: int, stop: int, step: int) -> pd.DataFrame:
+    """The same percentage shock applied to all three risk scores."""
+    pcts = np.arange(start, stop + 1, step)
+    return pd.DataFrame({c: pcts for c in SHOCK_COLS})
+
+
+def independent_grid(env_pcts, soc_pcts, gov_pcts) -> pd.DataFrame:
+    """Every combination of separate E, S and G shocks (a 3-D grid)."""
+    e, s, g = np.meshgrid(env_pcts, soc_pcts, gov_pcts, indexing="ij")
+    return pd.DataFrame({"Env +%": e.ravel(), "Soc +%": s.ravel(), "Gov +%": g.ravel()})
+
+
+def shocked_scores(risks, shocks: np.ndarray) -> np.ndarray:
+    """
+    Model-scale ESG scores after shocking raw risk scores.
+
+    Parameters
+    ----------
+    risks : array-like, shape (3,) or (n, 3)
+        Raw E, S, G risk scores on Yahoo's 0-100 scale (lower is better).
+    shocks : numpy.ndarray, shape (n, 3)
+        Percentage increases per row.
+
+    Returns
+    -------
+    numpy.ndarray, shape (n, 3)
+        ``1 - risk/100`` with the shocked risk capped at 100.
+    """
+    shocked = np.minimum(np.asarray(risks, dtype=float) * (1 + shocks / 100), 100)
+    return 1 - shocked / 100
+
+
+def feature_frames(base: dict, scores: np.ndarray) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Feature matrices for both models, one row per scenario.
+
+    ``base`` may hold scalars (one firm) or arrays aligned with ``scores``
+    (one firm per row).
+    """
+    n = len(scores)
+    cols = {k: np.broadcast_to(np.asarray(v, dtype=float), n) for k, v in base.items()}
+    cols.update(zip(ESG_SCORE_COLS, scores.T))
+    return (
+        pd.DataFrame({c: cols[c] for c in EBITDA_FEATURES}),
+        pd.DataFrame({c: cols[c] for c in OPERATING_FEATURES}),
+    )
+
+
+def score_scenarios(
+    ebitda_model,
+    operating_model,
+    base: dict,
+    risks,
+    grid: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Predict both margins for every row of ``grid`` in one call per model.
+
+    Returns ``grid`` with ``EBITDA Margin`` and ``Operating Margin`` added.
+    """
+    scores = shocked_scores(risks, grid[SHOCK_COLS].to_numpy(dtype=float))
+    X_ebt, X_op = feature_frames(base, scores)
+    out = grid.reset_index(drop=True).copy()
+    out["EBITDA Margin"] = ebitda_model.predict(X_ebt)
+    out["Operating Margin"] = operating_model.predict(X_op)
+    return out
+
+
+def explain_scenarios(
+    ebitda_model,
+    operating_model,
+    base: dict,
+    risks,
+    grid: pd.DataFrame,
+) -> tuple[pd.DataFrame, dict[str, pd.DataFrame]]:
+    """
+    :func:`score_scenarios` plus per-feature drivers of each margin.
+
+    Needs models with an ``explain`` method (:class:`tree_engine.FlatForest`).
+    Drivers are leaf-path contributions relative to the unshocked firm, so
+    each row sums to that scenario's margin change versus no shock.
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        Same as :func:`score_scenarios`.
+    drivers : dict
+        ``{"EBITDA Margin": frame, "Operating Margin": frame}``, one column
+        per model feature, aligned with ``results``.
+    """
+    shocks = grid[SHOCK_COLS].to_numpy(dtype=float)
+    # The last row is the unshocked reference.
+    scores = shocked_scores(risks, np.vstack([shocks, np.zeros((1, 3))]))
+    out = grid.reset_index(drop=True).copy()
+    drivers = {}
+    for label, model, X in zip(
+        ("EBITDA Margin", "Operating Margin"), (ebitda_model, operating_model), feature_frames(base, scores)
+    ):
+        pred, contrib = model.explain(X)
+        out[label] = pred[:-1]
+        drivers[label] = pd.DataFrame(contrib[:-1] - contrib[-1], columns=X.columns)
+    return out, drivers
+
+
+def score_portfolio(
+    ebitda_model,
+    operating_model,
+    firms: pd.DataFrame,
+    grid: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Score every firm × scenario pair in one call per model.
+
+    Parameters
+    ----------
+    firms : pandas.DataFrame
+        One row per firm with a ``Ticker`` column plus :data:`RISK_COLS`
+        and :data:`STATEMENT_COLS` (see :func:`market_data.firm_inputs`).
+    grid : pandas.DataFrame
+        Shock grid with :data:`SHOCK_COLS`, applied to every firm.
+
+    Returns
+    -------
+    pandas.DataFrame
+        ``len(firms) * len(grid)`` rows: ``Ticker``, the grid columns and
+        both predicted margins.
+    """
+    firm_idx = np.repeat(np.arange(len(firms)), len(grid))
+    grid_idx = np.tile(np.arange(len(grid)), len(firms))
+
+    raw = {c: firms[c].to_numpy(dtype=float)[firm_idx] for c in STATEMENT_COLS}
+    risks = firms[RISK_COLS].to_numpy(dtype=float)[firm_idx]
+    shocks = grid[SHOCK_COLS].to_numpy(dtype=float)[grid_idx]
+    X_ebt, X_op = feature_frames(ratio_features(**raw), shocked_scores(risks, shocks))
+
+    out = grid.iloc[grid_idx].reset_index(drop=True)
+    out.insert(0, "Ticker", firms["Ticker"].to_numpy()[firm_idx])
+    out["EBITDA Margin"] = ebitda_model.predict(X_ebt)
+    out["Operating Margin"] = operating_model.predict(X_op)
+    return out
+
+
+def esg_correlation(rho: float) -> np.ndarray:
+    """3×3 correlation matrix with the same ``rho`` between each pair of E, S, G."""
+    corr = np.full((3, 3), float(rho))
+    np.fill_diagonal(corr, 1.0)
+    return corr
+
+
+def _correlation_factor(corr) -> np.ndarray:
+    """``F`` with ``F @ F.T == corr``; also valid for singular matrices."""
+    corr = esg_correlation(corr) if np.ndim(corr) == 0 else np.asarray(corr, dtype=float)
+    if corr.shape != (3, 3) or not np.allclose(corr, corr.T) or not np.allclose(np.diag(corr), 1):
+        raise ValueError("corr must be a scalar or a symmetric 3×3 matrix with a unit diagonal.")
+    w, v = np.linalg.eigh(corr)
+    if w.min() < -1e-9:
+        raise ValueError("corr is not positive semi-definite.")
+    return v * np.sqrt(np.clip(w, 0, None))
+
+
+def _noise_block(seed: int, block: int) -> tuple[np.ndarray, np.ndarray]:
+    # Block ``b`` always gets the same stream for a seed, so results do not
+    # depend on the batch size, and a run with more draws extends one with
+    # fewer.
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,)))
+    return rng.standard_normal((MC_BLOCK, 3)), rng.standard_normal((MC_BLOCK, len(RATIO_FEATURES)))
+
+
+def _noisy_base(base: dict, z: np.ndarray, ratio_sd: float) -> dict:
+    """
+    Lognormal noise on each ratio, with the median at the firm's value.
+
+    ``Log_Assets`` is log10 of assets, so its noise is additive on the
+    same scale.
+    """
+    out = dict(base)
+    for j, name in enumerate(RATIO_FEATURES):
+        if name == "Log_Assets":
+            out[name] = base[name] + ratio_sd * z[:, j] / np.log(10)
+        else:
+            out[name] = base[name] * np.exp(ratio_sd * z[:, j])
+    return out
+
+
+def simulate_scenarios(
+    ebitda_model,
+    operating_model,
+    base: dict,
+    risks,
+    levels,
+    n_draws: int,
+    shock_sd: float,
+    corr=0.0,
+    ratio_sd: float = 0.0,
+    seed: int = 0,
+    batch_draws: int = 5_000,
+    percentiles=BAND_PERCENTILES,
+) -> Iterator[tuple[int, pd.DataFrame]]:
+    """
+    Monte Carlo version of :func:`score_scenarios` for one firm.
+
+    At every shock level ``L`` in ``levels`` the E, S and G shocks are
+    drawn from a normal distribution with mean ``L``%, standard deviation
+    ``shock_sd`` percentage points and correlation ``corr``. Shocks are
+    floored at -100% so a risk score cannot go negative. With ``ratio_sd``
+    > 0 each draw also perturbs the firm's financial ratios (see
+    :func:`_noisy_base`). All levels share the same draws (common random
+    numbers), so differences between levels are not sampling noise.
+
+    Each batch of ``batch_draws`` draws (rounded up to whole blocks of
+    :data:`MC_BLOCK`) is scored at every level in one ``predict`` call
+    per model. The results depend only on ``seed`` and ``n_draws``, not
+    on the batch size.
+
+    Parameters
+    ----------
+    base : dict
+        Scalar ratio features of the firm (:func:`ratio_features`).
+    risks : array-like, shape (3,)
+        Raw E, S, G risk scores.
+    levels : array-like
+        Mean shock per level, in percent.
+    corr : float or array-like, shape (3, 3)
+        Correlation of the E, S and G shocks; a scalar is used for every pair.
+
+    Yields
+    ------
+    draws_done : int
+        Draws scored so far per level.
+    bands : pandas.DataFrame
+        One row per level: ``Risk +%`` and ``"<margin> P<p>"`` for each
+        margin and percentile, over the draws so far.
+
+    Raises
+    ------
+    ValueError
+        If ``corr`` is not a valid correlation matrix or ``n_draws`` < 1.
+    """
+    if n_draws < 1:
+        raise ValueError("n_draws must be at least 1.")
+    factor = _correlation_factor(corr)
+    levels = np.asarray(levels, dtype=float)
+    n_levels = len(levels)
+    labels = ("EBITDA Margin", "Operating Margin")
+    preds = np.empty((len(labels), n_levels, n_draws))
+    blocks_per_batch = max(1, -(-batch_draws // MC_BLOCK))
+
+    done = 0
+    block = 0
+    while done < n_draws:
+        z_shock, z_ratio = zip(*(_noise_block(seed, b) for b in range(block, block + blocks_per_batch)))
+        block += blocks_per_batch
+        size = min(n_draws - done, blocks_per_batch * MC_BLOCK)
+        z_shock = np.concatenate(z_shock)[:size]
+        z_ratio = np.concatenate(z_ratio)[:size]
+
+        # Rows are level-major: row ``i * size + j`` is draw ``j`` at level ``i``.
+        shocks = levels[:, None, None] + shock_sd * (z_shock @ factor.T)[None]
+        shocks = np.maximum(shocks, -100).reshape(-1, 3)
+        firm = _noisy_base(base, np.tile(z_ratio, (n_levels, 1)), ratio_sd) if ratio_sd > 0 else base
+        X_ebt, X_op = feature_frames(firm, shocked_scores(risks, shocks))
+        preds[0, :, done:done + size] = ebitda_model.predict(X_ebt).reshape(n_levels, size)
+        preds[1, :, done:done + size] = operating_model.predict(X_op).reshape(n_levels, size)
+        done += size
+
+        q = np.percentile(preds[:, :, :done], percentiles, axis=-1)  # (P, margins, levels)
+        bands = pd.DataFrame({"Risk +%": levels})
+        for m, label in enumerate(labels):
+            for k, p in enumerate(percentiles):
+                bands[f"{label} P{p:g}"] = q[k, m]
+        yield done, bands
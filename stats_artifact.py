@@ -0,0 +1,443 @@
+# stats_artifact.py
+"""
+Precomputed EDA statistics, built once per dataset version.
+
+The EDA page used to run Seaborn's KDE and ``DataFrame.corr`` over every
+row on each view. :func:`build_stats` computes everything the page draws
+(headline metrics, a small preview, histogram bin counts, KDE curves on a
+fixed grid and the correlation matrix) and :func:`load_or_build_stats`
+keeps it in a small JSON file next to the dataset zip, rebuilt only when
+the zip's content hash changes. Rendering then costs the same for any
+panel size.
+
+KDEs use Gaussian kernels with Scott's bandwidth (Seaborn's default):
+the sample is linearly binned onto a fine grid and convolved with the
+kernel by FFT, which is O(n + g log g) instead of O(n × g).
+
+The statistics are built out of core by :func:`build_stats_from_chunks`,
+a few streamed passes over the panel that hold one chunk at a time, so
+panels larger than memory work too. Histogram edges follow numpy's
+``"auto"`` rule from exact quartiles and correlations use pairwise
+complete rows as ``DataFrame.corr`` does; the output is the same for any
+chunk size, including the whole frame at once (:func:`build_stats`).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+from utils import dataset_version, iter_esg_chunks, read_esg_head
+
+STATS_VERSION = 2
+
+DIST_COLS = ["ESG_Combined_Score", "ESG_Environmental_Score", "ESG_Social_Score", "ESG_Governance_Score"]
+CORR_COLS = DIST_COLS + ["ROA", "ROE", "Total_Return", "Debt_Ratio"]
+PREVIEW_ROWS = 5
+KDE_GRID_POINTS = 512
+KDE_FINE_POINTS = 4096
+RANK_BINS = 4096
+
+
+def stats_path(zip_path: str | Path) -> Path:
+    """Location of the statistics file for a dataset zip."""
+    zip_path = Path(zip_path)
+    return zip_path.with_name(f"{zip_path.name.split('.')[0]}.stats.json")
+
+
+def _kde_grid(lo: float, hi: float, bw: float, fine_points: int) -> np.ndarray:
+    # Pad by 4 bandwidths so no kernel mass wraps around the FFT.
+    return np.linspace(lo - 4 * bw, hi + 4 * bw, fine_points)
+
+
+def _linear_bin(x: np.ndarray, fine: np.ndarray, left_w: np.ndarray, right_w: np.ndarray) -> None:
+    """Add ``x``'s linear-binning weights on ``fine`` to the running arrays, in row order."""
+    dx = fine[1] - fine[0]
+    pos = (x - fine[0]) / dx
+    left = np.floor(pos).astype(np.intp)
+    frac = pos - left
+    left_w[:] = _fold_bins(left_w, left, 1 - frac)
+    right_w[:] = _fold_bins(right_w, left + 1, frac)
+
+
+def _kde_from_weights(
+    weights: np.ndarray, fine: np.ndarray, bw: float, n: int, lo: float, hi: float, grid_points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    fine_points = len(fine)
+    dx = fine[1] - fine[0]
+    offsets = np.arange(-fine_points, fine_points) * dx
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    size = 4 * fine_points
+    conv = np.fft.irfft(np.fft.rfft(weights, size) * np.fft.rfft(kernel, size), size)
+    density = conv[fine_points:2 * fine_points] / n
+
+    grid = np.linspace(lo, hi, grid_points)
+    return grid, np.interp(grid, fine, np.maximum(density, 0))
+
+
+def fft_kde(
+    x: np.ndarray,
+    grid_points: int = 512,
+    fine_points: int = 4096,
+    bw: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Gaussian KDE of ``x`` evaluated on ``grid_points`` over its range.
+
+    Parameters
+    ----------
+    fine_points : int
+        Size of the binning grid the convolution runs on; the result is
+        interpolated from it onto the output grid.
+    bw : float, optional
+        Kernel standard deviation; defaults to Scott's rule.
+
+    Returns
+    -------
+    grid, density : numpy.ndarray
+        Evaluation points over ``[min(x), max(x)]`` and the density there.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if bw is None:
+        bw = x.std(ddof=1) * n ** (-1 / 5)
+    lo, hi = x.min(), x.max()
+    fine = _kde_grid(lo, hi, bw, fine_points)
+    left_w, right_w = np.zeros(fine_points + 1), np.zeros(fine_points + 1)
+    _linear_bin(x, fine, left_w, right_w)
+    weights = (left_w + right_w)[:fine_points]
+    return _kde_from_weights(weights, fine, bw, n, lo, hi, grid_points)
+
+
+# --- Chunked statistics ------------------------------------------------------
+#
+# Every statistic is a fold over row chunks, so a panel far larger than
+# memory is summarised one chunk at a time. Float sums are always
+# continued row by row from their running value (``cumsum`` along rows,
+# or ``bincount`` with the running value as the first weight), never
+# re-associated, so the result does not depend on where chunks start:
+# the whole frame as a single chunk gives the same floats as any
+# streaming of it.
+
+
+def _fold(running: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    ``running + values.sum(axis=1)``, adding columns one after another.
+
+    ``values`` is a scratch ``(k, n)`` array and is modified in place.
+    """
+    if values.shape[1] == 0:
+        return running
+    values[:, 0] += running
+    return np.cumsum(values, axis=1)[:, -1]
+
+
+def _fold_bins(running: np.ndarray, index: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """``running`` plus ``bincount(index, weights)``, adding rows in order."""
+    size = len(running)
+    return np.bincount(
+        np.concatenate([np.arange(size), index]),
+        weights=np.concatenate([running, weights]),
+        minlength=size,
+    )[:size]
+
+
+def _moments(chunks: Iterable[pd.DataFrame], cols: list[str]) -> dict:
+    """
+    Pass 1: row/year/ticker summary plus pairwise moments of ``cols``.
+
+    Values are shifted by each column's first non-missing value before
+    squaring, which keeps the one-pass variance and covariance sums well
+    conditioned. For each pair ``(i, j)`` the sums run over rows where
+    both are present, as ``DataFrame.corr`` does.
+    """
+    k = len(cols)
+    shift = np.full(k, np.nan)
+    count = np.zeros((k, k), dtype=np.int64)
+    s1, s2, sp = np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k))
+    lo, hi = np.full(k, np.inf), np.full(k, -np.inf)
+    rows, year_min, year_max, tickers = 0, None, None, set()
+
+    for chunk in chunks:
+        rows += len(chunk)
+        years = chunk["year"].dropna()
+        if len(years):
+            year_min = years.min() if year_min is None else min(year_min, years.min())
+            year_max = years.max() if year_max is None else max(year_max, years.max())
+        tickers.update(chunk["ticker_ann"].dropna().unique().tolist())
+
+        X = chunk[cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(X)
+        new = np.isnan(shift) & valid.any(axis=0)
+        if new.any():
+            first = valid.argmax(axis=0)
+            shift[new] = X[first[new], np.flatnonzero(new)]
+        # Column-major copies so each fold runs along contiguous rows.
+        Z = np.ascontiguousarray(np.where(valid, X - np.nan_to_num(shift), 0.0).T)
+        M = np.ascontiguousarray(valid.T, dtype=np.float64)
+        for i in range(k):
+            zi = Z[i]
+            s1[i] = _fold(s1[i], zi * M)    # sum of z_i where z_j is present
+            s2[i] = _fold(s2[i], zi * zi * M)
+            sp[i] = _fold(sp[i], zi * Z)
+        count += valid.T.astype(np.int64) @ valid.astype(np.int64)
+        lo = np.minimum(lo, np.where(valid, X, np.inf).min(axis=0, initial=np.inf))
+        hi = np.maximum(hi, np.where(valid, X, -np.inf).max(axis=0, initial=-np.inf))
+
+    return {
+        "summary": {
+            "rows": rows,
+            "year_min": None if year_min is None else int(year_min),
+            "year_max": None if year_max is None else int(year_max),
+            "tickers": len(tickers),
+        },
+        "count": count, "s1": s1, "s2": s2, "sp": sp, "lo": lo, "hi": hi,
+    }
+
+
+def _correlations(m: dict) -> np.ndarray:
+    """Pearson correlations with pairwise-complete rows from the moment sums."""
+    n = m["count"].astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = m["sp"] - m["s1"] * m["s1"].T / n
+        var = m["s2"] - m["s1"] ** 2 / n           # var[i, j]: z_i over rows with z_j
+        corr = cov / np.sqrt(var * var.T)
+    ok = (n >= 2) & (var > 0) & (var.T > 0)
+    corr = np.where(ok, np.clip(corr, -1.0, 1.0), np.nan)
+    diag = np.diag_indices_from(corr)
+    corr[diag] = np.where(ok[diag], 1.0, np.nan)
+    return corr
+
+
+def _quantile_ranks(n: int, q: float) -> tuple[int, int, float]:
+    """Order statistics and weight for ``np.percentile``'s linear method."""
+    virtual = (n - 1) * q
+    if virtual >= n - 1:
+        return n - 1, n - 1, virtual - (n - 1)
+    prev = int(np.floor(virtual))
+    return prev, prev + 1, virtual - prev
+
+
+def _lerp(a: float, b: float, t: float) -> float:
+    # Same two-sided form as numpy, so the quantile matches to the bit.
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+def _auto_edges(n: int, lo: float, hi: float, q25: float, q75: float) -> np.ndarray:
+    """``np.histogram_bin_edges(x, "auto")`` from the size, range and quartiles."""
+    first, last = (lo - 0.5, hi + 0.5) if lo == hi else (lo, hi)
+    ptp = hi - lo
+    fd = 2.0 * (q75 - q25) * n ** (-1.0 / 3.0)
+    sturges = ptp / (np.log2(n) + 1.0)
+    width = min(max(fd, ptp / np.sqrt(n) / 2), sturges)
+    bins = int(np.ceil((last - first) / width)) if width else 1
+    return np.linspace(first, last, bins + 1, endpoint=True)
+
+
+def _rank_bin(x: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    return np.minimum(((x - lo) / (hi - lo) * RANK_BINS).astype(np.intp), RANK_BINS - 1)
+
+
+def _distributions(chunk_source, dist_cols: list[str], m: dict, index: dict) -> dict:
+    """
+    Passes 2-4: histogram edges and counts plus KDE curves per column.
+
+    Numpy's ``"auto"`` bins need the exact quartiles. Pass 2 counts values
+    in ``RANK_BINS`` equal bins to find which bins hold the quartiles' order
+    statistics (and bins the KDE weights); pass 3 keeps only the values in
+    those bins to read the order statistics off exactly; pass 4 counts the
+    histogram.
+    """
+    cols = [c for c in dist_cols if m["count"][index[c], index[c]] > 0]
+    out = {c: {"n": 0, "edges": [], "counts": [], "kde_x": [], "kde_y": []} for c in dist_cols}
+    if not cols:
+        return out
+
+    info = {}
+    for c in cols:
+        i = index[c]
+        n = int(m["count"][i, i])
+        var = m["s2"][i, i] - m["s1"][i, i] ** 2 / n
+        info[c] = {"n": n, "lo": m["lo"][i], "hi": m["hi"][i], "var": var, "ranks": np.zeros(RANK_BINS, np.int64)}
+        if n > 1 and var > 0:
+            bw = np.sqrt(var / (n - 1)) * n ** (-1 / 5)
+            info[c]["bw"] = bw
+            info[c]["fine"] = _kde_grid(info[c]["lo"], info[c]["hi"], bw, KDE_FINE_POINTS)
+            info[c]["left_w"] = np.zeros(KDE_FINE_POINTS + 1)
+            info[c]["right_w"] = np.zeros(KDE_FINE_POINTS + 1)
+
+    def values(chunk, c):
+        x = chunk[c].to_numpy(dtype=np.float64, na_value=np.nan)
+        return x[~np.isnan(x)]
+
+    for chunk in chunk_source():
+        for c in cols:
+            d, x = info[c], values(chunk, c)
+            if d["hi"] > d["lo"]:
+                d["ranks"] += np.bincount(_rank_bin(x, d["lo"], d["hi"]), minlength=RANK_BINS)
+            if "fine" in d:
+                _linear_bin(x, d["fine"], d["left_w"], d["right_w"])
+
+    # Which order statistics each quartile needs, and the bins holding them.
+    for c in cols:
+        d = info[c]
+        d["quartiles"] = [_quantile_ranks(d["n"], q) for q in (0.75, 0.25)]
+        wanted = sorted({r for prev, nxt, _ in d["quartiles"] for r in (prev, nxt)})
+        if d["hi"] > d["lo"]:
+            before = np.concatenate([[0], np.cumsum(d["ranks"])])
+            d["targets"] = {r: int(np.searchsorted(before, r, side="right")) - 1 for r in wanted}
+            d["before"] = before
+        d["found"] = {}
+
+    needs_values = [c for c in cols if "targets" in info[c]]
+    if needs_values:
+        for chunk in chunk_source():
+            for c in needs_values:
+                d, x = info[c], values(chunk, c)
+                bins = _rank_bin(x, d["lo"], d["hi"])
+                for b in set(d["targets"].values()):
+                    v, k = np.unique(x[bins == b], return_counts=True)
+                    d["found"].setdefault(b, []).append((v, k))
+
+    for c in cols:
+        d = info[c]
+
+        def order_stat(r, d=d):
+            if "targets" not in d:
+                return d["lo"]
+            b = d["targets"][r]
+            v = np.concatenate([p[0] for p in d["found"][b]])
+            k = np.concatenate([p[1] for p in d["found"][b]])
+            uniq, inverse = np.unique(v, return_inverse=True)
+            cum = np.cumsum(np.bincount(inverse, weights=k).astype(np.int64))
+            return float(uniq[np.searchsorted(cum, r - d["before"][b], side="right")])
+
+        q75, q25 = (_lerp(order_stat(prev), order_stat(nxt), t) for prev, nxt, t in d["quartiles"])
+        d["edges"] = _auto_edges(d["n"], d["lo"], d["hi"], q25, q75)
+        d["counts"] = np.zeros(len(d["edges"]) - 1, dtype=np.int64)
+
+    for chunk in chunk_source():
+        for c in cols:
+            d = info[c]
+            d["counts"] += np.histogram(values(chunk, c), bins=d["edges"])[0]
+
+    for c in cols:
+        d = info[c]
+        out[c] = {"n": d["n"], "edges": d["edges"].tolist(), "counts": d["counts"].tolist(), "kde_x": [], "kde_y": []}
+        if "fine" in d:
+            weights = (d["left_w"] + d["right_w"])[:KDE_FINE_POINTS]
+            grid, density = _kde_from_weights(
+                weights, d["fine"], d["bw"], d["n"], d["lo"], d["hi"], KDE_GRID_POINTS
+            )
+            # Same scaling as Seaborn's histplot(kde=True) with count bars.
+            out[c]["kde_x"] = grid.tolist()
+            out[c]["kde_y"] = (density * d["n"] * (d["edges"][1] - d["edges"][0])).tolist()
+    return out
+
+
+def build_stats_from_chunks(
+    chunk_source: Callable[[], Iterable[pd.DataFrame]],
+    dist_cols: list[str] = DIST_COLS,
+    corr_cols: list[str] = CORR_COLS,
+    preview: pd.DataFrame | None = None,
+) -> dict:
+    """
+    Everything the EDA page shows, from a panel streamed in chunks.
+
+    Parameters
+    ----------
+    chunk_source : callable
+        Returns a fresh iterator over the panel's rows in file order, e.g.
+        ``lambda: iter_esg_chunks(zip_path, columns)``. It is called up to
+        four times (one pass per statistic that depends on the last), and
+        only one chunk plus O(columns² + bins) state is held at a time.
+    preview : pandas.DataFrame, optional
+        Rows shown as the dataset preview; empty when omitted.
+
+    Returns
+    -------
+    dict
+        JSON-able statistics, identical whatever the chunk size.
+    """
+    cols = list(dict.fromkeys([*dist_cols, *corr_cols]))
+    index = {c: i for i, c in enumerate(cols)}
+    m = _moments(chunk_source(), cols)
+    corr = _correlations(m)[np.ix_([index[c] for c in corr_cols], [index[c] for c in corr_cols])]
+    preview = pd.DataFrame() if preview is None else preview
+    return {
+        "summary": m["summary"],
+        "preview": json.loads(preview.to_json(orient="split", index=False, double_precision=15)),
+        "distributions": _distributions(chunk_source, dist_cols, m, index),
+        "corr": {"columns": corr_cols, "values": corr.tolist()},
+    }
+
+
+def build_stats(
+    df: pd.DataFrame,
+    dist_cols: list[str] = DIST_COLS,
+    corr_cols: list[str] = CORR_COLS,
+    preview: pd.DataFrame | None = None,
+) -> dict:
+    """
+    Everything the EDA page shows, as a JSON-able dict.
+
+    The in-memory form of :func:`build_stats_from_chunks` (``df`` is one
+    chunk), with the same results. ``preview`` defaults to the first rows
+    of ``df``; pass the full-width head when ``df`` holds only the columns
+    the statistics need.
+    """
+    preview = df.head(PREVIEW_ROWS) if preview is None else preview
+    return build_stats_from_chunks(lambda: iter([df]), dist_cols, corr_cols, preview)
+
+
+def _valid(stats: dict, sha: str, dist_cols: list[str], corr_cols: list[str]) -> bool:
+    return (
+        stats.get("version") == STATS_VERSION
+        and stats.get("dataset_sha256") == sha
+        and list(stats.get("distributions", {})) == list(dist_cols)
+        and stats.get("corr", {}).get("columns") == list(corr_cols)
+    )
+
+
+def load_or_build_stats(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    dist_cols: list[str] = DIST_COLS,
+    corr_cols: list[str] = CORR_COLS,
+    chunksize: int = 100_000,
+) -> dict:
+    """
+    Read the statistics file, rebuilding it if missing or stale.
+
+    Rebuilding streams only the columns the statistics need, ``chunksize``
+    rows at a time, so it works for panels that do not fit in memory. The
+    file is replaced atomically; if it cannot be written the fresh
+    statistics are still returned.
+    """
+    path = stats_path(zip_path)
+    sha = dataset_version(zip_path)
+    try:
+        stats = json.loads(path.read_text())
+        if _valid(stats, sha, dist_cols, corr_cols):
+            return stats
+    except (OSError, ValueError):
+        pass
+
+    columns = list(dict.fromkeys(["ticker_ann", "year", *dist_cols, *corr_cols]))
+    stats = {
+        "version": STATS_VERSION,
+        "dataset_sha256": sha,
+        **build_stats_from_chunks(
+            lambda: iter_esg_chunks(zip_path, columns=columns, chunksize=chunksize),
+            dist_cols, corr_cols, preview=read_esg_head(zip_path, PREVIEW_ROWS),
+        ),
+    }
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_text(json.dumps(stats, separators=(",", ":")))
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+    return stats
@@ -1,6 +1,12 @@
 import streamlit as st
+from instrumentation import page_run
+from prewarm import start_prewarm
 st.set_page_config(page_title="ESG Analytics Suite", page_icon="💹", layout="wide")
 
+# Load the data, aggregates, both margin models and the heavy imports in
+# the background so the first visitor does not pay for them (see prewarm.py).
+start_prewarm()
+
 
 App_page_intro  = st.Page("pages/intro.py",              title="Welcome",              icon="🏠", default=True)
 App_page_eda    = st.Page("pages/eda.py",                title="About Our Data", icon="🔍")
@@ -9,15 +15,19 @@ App_page_trend  = st.Page("pages/trends.py",             title="Time-Series Tren
 App_page_reg    = st.Page("pages/model_choice_playground.py",  title="Regression Model Comparison",icon="📈")
 App_page_detail = st.Page("pages/details.py",            title="Features We Used",       icon="📝")
 App_page_predict = st.Page("pages/app.py",            title="Predict by Ticker",     icon="🎯")
+App_page_resid  = st.Page("pages/residuals.py",        title="Prediction Residuals",  icon="📉")
 
 pg = st.navigation({
     "Start":  [App_page_intro],
     "Explore Data":    [App_page_eda, App_page_ind, App_page_trend],
-    "Machine Learning Models":     [App_page_detail, App_page_reg, App_page_predict],
+    "Machine Learning Models":     [App_page_detail, App_page_reg, App_page_predict, App_page_resid],
 })
 
 with st.sidebar:
     st.header("Navigation")
     st.markdown("Use the **top bar** to switch pages. ")
     st.markdown("Data Source: **WRDS**")
-pg.run()
+
+# Named spans per page (see instrumentation.py); free unless enabled.
+with page_run(pg.title):
+    pg.run()
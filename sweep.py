@@ -0,0 +1,148 @@
+# sweep.py
+"""
+Successive-halving hyperparameter search for the Playground's boosting model.
+
+Many configurations are first scored on a small subsample of the training
+rows; after each rung only the best ``1 / factor`` are promoted and given
+``factor`` times more data, until the survivors train on everything.
+Subsamples are nested prefixes of one shuffle, so a promoted configuration
+sees a superset of its earlier rows. Every rung is scored on the same
+held-out rows.
+
+Fits are spread over one joblib process pool that lives for the whole
+sweep, and :func:`successive_halving` yields each result as soon as it
+arrives so the page can stream a leaderboard.
+"""
+import math
+import os
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from playground import BOOSTING, make_model
+
+PARAM_NAMES = ("max_iter", "learning_rate", "max_depth")
+
+
+def sample_configs(
+    n: int,
+    max_iter: tuple[int, int],
+    learning_rate: tuple[float, float],
+    max_depth: tuple[int, int],
+    seed: int = 0,
+) -> list[dict]:
+    """
+    Draw ``n`` distinct configurations from inclusive ranges.
+
+    ``max_iter`` is drawn in steps of 50 (like the page slider), the
+    learning rate log-uniformly, and depth uniformly.
+    """
+    rng = np.random.default_rng(seed)
+    iter_choices = np.arange(max_iter[0], max_iter[1] + 1, 50) if max_iter[1] > max_iter[0] else [max_iter[0]]
+    lo, hi = np.log(learning_rate[0]), np.log(learning_rate[1])
+    configs, seen = [], set()
+    for _ in range(20 * n):
+        cfg = {
+            "max_iter": int(rng.choice(iter_choices)),
+            "learning_rate": round(float(np.exp(rng.uniform(lo, hi))), 4),
+            "max_depth": int(rng.integers(max_depth[0], max_depth[1] + 1)),
+        }
+        key = tuple(cfg.values())
+        if key not in seen:
+            seen.add(key)
+            configs.append(cfg)
+        if len(configs) == n:
+            break
+    return configs
+
+
+def rung_sizes(n_configs: int, n_train: int, factor: int = 3, min_rows: int = 500) -> list[int]:
+    """
+    Training rows per rung, smallest first; the last rung uses all rows.
+
+    There are enough rungs to narrow ``n_configs`` down to about one, but
+    no rung trains on fewer than ``min_rows`` rows (or all rows, if fewer).
+    """
+    by_configs = math.ceil(math.log(max(n_configs, 1), factor))
+    by_rows = int(math.log(max(n_train / min_rows, 1), factor))
+    n_rungs = min(by_configs, by_rows) + 1
+    return [max(1, n_train // factor ** (n_rungs - 1 - r)) for r in range(n_rungs)]
+
+
+def _score(X_train, y_train, X_val, y_val, params: dict, rows: int) -> dict:
+    start = time.perf_counter()
+    model = make_model(BOOSTING, params)
+    model.fit(X_train[:rows], y_train[:rows])
+    pred = model.predict(X_val)
+    return {
+        **params,
+        "rows": rows,
+        "r2": float(r2_score(y_val, pred)),
+        "mae": float(mean_absolute_error(y_val, pred)),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def successive_halving(
+    X: pd.DataFrame,
+    y: pd.Series,
+    configs: list[dict],
+    factor: int = 3,
+    min_rows: int = 500,
+    holdout: float = 0.2,
+    n_jobs: int | None = None,
+    seed: int = 0,
+) -> Iterator[dict]:
+    """
+    Run the search and yield one result row per finished fit.
+
+    Each row holds the configuration, its ``rung`` and training ``rows``,
+    and held-out ``r2``/``mae``. Rows arrive in completion order; a rung
+    finishes before the next one starts. Configurations are ranked by R².
+
+    Parameters
+    ----------
+    factor : int
+        Survivors kept per rung (``1 / factor``) and the data growth per rung.
+    holdout : float
+        Fraction of rows set aside for scoring every rung.
+    n_jobs : int, optional
+        Worker processes; defaults to the core count.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(X))
+    n_val = max(1, int(len(X) * holdout))
+    val, train = order[:n_val], order[n_val:]
+    X_arr = X.to_numpy(dtype=np.float64)
+    y_arr = y.to_numpy(dtype=np.float64)
+    X_train, y_train = X_arr[train], y_arr[train]
+    X_val, y_val = X_arr[val], y_arr[val]
+
+    survivors = list(configs)
+    sizes = rung_sizes(len(survivors), len(train), factor, min_rows)
+    with Parallel(n_jobs=n_jobs or os.cpu_count() or 1, return_as="generator_unordered") as parallel:
+        for rung, rows in enumerate(sizes):
+            results = []
+            jobs = (delayed(_score)(X_train, y_train, X_val, y_val, cfg, rows) for cfg in survivors)
+            for result in parallel(jobs):
+                result["rung"] = rung
+                results.append(result)
+                yield result
+            if rung < len(sizes) - 1:
+                results.sort(key=lambda r: r["r2"], reverse=True)
+                keep = max(1, math.ceil(len(results) / factor))
+                survivors = [{k: r[k] for k in PARAM_NAMES} for r in results[:keep]]
+
+
+def leaderboard(results: list[dict]) -> pd.DataFrame:
+    """Best result per configuration, furthest rung first, then by R²."""
+    if not results:
+        return pd.DataFrame(columns=["rung", "rows", *PARAM_NAMES, "r2", "mae", "seconds"])
+    df = pd.DataFrame(results)
+    df = df.sort_values(["rung", "r2"], ascending=False)
+    df = df.drop_duplicates(list(PARAM_NAMES)).reset_index(drop=True)
+    return df[["rung", "rows", *PARAM_NAMES, "r2", "mae", "seconds"]]
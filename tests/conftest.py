@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app's modules live flat in the repository root.
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def market_data_dir() -> Path:
+    """Saved Yahoo frames laid out as ``<TICKER>/<endpoint>.csv``."""
+    return Path(__file__).parent / "data" / "market_data"
@@ -0,0 +1,72 @@
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_scoring
+from bench import CSV_NAME, synthetic_panel
+from model_registry import get_registry
+from train_models import MODEL_SPECS
+from utils import DIVISION_COL, ensure_sidecar
+
+
+@pytest.fixture
+def panel_with_null_keys(tmp_path):
+    """A small zipped panel where some firm-years lack a Division or ticker."""
+    df = synthetic_panel(n_firms=40, seed=1)
+    df.loc[[3, 50, 51], DIVISION_COL] = np.nan
+    df.loc[[7, 120], "ticker_ann"] = np.nan
+    df.loc[200:299, DIVISION_COL] = np.nan  # a whole block without Divisions
+    path = tmp_path / "esg_cleaned_final.csv.zip"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(CSV_NAME, "w") as fh:
+            df.to_csv(fh, index=False)
+    return path, df
+
+
+@pytest.mark.parametrize("sidecar", [False, True], ids=["csv", "sidecar"])
+def test_null_keys_score_end_to_end(panel_with_null_keys, tmp_path, sidecar):
+    zip_path, df = panel_with_null_keys
+    if sidecar:
+        assert ensure_sidecar(zip_path)
+    out_dir = tmp_path / "scores"
+    manifest = batch_scoring.score_panel(zip_path, out_dir, chunksize=100, jobs=1, log=lambda _: None)
+    assert manifest["complete"] and manifest["rows"] == len(df)
+
+    scored = batch_scoring.load_predictions(out_dir)
+    assert scored[batch_scoring.ROW_COL].tolist() == list(range(len(df)))
+    assert scored[DIVISION_COL].isna().tolist() == df[DIVISION_COL].isna().tolist()
+    assert scored["ticker_ann"].isna().tolist() == df["ticker_ann"].isna().tolist()
+
+    registry = get_registry()
+    for name, spec in MODEL_SPECS.items():
+        expected = registry.get(name).predict(df[spec["features"]].astype(np.float64))
+        np.testing.assert_allclose(scored[batch_scoring.pred_col(spec["target"])], expected, rtol=0, atol=1e-9)
+
+
+def test_division_filter_skips_null_divisions(panel_with_null_keys, tmp_path):
+    zip_path, df = panel_with_null_keys
+    out_dir = tmp_path / "scores"
+    batch_scoring.score_panel(zip_path, out_dir, chunksize=100, jobs=1, log=lambda _: None)
+    division = df[DIVISION_COL].dropna().iloc[0]
+    sub = batch_scoring.load_predictions(out_dir, columns=[DIVISION_COL], divisions=[division])
+    assert len(sub) == (df[DIVISION_COL] == division).sum()
+
+
+def test_resume_skips_written_blocks(panel_with_null_keys, tmp_path):
+    zip_path, df = panel_with_null_keys
+    out_dir = tmp_path / "scores"
+    batch_scoring.score_panel(zip_path, out_dir, chunksize=100, jobs=1, log=lambda _: None)
+    full = batch_scoring.load_predictions(out_dir)
+
+    # Simulate an interrupted run: one part missing, manifest not complete.
+    manifest = batch_scoring.read_manifest(out_dir)
+    batch_scoring._write_manifest(out_dir, {**manifest, "complete": False})
+    parts = sorted(out_dir.glob("part-*.parquet"))
+    parts[-1].unlink()
+    kept = {p: p.stat().st_mtime_ns for p in parts[:-1]}
+
+    batch_scoring.score_panel(zip_path, out_dir, chunksize=100, jobs=1, log=lambda _: None)
+    assert all(p.stat().st_mtime_ns == t for p, t in kept.items())
+    pd.testing.assert_frame_equal(batch_scoring.load_predictions(out_dir), full)
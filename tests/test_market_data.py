@@ -0,0 +1,157 @@
+import os
+
+import pandas as pd
+import pytest
+
+import market_data
+from market_data import ENDPOINTS, CachedMarketData, FileProvider, MarketDataError, firm_inputs
+
+
+class CountingProvider:
+    """Wraps a provider and counts the calls that reach it."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = []
+
+    def fetch(self, ticker, endpoint):
+        self.calls.append((ticker, endpoint))
+        return self.inner.fetch(ticker, endpoint)
+
+
+class FailingProvider:
+    def fetch(self, ticker, endpoint):
+        raise ConnectionError("offline")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable ``time.time`` as seen by market_data."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(market_data.time, "time", lambda: now[0])
+    return now
+
+
+def test_file_provider_reads_saved_frames(market_data_dir):
+    frame = FileProvider(market_data_dir).fetch("ACME", "balance_sheet")
+    assert list(frame.columns) == ["2024-09-30", "2023-09-30"]
+    assert frame.loc["Total Assets"].iloc[0] == 364980000000
+
+
+def test_file_provider_missing_file_is_empty(market_data_dir):
+    assert FileProvider(market_data_dir).fetch("NOESG", "sustainability").empty
+    assert FileProvider(market_data_dir).fetch("NOPE", "financials").empty
+
+
+def test_get_caches_in_memory(market_data_dir):
+    provider = CountingProvider(FileProvider(market_data_dir))
+    md = CachedMarketData(provider, cache_dir=None)
+    first = md.get("acme", "financials")
+    assert md.get("ACME", "financials") is first
+    assert provider.calls == [("ACME", "financials")]
+
+
+def test_disk_tier_survives_a_new_instance(market_data_dir, tmp_path):
+    CachedMarketData(FileProvider(market_data_dir), cache_dir=tmp_path).get("ACME", "cashflow")
+    assert [p.name for p in tmp_path.glob("*.pkl")] == ["ACME__cashflow.pkl"]
+
+    provider = CountingProvider(FileProvider(market_data_dir))
+    frame = CachedMarketData(provider, cache_dir=tmp_path).get("ACME", "cashflow")
+    assert provider.calls == []
+    assert frame.loc["Operating Cash Flow"].iloc[0] == 118254000000
+
+
+def test_memory_entries_expire_after_ttl(market_data_dir, clock):
+    provider = CountingProvider(FileProvider(market_data_dir))
+    md = CachedMarketData(provider, ttl=60, cache_dir=None)
+    md.get("ACME", "financials")
+    clock[0] += 59
+    md.get("ACME", "financials")
+    assert len(provider.calls) == 1
+    clock[0] += 2
+    md.get("ACME", "financials")
+    assert len(provider.calls) == 2
+
+
+def test_disk_entries_expire_after_ttl(market_data_dir, tmp_path, clock):
+    CachedMarketData(FileProvider(market_data_dir), ttl=60, cache_dir=tmp_path).get("ACME", "financials")
+    path = tmp_path / "ACME__financials.pkl"
+    os.utime(path, (clock[0] - 61, clock[0] - 61))
+
+    provider = CountingProvider(FileProvider(market_data_dir))
+    CachedMarketData(provider, ttl=60, cache_dir=tmp_path).get("ACME", "financials")
+    assert provider.calls == [("ACME", "financials")]
+
+
+def test_memory_tier_is_lru_bounded(market_data_dir):
+    provider = CountingProvider(FileProvider(market_data_dir))
+    md = CachedMarketData(provider, max_entries=2, cache_dir=None)
+    md.get("ACME", "financials")
+    md.get("ACME", "cashflow")
+    md.get("ACME", "financials")  # now the most recently used
+    md.get("ACME", "balance_sheet")  # evicts cashflow
+    provider.calls.clear()
+
+    md.get("ACME", "financials")
+    md.get("ACME", "balance_sheet")
+    assert provider.calls == []
+    md.get("ACME", "cashflow")
+    assert provider.calls == [("ACME", "cashflow")]
+
+
+def test_prune_disk_keeps_the_newest_files(market_data_dir, tmp_path):
+    md = CachedMarketData(FileProvider(market_data_dir), cache_dir=tmp_path, max_disk_entries=2)
+    for age, endpoint in zip((30, 20, 10), ("financials", "cashflow", "balance_sheet")):
+        md.get("ACME", endpoint)
+        mtime = os.path.getmtime(tmp_path / f"ACME__{endpoint}.pkl") - age
+        os.utime(tmp_path / f"ACME__{endpoint}.pkl", (mtime, mtime))
+    md.get("ACME", "sustainability")
+
+    assert sorted(p.name for p in tmp_path.glob("*.pkl")) == [
+        "ACME__balance_sheet.pkl", "ACME__sustainability.pkl",
+    ]
+
+
+def test_failures_are_raised_and_not_cached(tmp_path):
+    md = CachedMarketData(FailingProvider(), cache_dir=tmp_path)
+    with pytest.raises(MarketDataError, match="offline"):
+        md.get("ACME", "financials")
+    assert not list(tmp_path.glob("*.pkl"))
+    with pytest.raises(ValueError):
+        md.get("ACME", "income")
+
+
+def test_fetch_all_and_firm_inputs_offline(market_data_dir):
+    md = CachedMarketData(FileProvider(market_data_dir), cache_dir=None)
+    result = md.fetch_all("ACME")
+    assert result.ok and set(result.frames) == set(ENDPOINTS)
+
+    inputs = firm_inputs(result.frames)
+    assert inputs["env_risk"] == 2.5
+    assert inputs["revenue"] == 391035000000
+    assert inputs["capex"] == -9447000000
+
+
+def test_fetch_all_reports_failures_per_endpoint():
+    result = CachedMarketData(FailingProvider(), cache_dir=None).fetch_all("ACME")
+    assert not result.ok and set(result.errors) == set(ENDPOINTS)
+
+
+def test_firm_inputs_without_esg_data(market_data_dir):
+    frames = CachedMarketData(FileProvider(market_data_dir), cache_dir=None).fetch_all("NOESG").frames
+    with pytest.raises(MarketDataError, match="No ESG data"):
+        firm_inputs(frames)
+
+
+def test_firm_inputs_statement_without_periods(market_data_dir):
+    frames = CachedMarketData(FileProvider(market_data_dir), cache_dir=None).fetch_all("ACME").frames
+    frames["financials"] = pd.DataFrame(index=["Total Revenue", "Net Income"])
+    with pytest.raises(MarketDataError, match="No reported periods"):
+        firm_inputs(frames)
+
+
+def test_fetch_many_yields_every_ticker(market_data_dir):
+    md = CachedMarketData(FileProvider(market_data_dir), cache_dir=None)
+    results = {r.ticker: r for r in md.fetch_many(["ACME", "NOESG"], max_workers=2)}
+    assert set(results) == {"ACME", "NOESG"}
+    assert results["NOESG"].frames["sustainability"].empty
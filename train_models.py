@@ -0,0 +1,217 @@
+# train_models.py
+"""
+Train the EBITDA and Operating Margin models the app serves.
+
+Replaces the two notebook scripts that used to live as strings in
+``pages/details.py``. Both models are built in one pass:
+
+* the dataset is read once, for the union of both feature sets and
+  targets, and turned into a single float matrix whose missing-value mask
+  is shared by the models' row filters;
+* the two fits run concurrently (HistGradientBoosting fits are OpenMP
+  code that releases the GIL), then each model's permutation importance
+  fans out over worker processes;
+* every artifact is written to a temporary file and moved into place with
+  ``os.replace``, so the memory-mapped copies held by a running app
+  (:mod:`model_registry`) never see a half-written pickle.
+
+A JSON manifest with timings, train/test metrics, importances and the
+artifacts' SHA-256 hashes is written next to the pickles::
+
+    python train_models.py --data esg_cleaned_final.csv.zip --out-dir pages
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.inspection import permutation_importance
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+
+from model_registry import MANIFEST_FILE, MODEL_FILES, ROOT
+from scenarios import EBITDA_FEATURES, OPERATING_FEATURES
+from utils import dataset_version, file_digest, load_esg_zip
+
+MODEL_SPECS = {
+    "ebitda": {"target": "EBITDA_Margin", "features": EBITDA_FEATURES, "perm_repeats": 10},
+    "operating": {"target": "Operating_Margin", "features": OPERATING_FEATURES, "perm_repeats": 20},
+}
+GB_PARAMS = {"max_iter": 200, "max_depth": 5, "learning_rate": 0.05, "random_state": 42}
+TEST_SIZE = 0.2
+SEED = 42
+DEFAULT_OUT_DIR = ROOT / "pages"
+
+
+def make_pipeline() -> Pipeline:
+    """Median imputer + HistGradientBoosting, as served by the app."""
+    return Pipeline([
+        ("imputer", SimpleImputer(strategy="median")),
+        ("gb", HistGradientBoostingRegressor(**GB_PARAMS)),
+    ])
+
+
+def load_training_data(zip_path: str | Path, specs: dict = MODEL_SPECS) -> pd.DataFrame:
+    """Read every column any model needs, once, as float64."""
+    columns = []
+    for spec in specs.values():
+        for col in [*spec["features"], spec["target"]]:
+            if col not in columns:
+                columns.append(col)
+    return load_esg_zip(zip_path, columns=columns).astype(np.float64)
+
+
+def model_rows(data: pd.DataFrame, complete: pd.DataFrame, spec: dict) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    One model's complete rows, in original order with a fresh index.
+
+    ``complete`` is ``data.notna()``, computed once for all models.
+    """
+    cols = [*spec["features"], spec["target"]]
+    keep = complete[cols].all(axis=1).to_numpy()
+    rows = data.loc[keep, cols].reset_index(drop=True)
+    return rows[spec["features"]], rows[spec["target"]]
+
+
+def _scores(model, X, y) -> dict:
+    pred = model.predict(X)
+    return {
+        "r2": float(r2_score(y, pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y, pred))),
+        "mae": float(mean_absolute_error(y, pred)),
+    }
+
+
+def fit_one(name: str, X: pd.DataFrame, y: pd.Series, spec: dict, n_jobs: int) -> dict:
+    """Fit, score and explain one model; returns the model plus its manifest entry."""
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=SEED)
+    start = time.perf_counter()
+    model = make_pipeline().fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    perm = permutation_importance(
+        model, X_test, y_test, n_repeats=spec["perm_repeats"], random_state=SEED, n_jobs=n_jobs
+    )
+    importance_seconds = time.perf_counter() - start
+    importance = pd.DataFrame({
+        "feature": spec["features"],
+        "importance": perm.importances_mean,
+        "std": perm.importances_std,
+    }).sort_values("importance", ascending=False)
+
+    return {
+        "model": model,
+        "entry": {
+            "file": MODEL_FILES[name],
+            "target": spec["target"],
+            "features": list(spec["features"]),
+            "params": dict(GB_PARAMS),
+            "rows": {"train": len(X_train), "test": len(X_test)},
+            "metrics": {"train": _scores(model, X_train, y_train), "test": _scores(model, X_test, y_test)},
+            "permutation_importance": importance.to_dict("records"),
+            "fit_seconds": fit_seconds,
+            "importance_seconds": importance_seconds,
+        },
+    }
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def train_all(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    out_dir: str | Path = DEFAULT_OUT_DIR,
+    specs: dict = MODEL_SPECS,
+    n_jobs: int | None = None,
+) -> dict:
+    """
+    Train every model in ``specs`` and write artifacts plus manifest.
+
+    Parameters
+    ----------
+    n_jobs : int, optional
+        Worker processes for permutation importance, split between the
+        models; defaults to the core count.
+
+    Returns
+    -------
+    dict
+        The manifest that was written.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    total_start = time.perf_counter()
+
+    start = time.perf_counter()
+    data = load_training_data(zip_path, specs)
+    complete = data.notna()
+    load_seconds = time.perf_counter() - start
+
+    cores = n_jobs or os.cpu_count() or 1
+    per_model = max(1, cores // len(specs))
+    with ThreadPoolExecutor(max_workers=len(specs)) as pool:
+        futures = {
+            name: pool.submit(fit_one, name, *model_rows(data, complete, spec), spec, per_model)
+            for name, spec in specs.items()
+        }
+        trained = {name: f.result() for name, f in futures.items()}
+
+    models = {}
+    for name, out in trained.items():
+        entry = out["entry"]
+        path = out_dir / entry["file"]
+        # Uncompressed, so the registry can memory-map the tree arrays.
+        _atomic_write(path, lambda tmp, m=out["model"]: joblib.dump(m, tmp))
+        stat = path.stat()
+        entry.update(sha256=file_digest(path), size=stat.st_size)
+        models[name] = entry
+
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "dataset_sha256": dataset_version(zip_path),
+        "sklearn_version": sklearn.__version__,
+        "load_seconds": load_seconds,
+        "total_seconds": time.perf_counter() - total_start,
+        "models": models,
+    }
+    _atomic_write(out_dir / MANIFEST_FILE, lambda tmp: tmp.write_text(json.dumps(manifest, indent=2)))
+    return manifest
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", default="esg_cleaned_final.csv.zip", help="zipped ESG panel")
+    parser.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="where the .pkl files go")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    manifest = train_all(args.data, args.out_dir, n_jobs=args.jobs)
+    for name, entry in manifest["models"].items():
+        test = entry["metrics"]["test"]
+        print(
+            f"{name:10s} R²={test['r2']:.3f} RMSE={test['rmse']:.3f} MAE={test['mae']:.3f} "
+            f"fit {entry['fit_seconds']:.1f}s, importance {entry['importance_seconds']:.1f}s "
+            f"-> {entry['file']} ({entry['sha256'][:10]})"
+        )
+    print(f"total {manifest['total_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
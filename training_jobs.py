@@ -0,0 +1,209 @@
+# training_jobs.py
+"""
+Background training for the Model Playground.
+
+Fits run in a small process pool so the Streamlit script thread never
+blocks. Each job gets a scratch directory where the worker writes
+per-iteration progress (see :func:`playground.train_with_progress`); the
+page polls it. A page "slot" (one per browser session) has at most one
+live job: submitting a new configuration cancels the superseded one,
+unless another session is still waiting on it. Finished fits go straight
+into the shared :class:`fit_cache.FitCache`.
+"""
+import json
+import multiprocessing as mp
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from fit_cache import FitCache, get_fit_cache
+from playground import train_with_progress
+
+JOBS_ROOT = Path(tempfile.gettempdir()) / "esg-playground-jobs"
+
+# Finished jobs are forgotten after this many seconds.
+_KEEP_FINISHED = 600
+
+
+@dataclass
+class Job:
+    job_id: str
+    key: str
+    future: Future
+    job_dir: Path
+    slots: set[str] = field(default_factory=set)
+    submitted_at: float = field(default_factory=time.time)
+    stored: bool = False
+
+
+@dataclass
+class JobStatus:
+    """Snapshot of a job for the page to render."""
+
+    state: str  # "queued", "running", "done", "cancelled" or "failed"
+    max_iter: int | None = None
+    history: list[dict] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "cancelled", "failed")
+
+
+class TrainingJobs:
+    """
+    Process-pool job manager with progress and cancellation.
+
+    Parameters
+    ----------
+    cache : FitCache
+        Where finished results are stored, under the job's fit key.
+    max_workers : int
+        Concurrent fits across all sessions.
+    """
+
+    def __init__(self, cache: FitCache, max_workers: int = 2, root: Path = JOBS_ROOT):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.root = Path(root)
+        self._pool: ProcessPoolExecutor | None = None
+        self._jobs: dict[str, Job] = {}
+        self._by_key: dict[str, str] = {}
+        self._by_slot: dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn" keeps workers clear of the server's threads and locks.
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    def submit(
+        self,
+        slot: str,
+        key: str,
+        X: pd.DataFrame,
+        y: pd.Series,
+        model_type: str,
+        params: dict,
+    ) -> str:
+        """
+        Start (or join) the fit for ``key`` on behalf of ``slot``.
+
+        Any other job ``slot`` was waiting on is released and cancelled if
+        nobody else needs it. Returns the job id to poll.
+        """
+        with self._lock:
+            self._forget_finished()
+            previous = self._by_slot.get(slot)
+            if previous is not None and self._jobs[previous].key != key:
+                self._release(slot, previous)
+
+            job_id = self._by_key.get(key)
+            if job_id is None or self._jobs[job_id].future.done():
+                job_id = uuid.uuid4().hex
+                job_dir = self.root / job_id
+                job_dir.mkdir(parents=True, exist_ok=True)
+                args = (str(job_dir), X, y, model_type, params)
+                try:
+                    future = self._executor().submit(train_with_progress, *args)
+                except BrokenProcessPool:
+                    self._pool = None
+                    future = self._executor().submit(train_with_progress, *args)
+                job = Job(job_id, key, future, job_dir)
+                self._jobs[job_id] = job
+                self._by_key[key] = job_id
+                future.add_done_callback(lambda f, j=job: self._store(j))
+
+            self._jobs[job_id].slots.add(slot)
+            self._by_slot[slot] = job_id
+            return job_id
+
+    def _store(self, job: Job) -> None:
+        # Runs from the done-callback and from status(), whichever is first,
+        # so a page that sees "done" always finds the result in the cache.
+        with self._lock:
+            if job.stored or job.future.cancelled() or job.future.exception() is not None:
+                return
+            result = job.future.result()
+            if result is not None:
+                self.cache.put(job.key, result)
+            job.stored = True
+
+    def _release(self, slot: str, job_id: str) -> None:
+        job = self._jobs[job_id]
+        job.slots.discard(slot)
+        if self._by_slot.get(slot) == job_id:
+            del self._by_slot[slot]
+        if not job.slots and not job.future.done():
+            self._cancel(job)
+
+    def _cancel(self, job: Job) -> None:
+        if not job.future.cancel():  # already running: ask the worker to stop
+            (job.job_dir / "cancel").touch()
+        if self._by_key.get(job.key) == job.job_id:
+            del self._by_key[job.key]
+
+    def cancel(self, slot: str) -> None:
+        """Stop waiting on ``slot``'s current job (cancelling it if unshared)."""
+        with self._lock:
+            job_id = self._by_slot.get(slot)
+            if job_id is not None:
+                self._release(slot, job_id)
+
+    def _forget_finished(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.future.done() and now - job.submitted_at > _KEEP_FINISHED:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) == job_id:
+                    del self._by_key[job.key]
+                shutil.rmtree(job.job_dir, ignore_errors=True)
+
+    def status(self, job_id: str) -> JobStatus:
+        """Current state plus the worker's per-iteration history."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return JobStatus(state="cancelled")
+        progress = {}
+        try:
+            progress = json.loads((job.job_dir / "progress.json").read_text())
+        except (OSError, ValueError):
+            pass
+        status = JobStatus(
+            state="running" if job.future.running() else "queued",
+            max_iter=progress.get("max_iter"),
+            history=progress.get("history", []),
+        )
+        if job.future.cancelled():
+            status.state = "cancelled"
+        elif job.future.done():
+            if job.future.exception() is not None:
+                status.state, status.error = "failed", str(job.future.exception())
+            elif job.future.result() is None:
+                status.state = "cancelled"
+            else:
+                self._store(job)
+                status.state = "done"
+        return status
+
+
+_jobs: TrainingJobs | None = None
+_jobs_lock = threading.Lock()
+
+
+def get_training_jobs() -> TrainingJobs:
+    """The job manager shared by every session in this process."""
+    global _jobs
+    with _jobs_lock:
+        if _jobs is None:
+            _jobs = TrainingJobs(get_fit_cache())
+        return _jobs
@@ -0,0 +1,312 @@
+# tree_engine.py
+"""
+Flat-array inference for the HistGradientBoosting margin models.
+
+:func:`compile_pipeline` exports a fitted ``SimpleImputer`` +
+``HistGradientBoostingRegressor`` pipeline into a handful of NumPy arrays
+(one row per node across all trees). :meth:`FlatForest.predict` then
+walks every tree for the whole batch at once: each step advances all
+(row, tree) cursors one level, so a batch costs ``max_depth`` vectorised
+gathers instead of sklearn's per-call validation and thread start-up.
+Large batches are split into cache-sized chunks spread over threads
+(NumPy releases the GIL inside ``take``), and each chunk is reduced to
+its predictions before the next, so memory stays bounded however many
+rows are scored.
+
+:meth:`FlatForest.contributions` splits each prediction into per-feature
+parts by exact leaf-path decomposition (Saabas): every split on the way
+to a leaf moves the tree's expected value from the parent's to the
+child's, and that move is credited to the split feature. Because the
+credit depends only on the leaf reached, each leaf's path vector is
+precomputed at compile time and a batch costs one walk plus one sparse
+product.
+
+Run ``python tree_engine.py`` to check both models against sklearn and
+print the speedup for 1, 100 and 100k rows.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# (rows × trees) cursors per chunk; small enough to stay in cache.
+_CHUNK_CELLS = 1 << 16
+
+
+@dataclass(frozen=True)
+class FlatForest:
+    """
+    A compiled boosting model.
+
+    Leaves point to themselves, so extra steps past a leaf are no-ops and
+    every cursor can advance for exactly ``max_depth`` steps. ``children``
+    is flattened as ``[left0, right0, left1, right1, ...]`` so one step is
+    ``children[2 * node + went_right]``.
+    """
+
+    feature_names: np.ndarray   # (n_features,) str
+    medians: np.ndarray         # (n_features,) imputer fill values, NaN if none
+    baseline: float
+    roots: np.ndarray           # (n_trees,) intp node index of each tree's root
+    feature: np.ndarray         # (n_nodes,) intp, 0 for leaves
+    threshold: np.ndarray       # (n_nodes,) float64
+    missing_left: np.ndarray    # (n_nodes,) bool
+    children: np.ndarray        # (2 * n_nodes,) intp global index; self for leaves
+    value: np.ndarray           # (n_nodes,) float64 node values (shrinkage applied)
+    is_leaf: np.ndarray         # (n_nodes,) bool
+    max_depth: int
+    path_contrib: np.ndarray    # (n_nodes, n_features) root-to-node credit per feature
+    expected_value: float       # baseline + cover-weighted mean of every tree
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def _matrix(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names)]
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(
+                f"Expected {len(self.feature_names)} features, got shape {X.shape}."
+            )
+        if np.isinf(X).any():
+            # sklearn's input validation rejects these too; NaN is allowed.
+            raise ValueError("Input X contains infinity.")
+        fill = ~np.isnan(self.medians)
+        if fill.any():
+            missing = np.isnan(X) & fill
+            if missing.any():
+                X = np.where(missing, self.medians, X)
+        return X
+
+    def _walk(self, X: np.ndarray) -> np.ndarray:
+        n, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = (np.arange(n, dtype=np.intp) * n_features)[:, None]
+        has_nan = np.isnan(flat_X).any()
+        node = np.tile(self.roots, (n, 1))
+        for _ in range(self.max_depth):
+            x = flat_X.take(row_base + self.feature.take(node))
+            went_right = x > self.threshold.take(node)
+            if has_nan:
+                went_right = np.where(np.isnan(x), ~self.missing_left.take(node), went_right)
+            node = self.children.take(2 * node + went_right)
+        return node
+
+    def _chunked(self, X: np.ndarray, fn) -> list:
+        # ``fn`` reduces one chunk of rows; chunks run on threads.
+        step = max(1, _CHUNK_CELLS // self.n_trees)
+        if len(X) <= step:
+            return [fn(X)]
+        chunks = [X[lo:lo + step] for lo in range(0, len(X), step)]
+        workers = min(os.cpu_count() or 1, len(chunks))
+        if workers == 1:
+            return [fn(c) for c in chunks]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, chunks))
+
+    def leaf_indices(self, X) -> np.ndarray:
+        """Global leaf index reached by each (row, tree): shape (n_rows, n_trees)."""
+        return np.concatenate(self._chunked(self._matrix(X), self._walk))
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        return self.value.take(self._walk(X)).sum(axis=1) + self.baseline
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Same output as the source pipeline's ``predict``.
+
+        Raises
+        ------
+        ValueError
+            For a wrong number of features or infinite inputs, as sklearn does.
+        """
+        return np.concatenate(self._chunked(self._matrix(X), self._predict_chunk))
+
+    def _explain_chunk(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        leaves = self._walk(X)
+        n, n_trees = leaves.shape
+        hits = sparse.csr_matrix(
+            (np.ones(leaves.size), leaves.ravel(), np.arange(0, leaves.size + 1, n_trees)),
+            shape=(n, len(self.value)),
+        )
+        pred = self.value.take(leaves).sum(axis=1) + self.baseline
+        return pred, np.asarray(hits @ self.path_contrib)
+
+    def explain(self, X) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predictions and per-feature contributions from a single walk.
+
+        Returns ``(prediction, contributions)`` with shapes (n_rows,) and
+        (n_rows, n_features). Each contribution row plus
+        :attr:`expected_value` sums to the prediction. Missing inputs are
+        credited after median imputation.
+        """
+        parts = self._chunked(self._matrix(X), self._explain_chunk)
+        return np.concatenate([p for p, _ in parts]), np.concatenate([c for _, c in parts])
+
+    def contributions(self, X) -> np.ndarray:
+        """Per-feature contributions only; see :meth:`explain`."""
+        return self.explain(X)[1]
+
+    def save(self, path: str | Path) -> None:
+        """Write the arrays to an uncompressed ``.npz`` file."""
+        np.savez(path, **{f.name: np.asarray(getattr(self, f.name)) for f in fields(self)})
+
+    @classmethod
+    def load(cls, path: str | Path) -> "FlatForest":
+        with np.load(path, allow_pickle=False) as z:
+            kw = {f.name: z[f.name] for f in fields(cls)}
+        kw["baseline"] = float(kw["baseline"])
+        kw["max_depth"] = int(kw["max_depth"])
+        kw["expected_value"] = float(kw["expected_value"])
+        return cls(**kw)
+
+
+def compile_pipeline(model) -> FlatForest:
+    """
+    Export a fitted HGB regressor (optionally behind a median imputer).
+
+    Parameters
+    ----------
+    model : Pipeline or HistGradientBoostingRegressor
+        A pipeline's only supported steps are a ``SimpleImputer`` followed
+        by the regressor.
+
+    Raises
+    ------
+    ValueError
+        For categorical splits, non-identity links (e.g. Poisson loss),
+        multi-output models or unsupported pipeline steps.
+    """
+    steps = list(model.named_steps.values()) if hasattr(model, "named_steps") else [model]
+    gb = steps[-1]
+    medians = None
+    for step in steps[:-1]:
+        if type(step).__name__ != "SimpleImputer" or step.strategy not in ("median", "mean"):
+            raise ValueError(f"Unsupported pipeline step: {step!r}")
+        medians = np.asarray(step.statistics_, dtype=np.float64)
+
+    if not hasattr(gb, "_predictors"):
+        raise ValueError(f"Not a fitted HistGradientBoosting model: {gb!r}")
+    if type(gb._loss.link).__name__ != "IdentityLink" or gb.n_trees_per_iteration_ != 1:
+        raise ValueError("Only single-output regressors with an identity link are supported.")
+
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        names = np.array([f"x{i}" for i in range(gb.n_features_in_)])
+    if medians is None:
+        medians = np.full(len(names), np.nan)
+
+    nodes = [preds[0].nodes for preds in gb._predictors]
+    if any(n["is_categorical"].any() for n in nodes):
+        raise ValueError("Categorical splits are not supported.")
+    thr_field = "num_threshold" if "num_threshold" in nodes[0].dtype.names else "threshold"
+
+    sizes = np.array([len(n) for n in nodes])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp)
+    all_nodes = np.concatenate(nodes)
+    tree_of = np.repeat(offsets, sizes)
+    is_leaf = all_nodes["is_leaf"].astype(bool)
+    self_idx = np.arange(len(all_nodes), dtype=np.intp)
+    left = np.where(is_leaf, self_idx, all_nodes["left"] + tree_of)
+    right = np.where(is_leaf, self_idx, all_nodes["right"] + tree_of)
+    feature = np.where(is_leaf, 0, all_nodes["feature_idx"]).astype(np.intp)
+    value = all_nodes["value"].astype(np.float64)
+    expected, path_contrib = _path_contributions(
+        is_leaf, left, right, feature, value,
+        all_nodes["count"].astype(np.float64), all_nodes["depth"], len(names),
+    )
+    baseline = float(np.ravel(gb._baseline_prediction)[0])
+
+    return FlatForest(
+        feature_names=np.asarray(names, dtype=str),
+        medians=medians,
+        baseline=baseline,
+        roots=offsets,
+        feature=feature,
+        threshold=all_nodes[thr_field].astype(np.float64),
+        missing_left=all_nodes["missing_go_to_left"].astype(bool),
+        children=np.stack([left, right], axis=1).ravel().astype(np.intp),
+        value=value,
+        is_leaf=is_leaf,
+        max_depth=int(all_nodes["depth"].max()),
+        path_contrib=path_contrib,
+        expected_value=baseline + float(expected[offsets].sum()),
+    )
+
+
+def _path_contributions(is_leaf, left, right, feature, value, count, depth, n_features):
+    """
+    Expected value of every node and its root-to-node credit per feature.
+
+    HGB stores unshrunk internal values, so expectations are rebuilt
+    bottom-up as the cover-weighted mean of the (shrunk) leaf values.
+    """
+    expected = np.where(is_leaf, value, 0.0)
+    internal = np.flatnonzero(~is_leaf)
+    for d in range(int(depth.max()) - 1, -1, -1):
+        nodes = internal[depth[internal] == d]
+        l, r = left[nodes], right[nodes]
+        cover = count[l] + count[r]
+        expected[nodes] = (expected[l] * count[l] + expected[r] * count[r]) / np.maximum(cover, 1)
+
+    contrib = np.zeros((len(value), n_features))
+    for d in range(int(depth.max())):
+        parents = internal[depth[internal] == d]
+        for kids in (left[parents], right[parents]):
+            contrib[kids] = contrib[parents]
+            contrib[kids, feature[parents]] += expected[kids] - expected[parents]
+    return expected, contrib
+
+
+def benchmark(model, sizes=(1, 100, 100_000), repeats: int = 5, seed: int = 0) -> pd.DataFrame:
+    """
+    Time sklearn ``predict`` against :class:`FlatForest` on random rows.
+
+    Rows are drawn around the imputer medians (with some NaNs) so they
+    exercise real split paths. Reports the best of ``repeats`` runs.
+    """
+    flat = compile_pipeline(model)
+    rng = np.random.default_rng(seed)
+    center = np.nan_to_num(flat.medians, nan=0.0)
+    spread = np.maximum(np.abs(center), 1.0)
+    rows = []
+    for n in sizes:
+        X = center + spread * rng.standard_normal((n, len(center)))
+        X[rng.random(X.shape) < 0.02] = np.nan
+        frame = pd.DataFrame(X, columns=flat.feature_names)
+
+        def best(fn):
+            times = []
+            for _ in range(repeats if n < 10_000 else 2):
+                t = time.perf_counter()
+                out = fn()
+                times.append(time.perf_counter() - t)
+            return min(times), out
+
+        t_sk, y_sk = best(lambda: model.predict(frame))
+        t_flat, y_flat = best(lambda: flat.predict(frame))
+        rows.append({
+            "rows": n,
+            "sklearn_ms": t_sk * 1e3,
+            "flat_ms": t_flat * 1e3,
+            "speedup": t_sk / t_flat,
+            "max_abs_diff": float(np.max(np.abs(y_sk - y_flat))),
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    from model_registry import get_registry
+
+    registry = get_registry()
+    for name in registry.files:
+        print(f"\n== {name} ==")
+        print(benchmark(registry.get(name)).to_string(index=False, float_format="%.4g"))
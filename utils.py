@@ -1,41 +1,484 @@
 # utils.py
-import pandas as pd
+import hashlib
+import json
+import os
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+SIDECAR_VERSION = 1
+_SIDECAR_META_KEY = b"esg_sidecar"
+
+YEAR_COL = "year"
+DIVISION_COL = "Division"
+
+_digest_memo: dict[tuple, str] = {}
+
+
+def file_digest(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def dataset_version(zip_path: str | Path = "esg_cleaned_final.csv.zip") -> str:
+    """
+    Content hash of the dataset zip, memoised on (path, size, mtime).
+
+    Cheap to call on every rerun; the file is only re-hashed after it changes.
+    """
+    zip_path = Path(zip_path).resolve()
+    stat = zip_path.stat()
+    key = (str(zip_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digest_memo:
+        _digest_memo[key] = file_digest(zip_path)
+    return _digest_memo[key]
+
+
+def sidecar_path(zip_path: str | Path, csv_name: str = "esg_cleaned_final.csv") -> Path:
+    """Location of the columnar (Arrow/Feather) sidecar for a zipped CSV."""
+    zip_path = Path(zip_path)
+    return zip_path.with_name(f"{Path(csv_name).stem}.arrow")
+
+
+def _zip_key(zip_path: Path, csv_name: str, digest: str | None = None) -> dict:
+    stat = zip_path.stat()
+    return {
+        "version": SIDECAR_VERSION,
+        "csv_name": csv_name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest if digest is not None else dataset_version(zip_path),
+    }
+
+
+def _read_sidecar(zip_path: Path, csv_name: str) -> pa.Table | None:
+    """
+    Memory-map the sidecar if it still describes ``zip_path``.
+
+    The sidecar is trusted when size and mtime match. If only the mtime
+    moved (e.g. a fresh checkout), the content hash decides; a matching
+    hash refreshes the stored key so later loads skip hashing again.
+    Returns ``None`` when the sidecar is missing, unreadable or stale.
+    """
+    path = sidecar_path(zip_path, csv_name)
+    if not path.exists():
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+        meta = json.loads((table.schema.metadata or {})[_SIDECAR_META_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        return None
+
+    stat = zip_path.stat()
+    if meta.get("version") != SIDECAR_VERSION or meta.get("csv_name") != csv_name:
+        return None
+    if meta.get("size") != stat.st_size:
+        return None
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return table
+
+    digest = file_digest(zip_path)
+    if meta.get("sha256") != digest:
+        return None
+    _write_sidecar(table, zip_path, csv_name, digest=digest)
+    return table
+
+
+def _write_sidecar(
+    data: pd.DataFrame | pa.Table,
+    zip_path: Path,
+    csv_name: str,
+    digest: str | None = None,
+) -> None:
+    """Write the sidecar atomically; failures leave the CSV path in charge."""
+    path = sidecar_path(zip_path, csv_name)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        table = (
+            data if isinstance(data, pa.Table)
+            else pa.Table.from_pandas(data, preserve_index=False)
+        )
+        meta = dict(table.schema.metadata or {})
+        meta[_SIDECAR_META_KEY] = json.dumps(_zip_key(zip_path, csv_name, digest)).encode()
+        # Uncompressed so later loads can memory-map it instead of decoding.
+        feather.write_feather(table.replace_schema_metadata(meta), tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    except (OSError, pa.ArrowException):
+        tmp.unlink(missing_ok=True)
+
+
+@contextmanager
+def _open_csv(zip_path: Path, csv_name: str):
+    """Yield a binary file object for ``csv_name`` inside ``zip_path``."""
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            if csv_name not in zip_ref.namelist():
+                raise FileNotFoundError(
+                    f"CSV file '{csv_name}' not found inside '{zip_path.name}'. "
+                    f"Files available: {zip_ref.namelist()}"
+                )
+
+            with zip_ref.open(csv_name) as csv_file:
+                yield csv_file
+
+    except zipfile.BadZipFile as e:
+        raise zipfile.BadZipFile(f"Invalid zip file '{zip_path}'.") from e
+
+
+def _read_csv_from_zip(zip_path: Path, csv_name: str) -> pd.DataFrame:
+    with _open_csv(zip_path, csv_name) as csv_file:
+        return pd.read_csv(csv_file)
+
+
+def _needed_columns(
+    available: list[str],
+    columns: list[str] | None,
+    years: tuple[int, int] | None,
+    divisions: list[str] | None,
+) -> tuple[list[str], list[str]]:
+    """Return (columns to return, columns to read) and validate both."""
+    wanted = list(dict.fromkeys(columns)) if columns is not None else list(available)
+    needed = list(wanted)
+    if years is not None and YEAR_COL not in needed:
+        needed.append(YEAR_COL)
+    if divisions is not None and DIVISION_COL not in needed:
+        needed.append(DIVISION_COL)
+    missing = [c for c in needed if c not in available]
+    if missing:
+        raise KeyError(f"Columns not found in dataset: {missing}")
+    return wanted, needed
+
+
+def _slice_table(
+    table: pa.Table,
+    columns: list[str] | None,
+    years: tuple[int, int] | None,
+    divisions: list[str] | None,
+) -> pa.Table:
+    wanted, needed = _needed_columns(table.column_names, columns, years, divisions)
+    # Selecting columns of a memory-mapped table is zero-copy; only the
+    # rows that survive the filter are materialised.
+    table = table.select(needed)
+    mask = None
+    if years is not None:
+        lo, hi = years
+        year = table[YEAR_COL]
+        mask = pc.and_(pc.greater_equal(year, lo), pc.less_equal(year, hi))
+    if divisions is not None:
+        in_div = pc.is_in(table[DIVISION_COL], value_set=pa.array(list(divisions), pa.string()))
+        mask = in_div if mask is None else pc.and_(mask, in_div)
+    if mask is not None:
+        table = table.filter(mask)
+    return table.select(wanted)
+
+
+def _read_csv_slice(
+    zip_path: Path,
+    csv_name: str,
+    columns: list[str] | None,
+    years: tuple[int, int] | None,
+    divisions: list[str] | None,
+    chunksize: int,
+) -> pd.DataFrame:
+    """Stream the CSV out of the zip, keeping only the requested slice."""
+    with _open_csv(zip_path, csv_name) as csv_file:
+        header = pd.read_csv(csv_file, nrows=0).columns.tolist()
+    wanted, needed = _needed_columns(header, columns, years, divisions)
+
+    parts = []
+    with _open_csv(zip_path, csv_name) as csv_file:
+        for chunk in pd.read_csv(csv_file, usecols=needed, chunksize=chunksize):
+            if years is not None:
+                chunk = chunk[chunk[YEAR_COL].between(*years)]
+            if divisions is not None:
+                chunk = chunk[chunk[DIVISION_COL].isin(list(divisions))]
+            parts.append(chunk[wanted])
+    if not parts:
+        return pd.DataFrame(columns=wanted)
+    return pd.concat(parts, ignore_index=True)
+
 
 def load_esg_zip(
     zip_path: str | Path = "esg_cleaned_final.csv.zip",
-    csv_name: str = "esg_cleaned_final.csv"
+    csv_name: str = "esg_cleaned_final.csv",
+    use_cache: bool = True,
+    columns: list[str] | None = None,
+    years: tuple[int, int] | None = None,
+    divisions: list[str] | None = None,
+    chunksize: int = 100_000,
 ) -> pd.DataFrame:
     """
     Robustly load a CSV inside a ZIP archive.
 
+    The first full load writes a columnar sidecar next to the zip (see
+    :func:`sidecar_path`) keyed by the zip's size, mtime and SHA-256.
+    Later loads memory-map that sidecar instead of re-parsing the CSV, and
+    fall back to the CSV whenever the sidecar is missing or stale.
+
+    ``columns``, ``years`` and ``divisions`` are pushed down into the read:
+    on the sidecar only the projected columns are touched and only matching
+    rows are materialised; on the CSV path the file is streamed in chunks
+    of ``chunksize`` rows, so peak memory follows the slice, not the panel.
+
     Parameters
     ----------
     zip_path : str or Path
         Path to the .zip file (relative to repo root by default)
     csv_name : str
         CSV file name inside the zip
+    use_cache : bool
+        Read and write the columnar sidecar. ``False`` always parses the CSV.
+    columns : list of str, optional
+        Columns to return, in this order. Defaults to all columns.
+    years : (int, int), optional
+        Inclusive ``(start, end)`` range on the ``year`` column.
+    divisions : list of str, optional
+        Keep only rows whose ``Division`` is in this list.
+    chunksize : int
+        Rows per chunk when a slice is streamed from the CSV.
 
     Returns
     -------
     pandas.DataFrame
+        Sliced results carry a fresh ``RangeIndex``.
+
+    Raises
+    ------
+    KeyError
+        If a requested or filtered column is not in the dataset.
     """
     zip_path = Path(zip_path)
 
     if not zip_path.exists():
         raise FileNotFoundError(f"Zip file '{zip_path}' not found.")
 
-    try:
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            if csv_name not in zip_ref.namelist():
-                raise FileNotFoundError(
-                    f"CSV file '{csv_name}' not found inside '{zip_path.name}'. "
-                    f"Files available: {zip_ref.namelist()}"
-                )
+    sliced = columns is not None or years is not None or divisions is not None
 
-            with zip_ref.open(csv_name) as csv_file:
-                return pd.read_csv(csv_file)
+    if use_cache:
+        table = _read_sidecar(zip_path, csv_name)
+        if table is not None:
+            if sliced:
+                table = _slice_table(table, columns, years, divisions)
+            return table.to_pandas()
 
-    except zipfile.BadZipFile as e:
-        raise zipfile.BadZipFile(f"Invalid zip file '{zip_path}'.") from e
+    if sliced:
+        return _read_csv_slice(zip_path, csv_name, columns, years, divisions, chunksize)
+
+    df = _read_csv_from_zip(zip_path, csv_name)
+    if use_cache:
+        _write_sidecar(df, zip_path, csv_name)
+    return df
+
+
+def ensure_sidecar(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    csv_name: str = "esg_cleaned_final.csv",
+) -> bool:
+    """
+    Build the columnar sidecar for ``zip_path`` unless a fresh one exists.
+
+    Sliced loads and :func:`iter_esg_chunks` only read the sidecar, so
+    until one full load has written it every read parses the CSV. Returns
+    whether a usable sidecar is in place afterwards.
+    """
+    zip_path = Path(zip_path)
+    if _read_sidecar(zip_path, csv_name) is not None:
+        return True
+    _write_sidecar(_read_csv_from_zip(zip_path, csv_name), zip_path, csv_name)
+    return _read_sidecar(zip_path, csv_name) is not None
+
+
+def iter_esg_chunks(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    columns: list[str] | None = None,
+    chunksize: int = 100_000,
+    csv_name: str = "esg_cleaned_final.csv",
+    use_cache: bool = True,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream the dataset as frames of at most ``chunksize`` rows, in file order.
+
+    Batches are sliced from the memory-mapped sidecar when it is fresh and
+    parsed from the zipped CSV otherwise; either way only one chunk is
+    materialised at a time and the sidecar is never built here, so memory
+    stays bounded by ``chunksize`` however large the panel is.
+
+    Parameters
+    ----------
+    columns : list of str, optional
+        Columns to yield, in this order. Defaults to all columns.
+    use_cache : bool
+        Read the sidecar when it is fresh. ``False`` always parses the CSV.
+
+    Raises
+    ------
+    KeyError
+        If a requested column is not in the dataset.
+    """
+    zip_path = Path(zip_path)
+    if not zip_path.exists():
+        raise FileNotFoundError(f"Zip file '{zip_path}' not found.")
+
+    table = _read_sidecar(zip_path, csv_name) if use_cache else None
+    if table is not None:
+        wanted, _ = _needed_columns(table.column_names, columns, None, None)
+        for batch in table.select(wanted).to_batches(max_chunksize=chunksize):
+            if batch.num_rows:
+                yield batch.to_pandas()
+        return
+
+    with _open_csv(zip_path, csv_name) as csv_file:
+        header = pd.read_csv(csv_file, nrows=0).columns.tolist()
+    wanted, _ = _needed_columns(header, columns, None, None)
+    with _open_csv(zip_path, csv_name) as csv_file:
+        for chunk in pd.read_csv(csv_file, usecols=wanted, chunksize=chunksize):
+            yield chunk[wanted]
+
+
+def _csv_dtypes(zip_path: Path, csv_name: str) -> pd.Series:
+    """Dtypes a full ``read_csv`` would infer, from one streamed pass."""
+    seen: dict[str, pd.Series] = {}
+    has_gaps: set[str] = set()
+    columns: list[str] = []
+    for chunk in iter_esg_chunks(zip_path, csv_name=csv_name, use_cache=False):
+        columns = chunk.columns.tolist()
+        for col in columns:
+            s = chunk[col]
+            if s.isna().all():
+                # An all-missing chunk parses as float whatever the column is.
+                has_gaps.add(col)
+            elif col in seen:
+                seen[col] = pd.concat([seen[col], s.iloc[:0]])
+            else:
+                seen[col] = s.iloc[:0]
+    dtypes = {}
+    for col in columns:
+        dtype = seen[col].dtype if col in seen else np.dtype("float64")
+        if col in has_gaps and pd.api.types.is_numeric_dtype(dtype):
+            dtype = np.result_type(dtype, np.float64)
+        dtypes[col] = dtype
+    return pd.Series(dtypes, dtype=object)
+
+
+def load_esg_dtypes(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    csv_name: str = "esg_cleaned_final.csv",
+) -> pd.Series:
+    """
+    Column dtypes of the dataset without materialising its rows.
+
+    Read from the sidecar schema when it is fresh; otherwise the CSV is
+    streamed once in chunks (see :func:`iter_esg_chunks`).
+    """
+    zip_path = Path(zip_path)
+    if not zip_path.exists():
+        raise FileNotFoundError(f"Zip file '{zip_path}' not found.")
+    table = _read_sidecar(zip_path, csv_name)
+    if table is None:
+        return _csv_dtypes(zip_path, csv_name)
+    return table.schema.empty_table().to_pandas().dtypes
+
+
+def read_esg_head(
+    zip_path: str | Path = "esg_cleaned_final.csv.zip",
+    n: int = 5,
+    csv_name: str = "esg_cleaned_final.csv",
+) -> pd.DataFrame:
+    """First ``n`` rows of the dataset, all columns, without reading the rest."""
+    zip_path = Path(zip_path)
+    table = _read_sidecar(zip_path, csv_name)
+    if table is not None:
+        return table.slice(0, n).to_pandas()
+    with _open_csv(zip_path, csv_name) as csv_file:
+        return pd.read_csv(csv_file, nrows=n)
+
+
+def compact_frame(
+    df: pd.DataFrame,
+    max_category_ratio: float = 0.5,
+    float_rtol: float = 1e-6,
+    downcast_floats: bool = True,
+) -> pd.DataFrame:
+    """
+    Shrink a frame's dtypes.
+
+    Integers, booleans and strings keep their values exactly. Floats that
+    are downcast to float32 keep them only to within ``float_rtol``; pass
+    ``downcast_floats=False`` where that matters, e.g. for model fitting.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Frame to compact; it is not modified.
+    max_category_ratio : float
+        String columns whose unique/row ratio is at or below this become
+        categoricals (``Division``, ``ticker_ann``, ...).
+    float_rtol : float
+        Float columns are downcast to float32 only when every value
+        round-trips within this relative tolerance and stays finite.
+    downcast_floats : bool
+        Leave every float column at its original precision when false.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype):
+            out[col] = s
+        elif pd.api.types.is_integer_dtype(s):
+            out[col] = pd.to_numeric(s, downcast="integer")
+        elif pd.api.types.is_float_dtype(s) and downcast_floats:
+            values = s.to_numpy(dtype="float64")
+            with np.errstate(over="ignore"):
+                narrow = values.astype("float32")
+            finite = np.isfinite(values)
+            if (np.isfinite(narrow) == finite).all() and np.allclose(
+                narrow[finite], values[finite], rtol=float_rtol, atol=0
+            ):
+                out[col] = pd.Series(narrow, index=s.index, name=col)
+            else:
+                out[col] = s
+        elif pd.api.types.is_string_dtype(s) or s.dtype == object:
+            n = len(s)
+            if n and s.nunique(dropna=True) / n <= max_category_ratio:
+                out[col] = s.astype("category")
+            else:
+                out[col] = s
+        else:
+            out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return a copy of ``df`` whose numeric columns are backed by read-only
+    arrays, one block per column.
+
+    Safe to hand to many sessions at once: slicing and filtering work as
+    usual, while an in-place write raises ``ValueError`` instead of
+    silently changing what every other session sees.
+    """
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, np.dtype) and s.dtype.kind in "biuf":
+            arr = s.to_numpy(copy=True)
+            arr.flags.writeable = False
+            cols[col] = arr
+        else:
+            cols[col] = s.array
+    return pd.DataFrame(cols, index=df.index, copy=False)